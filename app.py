@@ -13,7 +13,11 @@ sys.path.append(str(Path(__file__).parent))
 from src.ocr_engine import OCREngine
 from src.region_classifier import RegionClassifier
 from src.image_processor import ImageProcessor
-from config.config import APP_TITLE, APP_ICON, OUTPUT_DIR
+from src.pipeline import LabelPipeline
+from src.result_cache import ResultCache
+from src.video_stream import VideoLabelStream
+from src import metrics
+from config.config import APP_TITLE, APP_ICON, OUTPUT_DIR, RESULT_CACHE_ENABLED
 
 
 # Cấu hình trang
@@ -82,7 +86,8 @@ def load_engines():
         with st.spinner("🗺️ Đang khởi tạo Region Classifier..."):
             classifier = RegionClassifier()
         with st.spinner("🖼️ Đang khởi tạo Image Processor..."):
-            processor = ImageProcessor()
+            # Tesseract OSD chỉ được gọi khi không tự xác định được ảnh có bị lộn ngược không
+            processor = ImageProcessor(osd=ocr.detect_orientation)
         st.success("✅ Khởi tạo thành công!")
         return ocr, classifier, processor
     except Exception as e:
@@ -92,42 +97,84 @@ def load_engines():
         return None, None, None
 
 
-def process_image(image, ocr_engine, classifier, processor):
-    """Xử lý ảnh và trả về kết quả"""
+@st.cache_resource
+def load_result_cache():
+    """Load cache kết quả OCR (dùng chung giữa các phiên)"""
+    if not RESULT_CACHE_ENABLED:
+        return None
+    try:
+        return ResultCache()
+    except Exception as e:
+        st.warning(f"⚠️ Không thể mở cache kết quả: {e}")
+        return None
+
+
+def process_image(image_bytes, ocr_engine, classifier, processor):
+    """Xử lý ảnh (bytes của file upload) hoàn toàn trong bộ nhớ và trả về kết quả"""
     try:
-        # Lưu ảnh tạm
-        temp_path = OUTPUT_DIR / "temp_image.jpg"
-        image.save(temp_path)
-
-        # Tiền xử lý ảnh
-        with st.spinner("🔄 Đang xử lý ảnh..."):
-            processed = processor.preprocess_image(str(temp_path))
-            processed_path = OUTPUT_DIR / "processed_image.jpg"
-            processor.save_processed_image(processed, str(processed_path))
-
-        # OCR
-        with st.spinner("📝 Đang nhận dạng text..."):
-            ocr_result = ocr_engine.extract_text_with_confidence(str(processed_path))
-            structured_data = ocr_engine.extract_structured_data(str(processed_path))
-
-        # Phân loại khu vực - ƯU TIÊN địa chỉ người nhận
-        with st.spinner("🗺️ Đang phân loại khu vực..."):
-            # Dùng địa chỉ người nhận nếu có, fallback sang toàn bộ text
-            address_to_classify = structured_data.get('recipient_address', '') or ocr_result['text']
-            classification = classifier.classify(address_to_classify)
-
-        return {
-            'ocr': ocr_result,
-            'structured': structured_data,
-            'classification': classification,
-            'processed_image': processed_path
-        }
+        # Tiền xử lý → OCR (một lần) → phân tích → phân loại
+        with st.spinner("🔄 Đang xử lý và nhận dạng nhãn..."):
+            pipeline = LabelPipeline(ocr_engine, classifier, processor, cache=load_result_cache())
+            return pipeline.run(image_bytes)
 
     except Exception as e:
         st.error(f"❌ Lỗi khi xử lý ảnh: {e}")
         return None
 
 
+def process_video(video_bytes, suffix, ocr_engine, classifier, processor):
+    """Nhận dạng các kiện trong video upload: mỗi kiện OCR một lần trên khung nét nhất"""
+    import tempfile
+
+    # cv2.VideoCapture chỉ đọc được từ file
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_path = Path(tmp_dir) / f"video{suffix}"
+        video_path.write_bytes(video_bytes)
+        # Khung video gần như không bao giờ trùng byte - không dùng cache kết quả
+        stream = VideoLabelStream(LabelPipeline(ocr_engine, classifier, processor))
+        results = []
+        try:
+            with st.spinner("🎥 Đang đọc video và nhận dạng từng kiện..."):
+                for result in stream.run(str(video_path)):
+                    results.append(result)
+        except Exception as e:
+            st.error(f"❌ Lỗi khi xử lý video: {e}")
+        return results, stream.stats
+
+
+def video_mode(ocr_engine, classifier, processor):
+    """Chế độ video: upload video băng chuyền, liệt kê kết quả từng kiện"""
+    st.subheader("🎥 Nhận dạng từ video băng chuyền")
+
+    uploaded_video = st.file_uploader(
+        "Chọn video",
+        type=['mp4', 'avi', 'mov', 'mkv'],
+        help="Khung gần trùng được bỏ qua; mỗi kiện chỉ OCR khung hình nét nhất"
+    )
+    if uploaded_video is None:
+        st.info("👆 Vui lòng upload video và nhấn 'Bắt đầu xử lý'")
+        return
+
+    if st.button("🚀 Bắt đầu xử lý", type="primary", key='process_video'):
+        results, stats = process_video(uploaded_video.getvalue(), Path(uploaded_video.name).suffix,
+                                       ocr_engine, classifier, processor)
+        st.success(f"✅ {stats['labels']} kiện từ {stats['frames']} khung hình")
+        for number, result in enumerate(results, 1):
+            structured, classification = result['structured'], result['classification']
+            with st.expander(f"📦 Kiện #{number} - khung {result['frame_index']} - "
+                             f"{classification['region_name']}", expanded=number == 1):
+                if result.get('processed_image') is not None:
+                    processed_img = result['processed_image']
+                    st.image(processed_img, channels='BGR' if processed_img.ndim == 3 else 'RGB',
+                             use_column_width=True)
+                st.table([
+                    {'Trường': '👤 Người nhận', 'Giá trị': structured.get('recipient_name', '')},
+                    {'Trường': '📞 SĐT', 'Giá trị': structured.get('recipient_phone', '')},
+                    {'Trường': '📍 Địa chỉ', 'Giá trị': structured.get('recipient_address', '')},
+                    {'Trường': '🔖 Order ID', 'Giá trị': structured.get('order_id', '')},
+                ])
+
+
 def main():
     """Hàm main của ứng dụng"""
 
@@ -157,6 +204,8 @@ def main():
 
     # Sidebar
     with st.sidebar:
+        mode = st.radio("Chế độ", ["📷 Ảnh", "🎥 Video"], horizontal=True)
+
         # Hướng dẫn sử dụng
         st.subheader("📖 Hướng dẫn")
         st.markdown("""
@@ -174,6 +223,10 @@ def main():
         st.markdown("[![GitHub](https://img.shields.io/badge/GitHub-mttk2004-181717?style=flat&logo=github)](https://github.com/mttk2004)")
         st.caption("⭐ Star trên GitHub nếu project hữu ích!")
 
+    if mode == "🎥 Video":
+        video_mode(ocr_engine, classifier, processor)
+        return
+
     # Main content
     col1, col2 = st.columns([1, 1])
 
@@ -193,14 +246,18 @@ def main():
 
             # Nút xử lý
             if st.button("🚀 Bắt đầu xử lý", type="primary", use_container_width=True):
-                result = process_image(image, ocr_engine, classifier, processor)
+                result = process_image(uploaded_file.getvalue(), ocr_engine, classifier, processor)
 
                 if result:
                     st.session_state.ocr_result = result['ocr']
                     st.session_state.classification_result = result['classification']
                     st.session_state.structured_data = result['structured']
                     st.session_state.processed_image = result['processed_image']
-                    st.success("✅ Xử lý thành công!")
+                    st.session_state.timings = result.get('timings', {})
+                    if result['cached']:
+                        st.success("⚡ Xử lý thành công! (kết quả lấy từ cache)")
+                    else:
+                        st.success("✅ Xử lý thành công!")
 
     with col2:
         st.subheader("📊 Kết quả")
@@ -295,10 +352,30 @@ def main():
                     st.text_input("⚖️ Trọng lượng", structured.get('weight', ''), disabled=True, key='weight')
                 with col_o3:
                     st.text_input("🔖 Order ID", structured.get('order_id', ''), disabled=True, key='order')            # Ảnh đã xử lý
-            if 'processed_image' in st.session_state:
+            if st.session_state.get('processed_image') is not None:
                 with st.expander("🖼️ Ảnh đã xử lý"):
-                    processed_img = Image.open(st.session_state.processed_image)
-                    st.image(processed_img, use_column_width=True)
+                    processed_img = st.session_state.processed_image
+                    channels = 'BGR' if processed_img.ndim == 3 else 'RGB'
+                    st.image(processed_img, channels=channels, use_column_width=True)
+
+                    # Chỉ ghi ra đĩa khi người dùng yêu cầu
+                    if st.button("💾 Lưu ảnh đã xử lý", key='save_processed'):
+                        processed_path = OUTPUT_DIR / "processed_image.png"
+                        processor.save_processed_image(processed_img, str(processed_path))
+                        st.success(f"Đã lưu tại: {processed_path}")
+
+            # Thời gian từng bước của nhãn vừa xử lý
+            if st.session_state.get('timings'):
+                with st.expander("⏱️ Thời gian xử lý"):
+                    timings = st.session_state.timings
+                    st.table([{'Bước': stage, 'Thời gian (ms)': f"{ms:.2f}"} for stage, ms in timings.items()])
+                    st.download_button(
+                        label="📈 Tải metrics (Prometheus)",
+                        data=metrics.to_prometheus(),
+                        file_name="metrics.prom",
+                        mime="text/plain",
+                        key='download_metrics'
+                    )
 
             # Nút download
             st.divider()
@@ -0,0 +1,73 @@
+"""
+Script nhận dạng hàng loạt nhãn bưu kiện từ thư mục ảnh hoặc file danh sách
+
+Ví dụ:
+    python batch_ocr.py data/sample
+    python batch_ocr.py danh_sach_anh.txt --output data/output/ket_qua.csv --workers 8
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Thêm thư mục gốc vào path
+sys.path.append(str(Path(__file__).parent))
+
+from src.batch_processor import BatchProcessor, collect_images
+from config.config import OUTPUT_DIR, PREPROCESS_METHOD
+
+
+def parse_args(argv=None):
+    """Đọc tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(description="Nhận dạng hàng loạt nhãn bưu kiện")
+    parser.add_argument('source', help="Thư mục ảnh hoặc file text (mỗi dòng một đường dẫn ảnh)")
+    parser.add_argument('--output', '-o', default=str(OUTPUT_DIR / 'batch_results.jsonl'),
+                        help="File kết quả .jsonl hoặc .csv (mặc định: %(default)s)")
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help="Số tiến trình xử lý (mặc định: số CPU)")
+    parser.add_argument('--method', '-m', default=PREPROCESS_METHOD,
+                        help="Phương pháp tiền xử lý ảnh (mặc định: %(default)s)")
+    parser.add_argument('--backend', default='auto', choices=['auto', 'capi', 'pytesseract'],
+                        help="Backend Tesseract (mặc định: %(default)s)")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="Xử lý lại toàn bộ, không bỏ qua ảnh đã xử lý thành công trong file kết quả")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Chạy batch OCR"""
+    args = parse_args(argv)
+
+    images = collect_images(args.source)
+    print(f"📂 Tìm thấy {len(images)} ảnh trong {args.source}")
+    if not images:
+        return 0
+
+    processor = BatchProcessor(
+        output_path=args.output,
+        workers=args.workers,
+        method=args.method,
+        backend=args.backend,
+        resume=not args.no_resume
+    )
+    stats = processor.run(images)
+
+    print("\n" + "=" * 60)
+    print("KẾT QUẢ XỬ LÝ HÀNG LOẠT")
+    print("=" * 60)
+    print(f"  Tổng số ảnh:      {stats['total']}")
+    print(f"  Bỏ qua (đã có):   {stats['skipped']}")
+    print(f"  Đã xử lý:         {stats['processed']}")
+    print(f"  Lỗi:              {stats['errors']}")
+    print(f"  Thời gian:        {stats['elapsed']:.2f} giây")
+    print(f"  Tốc độ:           {stats['labels_per_second']:.2f} nhãn/giây")
+    print(f"  File kết quả:     {processor.output_path}")
+
+    return 1 if stats['errors'] else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n\n⚠️ Đã dừng! Chạy lại cùng lệnh để tiếp tục từ ảnh chưa xử lý.")
+        sys.exit(130)
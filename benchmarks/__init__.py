@@ -0,0 +1,3 @@
+"""
+Benchmark hiệu năng pipeline nhận dạng nhãn bưu kiện
+"""
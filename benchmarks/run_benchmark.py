@@ -0,0 +1,322 @@
+"""
+Benchmark pipeline nhận dạng nhãn bưu kiện trên nhãn giả lập
+
+Đo thời gian từng bước (tiền xử lý theo từng phương pháp, OCR, phân tích, phân loại),
+báo cáo p50/p95, throughput và bộ nhớ đỉnh (peak RSS) ra file JSON để so sánh giữa các lần chạy.
+
+Ví dụ:
+    python benchmarks/run_benchmark.py --labels 50
+    python benchmarks/run_benchmark.py --labels 50 --compare data/output/benchmark_truoc.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Thêm thư mục gốc vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import OUTPUT_DIR
+from src.image_processor import ImageProcessor
+from src.postal_label_parser import PostalLabelParser
+from src.region_classifier import RegionClassifier
+from src.text_detector import TextRegionDetector
+from benchmarks.synthetic_labels import SyntheticLabelGenerator
+
+DEFAULT_METHODS = ['adaptive', 'minimal', 'deskew', 'auto', 'grayscale', 'threshold']
+DEFAULT_WIDTHS = [800, 1400, 2200]
+DEFAULT_SKEWS = [0.0, 3.0]
+DEFAULT_NOISES = [0.0, 12.0]
+
+
+def peak_rss_mb():
+    """Bộ nhớ đỉnh của tiến trình (MB), None nếu hệ điều hành không hỗ trợ"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux trả về KB, macOS trả về byte
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+def summarize(samples: list) -> dict:
+    """
+    Thống kê thời gian một bước
+
+    Args:
+        samples: Thời gian mỗi lần chạy (giây)
+
+    Returns:
+        dict: {'count', 'mean_ms', 'p50_ms', 'p95_ms', 'max_ms', 'throughput_per_s'}
+    """
+    if not samples:
+        return {'count': 0}
+    values = np.asarray(samples) * 1000
+    total = float(np.sum(samples))
+    return {
+        'count': len(samples),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'max_ms': round(float(values.max()), 3),
+        'throughput_per_s': round(len(samples) / total, 2) if total > 0 else None,
+    }
+
+
+def _timed(func, *args, **kwargs):
+    """Chạy hàm và trả về (kết quả, thời gian giây)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _load_ocr_engine(backend: str):
+    """Khởi tạo OCREngine; trả về (engine, lý do bỏ qua) khi không có Tesseract"""
+    try:
+        from src.ocr_engine import OCREngine
+        return OCREngine(backend=backend), None
+    except Exception as e:
+        return None, str(e)
+
+
+def run_benchmark(labels: int = 30, seed: int = 0, methods=None, widths=None, skews=None,
+                  noises=None, ocr: bool = True, backend: str = 'auto', warmup: int = 2,
+                  scene: bool = False, detect: bool = True) -> dict:
+    """
+    Chạy benchmark
+
+    Args:
+        labels: Số nhãn giả lập
+        seed: Seed sinh nhãn (giữ nguyên để so sánh giữa các lần chạy)
+        methods: Các phương pháp tiền xử lý cần đo
+        widths, skews, noises: Các độ phân giải (px), góc nghiêng (độ), mức nhiễu
+        ocr: Có đo bước OCR không (tự bỏ qua nếu không có Tesseract)
+        backend: Backend Tesseract cho OCREngine
+        warmup: Số nhãn chạy trước không tính giờ (load traineddata, cache...)
+        scene: Dán nhãn lên ảnh chụp thùng hàng lớn hơn
+        detect: Định vị khối chữ và chỉ OCR trên các vùng cắt
+
+    Returns:
+        dict: Báo cáo benchmark (xem README)
+    """
+    methods = methods or DEFAULT_METHODS
+    widths = widths or DEFAULT_WIDTHS
+    skews = skews if skews is not None else DEFAULT_SKEWS
+    noises = noises if noises is not None else DEFAULT_NOISES
+
+    generator = SyntheticLabelGenerator(seed=seed)
+    dataset = generator.generate(labels, widths=widths, skews=skews, noises=noises, scene=scene)
+
+    processor = ImageProcessor()
+    parser = PostalLabelParser()
+    classifier = RegionClassifier()
+    detector = TextRegionDetector() if detect else None
+
+    skipped = {}
+    engine = None
+    if ocr:
+        engine, reason = _load_ocr_engine(backend)
+        if engine is None:
+            skipped['ocr'] = reason
+    else:
+        skipped['ocr'] = 'Tắt bằng --no-ocr'
+
+    samples = {f'preprocess.{method}': [] for method in methods}
+    samples.update({'detect': [], 'ocr': [], 'parse': [], 'classify': [], 'pipeline': []})
+    ocr_pixel_ratios = []
+    correct = {'region': 0, 'province': 0}
+
+    for index, label in enumerate([dataset[0]] * warmup + dataset):
+        timed = index >= warmup
+        pipeline_time = 0.0
+
+        processed = None
+        for method in methods:
+            image, elapsed = _timed(processor.preprocess_image, label['image'], method)
+            if timed:
+                samples[f'preprocess.{method}'].append(elapsed)
+            if processed is None:
+                # Phương pháp đầu tiên được dùng cho các bước sau
+                processed = image
+                pipeline_time += elapsed
+
+        regions = None
+        if detector is not None:
+            detection, elapsed = _timed(detector.detect, processed)
+            regions = detector.ocr_regions(detection) or None
+            pipeline_time += elapsed
+            if timed:
+                samples['detect'].append(elapsed)
+                ocr_pixel_ratios.append(detection['coverage'] if regions else 1.0)
+
+        text = label['text']
+        if engine is not None:
+            ocr_result, elapsed = _timed(engine.extract_text_with_confidence, processed, regions=regions)
+            text = ocr_result['text'] or text
+            pipeline_time += elapsed
+            if timed:
+                samples['ocr'].append(elapsed)
+
+        parsed, elapsed = _timed(parser.parse, text)
+        pipeline_time += elapsed
+        if timed:
+            samples['parse'].append(elapsed)
+
+        classification, elapsed = _timed(classifier.classify, parsed.get('recipient_address') or text)
+        pipeline_time += elapsed
+
+        if timed:
+            samples['classify'].append(elapsed)
+            samples['pipeline'].append(pipeline_time)
+            correct['region'] += classification['region'] == label['truth']['region']
+            correct['province'] += classification['province'] == label['truth']['province']
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'ocr_backend': getattr(engine, 'backend', None),
+        },
+        'config': {
+            'labels': labels,
+            'seed': seed,
+            'methods': methods,
+            'widths': widths,
+            'skews': skews,
+            'noises': noises,
+            'warmup': warmup,
+            'scene': scene,
+            'detect': detect,
+            'text_source': 'ocr' if engine is not None else 'ground_truth',
+        },
+        'stages': {name: summarize(values) for name, values in samples.items() if values},
+        'accuracy': {key: round(value / labels, 4) for key, value in correct.items()},
+        # Tỉ lệ điểm ảnh đưa vào Tesseract so với cả ảnh (1.0 = OCR cả ảnh)
+        'ocr_pixel_ratio': round(float(np.mean(ocr_pixel_ratios)), 4) if ocr_pixel_ratios else 1.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'skipped': skipped,
+    }
+
+
+def compare_reports(current: dict, baseline: dict) -> list:
+    """
+    So sánh p50/p95 từng bước với báo cáo trước
+
+    Returns:
+        list: Các dict {'stage', 'metric', 'baseline', 'current', 'change_pct'}
+    """
+    rows = []
+    for stage, stats in current.get('stages', {}).items():
+        previous = baseline.get('stages', {}).get(stage)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            if metric in stats and previous.get(metric):
+                change = (stats[metric] - previous[metric]) / previous[metric] * 100
+                rows.append({
+                    'stage': stage,
+                    'metric': metric,
+                    'baseline': previous[metric],
+                    'current': stats[metric],
+                    'change_pct': round(change, 1),
+                })
+    return rows
+
+
+def _float_list(value: str) -> list:
+    return [float(item) for item in value.split(',') if item.strip()]
+
+
+def parse_args(argv=None):
+    """Đọc tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(description="Benchmark pipeline nhận dạng nhãn bưu kiện")
+    parser.add_argument('--labels', '-n', type=int, default=30, help="Số nhãn giả lập (mặc định: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed sinh nhãn (mặc định: %(default)s)")
+    parser.add_argument('--methods', default=','.join(DEFAULT_METHODS),
+                        help="Các phương pháp tiền xử lý, cách nhau bởi dấu phẩy (mặc định: %(default)s)")
+    parser.add_argument('--widths', default=','.join(str(w) for w in DEFAULT_WIDTHS),
+                        help="Các chiều rộng ảnh (px) (mặc định: %(default)s)")
+    parser.add_argument('--skews', default=','.join(str(s) for s in DEFAULT_SKEWS),
+                        help="Các góc nghiêng (độ) (mặc định: %(default)s)")
+    parser.add_argument('--noises', default=','.join(str(n) for n in DEFAULT_NOISES),
+                        help="Các mức nhiễu Gauss (mặc định: %(default)s)")
+    parser.add_argument('--no-ocr', action='store_true', help="Không đo bước OCR")
+    parser.add_argument('--scene', action='store_true', help="Dán nhãn lên ảnh chụp thùng hàng lớn hơn")
+    parser.add_argument('--no-detect', action='store_true',
+                        help="Không định vị khối chữ, OCR cả ảnh")
+    parser.add_argument('--backend', default='auto', choices=['auto', 'capi', 'pytesseract'],
+                        help="Backend Tesseract (mặc định: %(default)s)")
+    parser.add_argument('--output', '-o', default=None,
+                        help="File JSON kết quả (mặc định: data/output/benchmark_<thời gian>.json)")
+    parser.add_argument('--compare', default=None, help="File JSON của lần chạy trước để so sánh")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Chạy benchmark và in bảng kết quả"""
+    args = parse_args(argv)
+
+    report = run_benchmark(
+        labels=args.labels,
+        seed=args.seed,
+        methods=[m.strip() for m in args.methods.split(',') if m.strip()],
+        widths=[int(w) for w in _float_list(args.widths)],
+        skews=_float_list(args.skews),
+        noises=_float_list(args.noises),
+        ocr=not args.no_ocr,
+        backend=args.backend,
+        scene=args.scene,
+        detect=not args.no_detect,
+    )
+
+    output = Path(args.output or OUTPUT_DIR / f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print("\n" + "=" * 72)
+    print(f"BENCHMARK ({report['config']['labels']} nhãn, text từ {report['config']['text_source']})")
+    print("=" * 72)
+    print(f"  {'Bước':<24}{'p50 (ms)':>10}{'p95 (ms)':>10}{'max (ms)':>10}{'lần/giây':>12}")
+    for stage, stats in report['stages'].items():
+        print(f"  {stage:<24}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+              f"{stats['max_ms']:>10.2f}{stats['throughput_per_s'] or 0:>12.1f}")
+    print(f"\n  Độ chính xác miền: {report['accuracy']['region']:.1%}, "
+          f"tỉnh: {report['accuracy']['province']:.1%}")
+    print(f"  Điểm ảnh đưa vào OCR: {report['ocr_pixel_ratio']:.1%} ảnh gốc")
+    print(f"  Bộ nhớ đỉnh:       {report['peak_rss_mb']} MB")
+    for stage, reason in report['skipped'].items():
+        print(f"  ⚠️ Bỏ qua {stage}: {reason}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n  So sánh với {args.compare}:")
+        for row in compare_reports(report, baseline):
+            marker = '🔺' if row['change_pct'] > 10 else ('🔻' if row['change_pct'] < -10 else '  ')
+            print(f"  {marker} {row['stage']:<22}{row['metric']:<8}{row['baseline']:>10.2f} → "
+                  f"{row['current']:>10.2f} ({row['change_pct']:+.1f}%)")
+
+    print(f"\n  File kết quả: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Sinh nhãn bưu kiện tiếng Việt giả lập (offline, bằng PIL) cho benchmark
+
+Mỗi nhãn có khối người gửi/người nhận, số điện thoại, trọng lượng, mã đơn hàng;
+địa chỉ lấy ngẫu nhiên từ danh mục hành chính (models/gazetteer.json).
+"""
+import random
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Thêm thư mục gốc vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from src.gazetteer import Gazetteer
+
+SURNAMES = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng', 'Bùi', 'Đỗ']
+MIDDLE_NAMES = ['Văn', 'Thị', 'Minh', 'Ngọc', 'Thanh', 'Hữu', 'Đức', 'Thu', 'Quốc', 'Tuấn']
+GIVEN_NAMES = ['An', 'Bình', 'Châu', 'Dũng', 'Giang', 'Hà', 'Hùng', 'Lan', 'Linh', 'Nam',
+               'Phương', 'Quân', 'Sơn', 'Thảo', 'Trang', 'Tú', 'Vũ', 'Yến']
+STREETS = ['Lê Lợi', 'Trần Hưng Đạo', 'Nguyễn Trãi', 'Hai Bà Trưng', 'Lý Thường Kiệt',
+           'Điện Biên Phủ', 'Cách Mạng Tháng 8', 'Phan Đình Phùng', 'Nguyễn Văn Cừ', 'Võ Văn Kiệt']
+SHOPS = ['TikTokShop', 'Shopee Express', 'GHN Express', 'Viettel Post', 'J&T Express']
+
+UNIT_LABELS = {
+    'quan': 'Quận', 'huyen': 'Huyện', 'thi_xa': 'Thị xã', 'thanh_pho': 'Thành phố',
+    'phuong': 'Phường', 'xa': 'Xã', 'thi_tran': 'Thị trấn',
+}
+
+# Font có đủ glyph tiếng Việt (thử lần lượt; không có thì dùng font mặc định của PIL)
+FONT_CANDIDATES = [
+    'DejaVuSans.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/TTF/DejaVuSans.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+    '/Library/Fonts/Arial Unicode.ttf',
+    '/System/Library/Fonts/Supplemental/Arial.ttf',
+]
+
+
+def load_font(size: int):
+    """Load font TrueType hỗ trợ tiếng Việt với cỡ chữ cho trước"""
+    for candidate in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 không hỗ trợ đổi cỡ font mặc định
+        return ImageFont.load_default()
+
+
+class SyntheticLabelGenerator:
+    """Sinh nhãn bưu kiện giả lập có kèm dữ liệu đúng (ground truth)"""
+
+    def __init__(self, seed: int = 0, gazetteer: Gazetteer = None):
+        """
+        Args:
+            seed: Seed cho bộ sinh ngẫu nhiên (cùng seed → cùng bộ nhãn)
+            gazetteer: Danh mục hành chính để lấy địa chỉ (mặc định load từ models/)
+        """
+        self.random = random.Random(seed)
+        self.gazetteer = gazetteer or Gazetteer()
+        # Chỉ lấy đơn vị có quận/huyện để địa chỉ đủ 3 cấp
+        self.addressable = [i for i, unit in enumerate(self.gazetteer.units) if unit[1] >= 1]
+        self._fonts = {}
+
+    def _font(self, size: int):
+        if size not in self._fonts:
+            self._fonts[size] = load_font(size)
+        return self._fonts[size]
+
+    def _name(self) -> str:
+        return ' '.join([self.random.choice(SURNAMES), self.random.choice(MIDDLE_NAMES),
+                         self.random.choice(GIVEN_NAMES)])
+
+    def _phone(self) -> str:
+        return '0' + self.random.choice('35789') + ''.join(self.random.choice('0123456789') for _ in range(8))
+
+    def _address(self) -> tuple:
+        """Địa chỉ đầy đủ (số nhà, đường, phường, quận, tỉnh) và đơn vị hành chính tương ứng"""
+        unit_id = self.random.choice(self.addressable)
+        parts = [f"Số {self.random.randint(1, 499)} {self.random.choice(STREETS)}"]
+        for chain_id in reversed(self.gazetteer.chain(unit_id)[1:]):
+            name, _, _, unit_type, _, _ = self.gazetteer.units[chain_id]
+            label = UNIT_LABELS.get(unit_type, '')
+            # Đơn vị đặt tên bằng số đã có tiền tố ("Quận 1")
+            parts.append(name if not label or name.startswith(label) else f"{label} {name}")
+        unit = self.gazetteer.describe(unit_id)
+        parts.append(unit['province'])
+        return ', '.join(parts), unit
+
+    def generate_truth(self) -> dict:
+        """Sinh nội dung một nhãn (chưa render)"""
+        sender_address, _ = self._address()
+        recipient_address, recipient_unit = self._address()
+        return {
+            'shop': self.random.choice(SHOPS),
+            'tracking': ''.join(self.random.choice('0123456789') for _ in range(12)),
+            'sender_name': self._name(),
+            'sender_address': sender_address,
+            'sender_phone': self._phone(),
+            'recipient_name': self._name(),
+            'recipient_address': recipient_address,
+            'recipient_phone': self._phone(),
+            'province': recipient_unit['province'],
+            'region': recipient_unit['region'],
+            'weight': f"{self.random.uniform(0.05, 20):.3f}",
+            'order_id': ''.join(self.random.choice('0123456789') for _ in range(18)),
+        }
+
+    @staticmethod
+    def label_lines(truth: dict) -> list:
+        """Các dòng text in trên nhãn"""
+        return [
+            f"{truth['shop']}   {truth['tracking']}",
+            f"Người gửi {truth['sender_name']}",
+            truth['sender_address'],
+            f"SĐT: {truth['sender_phone']}",
+            f"Người nhận {truth['recipient_name']}",
+            truth['recipient_address'],
+            f"SĐT: {truth['recipient_phone']}",
+            f"Trọng lượng: {truth['weight']} KG",
+            f"Order: {truth['order_id']}",
+        ]
+
+    @staticmethod
+    def label_text(truth: dict) -> str:
+        """Text của nhãn dạng một dòng (giống output OCR của Tesseract sau khi gộp)"""
+        return ' '.join(SyntheticLabelGenerator.label_lines(truth))
+
+    def render(self, truth: dict, width: int = 1000, skew: float = 0.0, noise: float = 0.0) -> np.ndarray:
+        """
+        Render nhãn thành ảnh BGR
+
+        Args:
+            truth: Nội dung nhãn (generate_truth)
+            width: Chiều rộng ảnh (px); cỡ chữ tỉ lệ theo chiều rộng
+            skew: Góc nghiêng (độ)
+            noise: Độ lệch chuẩn nhiễu Gauss (0 = ảnh sạch)
+        """
+        lines = self.label_lines(truth)
+        font_size = max(10, width // 36)
+        # Thu nhỏ chữ đến khi dòng dài nhất vừa khung nhãn
+        while font_size > 8 and max(self._font(font_size).getlength(line) for line in lines) > width - 2 * font_size:
+            font_size -= 1
+        line_height = int(font_size * 1.6)
+        margin = font_size
+        height = margin * 2 + line_height * len(lines)
+
+        image = Image.new('RGB', (width, height), 'white')
+        draw = ImageDraw.Draw(image)
+        draw.rectangle([margin // 2, margin // 2, width - margin // 2, height - margin // 2],
+                       outline='black', width=max(1, font_size // 10))
+        for index, line in enumerate(lines):
+            draw.text((margin, margin + index * line_height), line, fill='black', font=self._font(font_size))
+
+        array = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+
+        if skew:
+            center = (width / 2, height / 2)
+            matrix = cv2.getRotationMatrix2D(center, skew, 1.0)
+            array = cv2.warpAffine(array, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                                   borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255))
+
+        if noise:
+            gaussian = np.random.default_rng(self.random.randint(0, 2 ** 31)).normal(0, noise, array.shape)
+            array = np.clip(array.astype(np.float32) + gaussian, 0, 255).astype(np.uint8)
+
+        return array
+
+    def place_in_scene(self, label: np.ndarray, scale: float = 2.5) -> np.ndarray:
+        """
+        Dán nhãn lên ảnh chụp thùng carton giả lập (nhãn chỉ chiếm một phần nhỏ của ảnh)
+
+        Args:
+            label: Ảnh nhãn BGR (render)
+            scale: Tỉ lệ kích thước ảnh chụp so với nhãn
+        """
+        height, width = label.shape[:2]
+        scene_h, scene_w = int(height * scale * 1.2), int(width * scale)
+        rng = np.random.default_rng(self.random.randint(0, 2 ** 31))
+        # Nền carton nâu có vân nhiễu và một dải băng dính
+        texture = rng.normal(0, 8, (scene_h, scene_w, 1))
+        scene = np.clip(np.array([90, 140, 185], dtype=np.float32) + texture, 0, 255).astype(np.uint8)
+        tape_y = self.random.randint(0, scene_h // 4)
+        cv2.line(scene, (0, tape_y), (scene_w, tape_y + scene_h // 20), (70, 70, 70), max(4, scene_h // 30))
+
+        top = self.random.randint(scene_h // 4, scene_h - height)
+        left = self.random.randint(0, scene_w - width)
+        scene[top:top + height, left:left + width] = label
+        return scene
+
+    def generate(self, count: int, widths=(1000,), skews=(0.0,), noises=(0.0,), scene: bool = False) -> list:
+        """
+        Sinh `count` nhãn, xoay vòng qua các tổ hợp độ phân giải / góc nghiêng / nhiễu
+
+        Args:
+            scene: Dán nhãn lên ảnh chụp thùng hàng lớn hơn (place_in_scene)
+
+        Returns:
+            list: Các dict {'image', 'truth', 'text', 'width', 'skew', 'noise'}
+        """
+        variants = [(w, s, n) for w in widths for s in skews for n in noises]
+        labels = []
+        for index in range(count):
+            width, skew, noise = variants[index % len(variants)]
+            truth = self.generate_truth()
+            image = self.render(truth, width=width, skew=skew, noise=noise)
+            labels.append({
+                'image': self.place_in_scene(image) if scene else image,
+                'truth': truth,
+                'text': self.label_text(truth),
+                'width': width,
+                'skew': skew,
+                'noise': noise,
+            })
+        return labels
@@ -24,13 +24,131 @@ TESSERACT_CMD = r'C:\Program Files\Tesseract-OCR\tesseract.exe'  # Windows
 # Ngôn ngữ OCR (vi = Tiếng Việt, eng = English)
 OCR_LANG = 'vie+eng'
 
+# Backend gọi Tesseract:
+#   'auto'        - dùng pool C API nếu tìm thấy libtesseract, ngược lại pytesseract
+#   'capi'        - bắt buộc dùng pool worker qua Tesseract C API (libtesseract)
+#   'pytesseract' - mỗi lần gọi chạy một tiến trình tesseract riêng
+OCR_BACKEND = 'auto'
+
+# Đường dẫn libtesseract (None = tự tìm, VD: r'C:\Program Files\Tesseract-OCR\libtesseract-5.dll')
+TESSERACT_LIB = None
+
+# Thư mục tessdata (None = theo TESSDATA_PREFIX hoặc cạnh TESSERACT_CMD)
+TESSDATA_DIR = None
+
+# Kết quả kiểm tra version/ngôn ngữ Tesseract, dùng chung giữa các tiến trình (tự làm mới khi binary đổi)
+TESSERACT_PROBE_CACHE_FILE = DATA_DIR / "tesseract_probe.json"
+
+# Số worker Tesseract giữ sẵn traineddata trong pool (mặc định = số core)
+TESSERACT_POOL_SIZE = os.cpu_count() or 1
+
 # Cấu hình xử lý ảnh
 IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
 MAX_IMAGE_SIZE = (1920, 1080)  # Max width, height
 
+# Phương pháp tiền xử lý mặc định của pipeline ('adaptive' = resize theo cỡ chữ thực tế,
+# 'deskew' = xoay đúng chiều + sửa nghiêng trước khi resize, dùng cho ảnh từ máy quét cầm tay,
+# 'rectify' = nắn phối cảnh nhãn chụp nghiêng trên thùng hàng (cắt + nắn + resize trong một lần warp),
+# 'cascade' = thử lần lượt PREPROCESS_CASCADE, chỉ chuyển sang phương pháp đắt hơn khi kết quả kém)
+PREPROCESS_METHOD = 'adaptive'
+
+# Cascade: phương pháp từ rẻ đến đắt; dừng ở phương pháp đầu tiên có confidence trung bình của từ
+# ≥ CASCADE_MIN_CONFIDENCE và tìm được đủ các trường CASCADE_REQUIRED_FIELDS
+PREPROCESS_CASCADE = ['minimal', 'rectify', 'deskew', 'auto', 'denoise']
+CASCADE_MIN_CONFIDENCE = 70
+CASCADE_REQUIRED_FIELDS = ['recipient_address', 'recipient_phone']
+
+# Khoảng x-height (px) Tesseract nhận dạng tốt nhất; 'adaptive' resize để chữ rơi vào khoảng này
+OCR_TARGET_X_HEIGHT = (20, 35)
+# Cạnh dài tối đa sau khi phóng to (tránh ảnh khổng lồ khi chữ quá nhỏ)
+ADAPTIVE_MAX_SIDE = 4000
+
+# Chuỗi tiền xử lý khai báo sẵn (src/preprocess_pipeline.py), dùng được làm method:
+#   steps: danh sách (tên bước, tham số) - resize, sharpen, clahe, threshold, denoise;
+#          resize phải đứng đầu, các bước còn lại chỉ chạy trên kênh L/ảnh xám
+#   keep_color: True = trả về ảnh BGR (xử lý kênh L của LAB), False = trả về ảnh xám
+PREPROCESS_PIPELINES = {
+    'auto': {
+        'keep_color': True,
+        'steps': [
+            ('resize', {'max_side': 2000}),
+            ('sharpen', {'strength': 1.0}),
+            ('clahe', {'clip_limit': 3.0, 'tile_grid': 8}),
+        ],
+    },
+    'auto_gray': {
+        'keep_color': False,
+        'steps': [
+            ('resize', {'max_side': 2000}),
+            ('sharpen', {'strength': 1.0}),
+            ('clahe', {'clip_limit': 3.0, 'tile_grid': 8}),
+        ],
+    },
+}
+
+# Giảm nhiễu phân tầng (method 'denoise', src/denoiser.py): đo độ nhiễu σ rồi chọn bộ lọc
+# rẻ nhất đưa nhiễu còn lại (≈ σ × hệ số) về dưới DENOISE_TARGET_SIGMA trong DENOISE_BUDGET_MS
+DENOISE_TARGET_SIGMA = 4.0
+DENOISE_BUDGET_MS = 300
+# (tên tầng, hệ số nhiễu còn lại, chi phí ước lượng ms/megapixel) - từ rẻ đến đắt;
+# chi phí được hiệu chỉnh lại theo thời gian đo thực tế khi chạy
+DENOISE_TIERS = [
+    ('median', 0.75, 2.0),      # medianBlur 3x3
+    ('bilateral', 0.4, 8.0),    # bilateralFilter giữ cạnh nét chữ
+    ('nlm_text', 0.3, 1200.0),  # Non-local Means chỉ trên các khối chữ (ms/MP của phần khối chữ,
+                                # phần bilateral cả ảnh tính theo chi phí tầng 'bilateral')
+]
+
+# Định vị vùng chữ trước khi OCR: Tesseract chỉ chạy trên các khối chữ thay vì cả ảnh
+TEXT_DETECTION_ENABLED = True
+TEXT_DETECTION_WORK_SIZE = 1000  # Cạnh dài của ảnh thu nhỏ dùng để định vị (px)
+
+# OCR song song từng vùng: khối dài được chia thành dải tối đa OCR_BLOCK_MAX_LINES dòng,
+# các vùng được OCR đồng thời trên OCR_PARALLEL_WORKERS luồng (1 = tuần tự)
+OCR_BLOCK_MAX_LINES = 3
+OCR_PARALLEL_WORKERS = os.cpu_count() or 1
+
+# OCR lần hai cho SĐT, mã đơn, trọng lượng: chỉ vùng cắt của từ đó, --psm 7 + whitelist ký tự;
+# bỏ qua từ đã đúng định dạng với độ tin cậy ≥ FIELD_REOCR_SKIP_CONFIDENCE
+FIELD_REOCR_ENABLED = True
+FIELD_REOCR_SKIP_CONFIDENCE = 90
+
+# Cache kết quả OCR theo hash nội dung ảnh (SQLite, loại bỏ LRU khi vượt giới hạn)
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_FILE = DATA_DIR / "ocr_cache.sqlite3"
+RESULT_CACHE_MAX_ENTRIES = 10000
+
+# Dịch vụ HTTP (ocr_server.py): hàng đợi có giới hạn (đầy → 429), gom tối đa OCR_SERVICE_MAX_BATCH
+# yêu cầu đến trong OCR_SERVICE_BATCH_WAIT_MS thành một lô cho mỗi worker
+OCR_SERVICE_HOST = '127.0.0.1'
+OCR_SERVICE_PORT = 8080
+OCR_SERVICE_WORKERS = os.cpu_count() or 1
+OCR_SERVICE_QUEUE_SIZE = 64
+OCR_SERVICE_MAX_BATCH = 8
+OCR_SERVICE_BATCH_WAIT_MS = 10
+OCR_SERVICE_MAX_BODY = 20 * 1024 * 1024  # bytes
+OCR_SERVICE_TIMEOUT = 60  # giây chờ kết quả một yêu cầu
+# Chỉ đọc ảnh theo đường dẫn (file://) nằm trong các thư mục này
+OCR_SERVICE_FILE_ROOTS = [DATA_DIR]
+
+# Nhận dạng từ video/camera (src/video_stream.py): khung gần trùng được bỏ qua bằng so sánh bản thu nhỏ,
+# cảnh mới khi dHash khác > VIDEO_HASH_DISTANCE bit; mỗi cảnh chỉ OCR khung nét nhất (phương sai Laplacian)
+VIDEO_THUMB_WIDTH = 64  # px
+VIDEO_DIFF_THRESHOLD = 2.0  # trung bình |hiệu| mức xám
+VIDEO_HASH_DISTANCE = 12  # / 64 bit
+VIDEO_MIN_SHARPNESS = 100.0
+VIDEO_MIN_FRAMES = 3
+
+# Đo thời gian từng bước xử lý (histogram xuất dạng Prometheus/JSON, bảng thời gian trên app)
+METRICS_ENABLED = True
+
 # Cấu hình phân loại khu vực
 REGION_MAPPING_FILE = MODELS_DIR / "region_mapping.json"
 
+# Danh mục đơn vị hành chính tỉnh → quận/huyện → phường/xã và bản biên dịch nhị phân
+GAZETTEER_FILE = MODELS_DIR / "gazetteer.json"
+GAZETTEER_CACHE_FILE = DATA_DIR / "gazetteer.pickle"
+
 # Cấu hình Streamlit
 APP_TITLE = "Ứng dụng OCR Nhận dạng Nhãn Bưu kiện"
 APP_ICON = "📦"
@@ -0,0 +1,55 @@
+"""
+Chạy dịch vụ HTTP nhận dạng nhãn bưu kiện
+
+Ví dụ:
+    python ocr_server.py --port 8080 --workers 4
+    curl --data-binary @data/sample/nhan.jpg -H "Content-Type: image/jpeg" http://127.0.0.1:8080/ocr
+    curl -F "image=@data/sample/nhan.jpg" http://127.0.0.1:8080/ocr
+    curl -d '{"path": "data/sample/nhan.jpg"}' -H "Content-Type: application/json" http://127.0.0.1:8080/ocr
+    curl http://127.0.0.1:8080/health
+    curl http://127.0.0.1:8080/metrics
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Thêm thư mục gốc vào path
+sys.path.append(str(Path(__file__).parent))
+
+from src.ocr_service import OCRService
+from config.config import (OCR_SERVICE_HOST, OCR_SERVICE_PORT, OCR_SERVICE_WORKERS, OCR_SERVICE_QUEUE_SIZE,
+                           OCR_SERVICE_MAX_BATCH, OCR_SERVICE_BATCH_WAIT_MS)
+
+
+def parse_args(argv=None):
+    """Đọc tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(description="Dịch vụ HTTP nhận dạng nhãn bưu kiện")
+    parser.add_argument('--host', default=OCR_SERVICE_HOST, help="Địa chỉ lắng nghe (mặc định: %(default)s)")
+    parser.add_argument('--port', '-p', type=int, default=OCR_SERVICE_PORT, help="Cổng (mặc định: %(default)s)")
+    parser.add_argument('--workers', '-w', type=int, default=OCR_SERVICE_WORKERS,
+                        help="Số lô xử lý đồng thời (mặc định: %(default)s)")
+    parser.add_argument('--queue-size', type=int, default=OCR_SERVICE_QUEUE_SIZE,
+                        help="Số yêu cầu chờ tối đa trước khi trả về 429 (mặc định: %(default)s)")
+    parser.add_argument('--max-batch', type=int, default=OCR_SERVICE_MAX_BATCH,
+                        help="Số yêu cầu tối đa trong một lô (mặc định: %(default)s)")
+    parser.add_argument('--batch-wait-ms', type=float, default=OCR_SERVICE_BATCH_WAIT_MS,
+                        help="Thời gian chờ gom lô (mặc định: %(default)s ms)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Chạy dịch vụ cho tới khi nhấn Ctrl+C"""
+    args = parse_args(argv)
+    service = OCRService(workers=args.workers, queue_size=args.queue_size,
+                         max_batch=args.max_batch, batch_wait_ms=args.batch_wait_ms)
+    asyncio.run(service.serve_forever(args.host, args.port))
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n⚠️ Đã dừng dịch vụ.")
+        sys.exit(130)
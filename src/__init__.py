@@ -1,9 +1,32 @@
 """
 Khởi tạo package src
+
+Các lớp chính được import khi truy cập lần đầu (PEP 562) để `import src` không kéo theo
+OpenCV, pytesseract/pandas và PIL; CLI và worker chỉ tốn thời gian cho module thực sự dùng.
 """
-from .ocr_engine import OCREngine
-from .region_classifier import RegionClassifier
-from .image_processor import ImageProcessor
+import importlib
+
+# Tên công khai → module con chứa nó
+_LAZY_ATTRS = {
+    'OCREngine': 'ocr_engine',
+    'RegionClassifier': 'region_classifier',
+    'ImageProcessor': 'image_processor',
+    'LabelPipeline': 'pipeline',
+}
 
-__all__ = ['OCREngine', 'RegionClassifier', 'ImageProcessor']
+__all__ = ['OCREngine', 'RegionClassifier', 'ImageProcessor', 'LabelPipeline']
 __version__ = '1.0.0'
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    # Lưu lại để các lần truy cập sau không qua __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
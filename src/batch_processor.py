@@ -0,0 +1,292 @@
+"""
+Module xử lý hàng loạt ảnh nhãn bưu kiện: tiền xử lý → OCR → phân tích → phân loại
+"""
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+
+# Thêm thư mục config vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import IMAGE_EXTENSIONS, OUTPUT_DIR, RESULT_CACHE_ENABLED, PREPROCESS_METHOD
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Các cột kết quả (dùng chung cho JSONL và CSV)
+RESULT_FIELDS = [
+    'path', 'status', 'error', 'elapsed_ms',
+    'region', 'region_name', 'province', 'area_type', 'area_name', 'region_confidence',
+    'ocr_confidence',
+    'sender_name', 'sender_address', 'sender_phone',
+    'recipient_name', 'recipient_address', 'recipient_phone',
+    'postal_code', 'weight', 'order_id', 'raw_text',
+]
+
+# Pipeline riêng của từng tiến trình worker (khởi tạo một lần trong _init_worker)
+_worker_pipeline = None
+_worker_error = None
+
+
+def collect_images(source, extensions=IMAGE_EXTENSIONS) -> list:
+    """
+    Thu thập danh sách ảnh cần xử lý
+
+    Args:
+        source: Thư mục chứa ảnh (duyệt đệ quy) hoặc file text liệt kê
+                mỗi dòng một đường dẫn ảnh
+        extensions: Các đuôi file ảnh được chấp nhận
+
+    Returns:
+        list: Danh sách đường dẫn ảnh (đã sắp xếp nếu là thư mục)
+    """
+    source = Path(source)
+    allowed = {ext.lower() for ext in extensions}
+
+    if source.is_dir():
+        images = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if Path(name).suffix.lower() in allowed:
+                    images.append(str(Path(root) / name))
+        return images
+
+    if source.is_file():
+        images = []
+        with open(source, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    images.append(line)
+        return images
+
+    raise FileNotFoundError(f"Không tìm thấy thư mục hoặc file danh sách: {source}")
+
+
+def detect_format(output_path) -> str:
+    """Xác định định dạng output từ đuôi file (.csv hoặc mặc định JSONL)"""
+    return 'csv' if str(output_path).lower().endswith('.csv') else 'jsonl'
+
+
+def load_completed(output_path, fmt: str = None) -> set:
+    """
+    Đọc file kết quả đã có để tiếp tục sau khi bị dừng giữa chừng
+
+    Dòng cuối bị ghi dở (do crash) và các ảnh bị lỗi sẽ không được tính,
+    để lần chạy sau xử lý lại.
+
+    Returns:
+        set: Các đường dẫn ảnh đã xử lý thành công
+    """
+    output_path = Path(output_path)
+    if not output_path.exists():
+        return set()
+
+    fmt = fmt or detect_format(output_path)
+    completed = set()
+
+    with open(output_path, 'r', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                # Dòng ghi dở sẽ thiếu cột cuối
+                if row.get('status') == 'ok' and row.get(RESULT_FIELDS[-1]) is not None:
+                    completed.add(row['path'])
+        else:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get('status') == 'ok' and record.get('path'):
+                    completed.add(record['path'])
+
+    return completed
+
+
+class ResultWriter:
+    """Ghi kết quả dạng stream (JSONL hoặc CSV), flush sau mỗi nhãn"""
+
+    def __init__(self, output_path, fmt: str = None):
+        self.output_path = Path(output_path)
+        self.fmt = fmt or detect_format(self.output_path)
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        is_new = not self.output_path.exists() or self.output_path.stat().st_size == 0
+        needs_newline = not is_new and self._ends_without_newline()
+
+        self._file = open(self.output_path, 'a', encoding='utf-8', newline='')
+        if needs_newline:
+            # Tách dòng ghi dở của lần chạy trước
+            self._file.write('\n')
+
+        self._csv = None
+        if self.fmt == 'csv':
+            self._csv = csv.DictWriter(self._file, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+            if is_new:
+                self._csv.writeheader()
+
+    def _ends_without_newline(self) -> bool:
+        with open(self.output_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b'\n'
+
+    def write(self, record: dict) -> None:
+        """Ghi một kết quả và flush ngay để không mất dữ liệu khi crash"""
+        if self._csv is not None:
+            self._csv.writerow(record)
+        else:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def build_record(path: str, result: dict, elapsed: float) -> dict:
+    """Làm phẳng kết quả của LabelPipeline thành một dòng output"""
+    record = {field: '' for field in RESULT_FIELDS}
+    structured = result.get('structured', {})
+    classification = result.get('classification', {})
+
+    for field in RESULT_FIELDS:
+        if field in structured:
+            record[field] = structured[field]
+
+    record.update({
+        'path': path,
+        'status': 'ok',
+        'elapsed_ms': round(elapsed * 1000, 1),
+        'region': classification.get('region', ''),
+        'region_name': classification.get('region_name', ''),
+        'province': classification.get('province', ''),
+        'area_type': classification.get('area_type', ''),
+        'area_name': classification.get('area_name', ''),
+        'region_confidence': classification.get('confidence', 0),
+        'ocr_confidence': result.get('ocr', {}).get('confidence', 0),
+    })
+    return record
+
+
+def _init_worker(method: str, backend: str) -> None:
+    """Khởi tạo pipeline một lần cho mỗi tiến trình worker"""
+    global _worker_pipeline, _worker_error
+    try:
+        from src.ocr_engine import OCREngine
+        from src.region_classifier import RegionClassifier
+        from src.image_processor import ImageProcessor
+        from src.pipeline import LabelPipeline
+        from src.result_cache import ResultCache
+
+        # Mỗi tiến trình chỉ cần một worker Tesseract (song song ở mức tiến trình)
+        ocr = OCREngine(backend=backend, pool_size=1, workers=1)
+        cache = ResultCache() if RESULT_CACHE_ENABLED else None
+        _worker_pipeline = LabelPipeline(ocr, RegionClassifier(), ImageProcessor(osd=ocr.detect_orientation),
+                                         method=method, cache=cache)
+    except Exception as e:
+        # Không raise ở initializer - Pool sẽ tạo lại worker liên tục
+        _worker_error = f"Không thể khởi tạo pipeline: {e}"
+
+
+def _process_one(path: str) -> dict:
+    """Xử lý một ảnh trong tiến trình worker"""
+    start = time.perf_counter()
+    try:
+        if _worker_pipeline is None:
+            raise RuntimeError(_worker_error or "Pipeline chưa được khởi tạo")
+        result = _worker_pipeline.run(path)
+        return build_record(path, result, time.perf_counter() - start)
+    except Exception as e:
+        record = {field: '' for field in RESULT_FIELDS}
+        record.update({
+            'path': path,
+            'status': 'error',
+            'error': str(e),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 1),
+        })
+        return record
+
+
+class BatchProcessor:
+    """Chạy pipeline nhận dạng trên nhiều ảnh bằng pool tiến trình"""
+
+    def __init__(self, output_path=None, fmt: str = None, workers: int = None,
+                 method: str = PREPROCESS_METHOD, backend: str = 'auto', resume: bool = True):
+        """
+        Khởi tạo batch processor
+
+        Args:
+            output_path: File kết quả (mặc định OUTPUT_DIR/batch_results.jsonl)
+            fmt: 'jsonl' hoặc 'csv' (mặc định theo đuôi file)
+            workers: Số tiến trình (mặc định = số CPU)
+            method: Phương pháp tiền xử lý ảnh
+            backend: Backend Tesseract cho OCREngine
+            resume: Bỏ qua các ảnh đã xử lý thành công trong file kết quả
+        """
+        self.logger = logger
+        self.output_path = Path(output_path or OUTPUT_DIR / 'batch_results.jsonl')
+        self.fmt = fmt or detect_format(self.output_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.method = method
+        self.backend = backend
+        self.resume = resume
+
+    def run(self, paths: list, progress_every: int = 50) -> dict:
+        """
+        Xử lý danh sách ảnh và ghi kết quả dạng stream
+
+        Args:
+            paths: Danh sách đường dẫn ảnh
+            progress_every: Số nhãn giữa hai lần log tiến độ
+
+        Returns:
+            dict: Thống kê {'total', 'skipped', 'processed', 'errors',
+                            'elapsed', 'labels_per_second'}
+        """
+        completed = load_completed(self.output_path, self.fmt) if self.resume else set()
+        pending = [p for p in paths if p not in completed]
+
+        stats = {
+            'total': len(paths),
+            'skipped': len(paths) - len(pending),
+            'processed': 0,
+            'errors': 0,
+            'elapsed': 0.0,
+            'labels_per_second': 0.0,
+        }
+
+        if stats['skipped']:
+            self.logger.info(f"Tiếp tục từ lần chạy trước: bỏ qua {stats['skipped']} ảnh đã xử lý")
+        if not pending:
+            return stats
+
+        start = time.perf_counter()
+        with ResultWriter(self.output_path, self.fmt) as writer, \
+                multiprocessing.Pool(self.workers, initializer=_init_worker,
+                                     initargs=(self.method, self.backend)) as pool:
+            for record in pool.imap_unordered(_process_one, pending):
+                writer.write(record)
+                stats['processed'] += 1
+                if record['status'] != 'ok':
+                    stats['errors'] += 1
+                    self.logger.warning(f"Lỗi khi xử lý {record['path']}: {record['error']}")
+
+                if stats['processed'] % progress_every == 0:
+                    elapsed = time.perf_counter() - start
+                    self.logger.info(f"Đã xử lý {stats['processed']}/{len(pending)} ảnh "
+                                     f"({stats['processed'] / elapsed:.2f} nhãn/giây)")
+
+        stats['elapsed'] = round(time.perf_counter() - start, 2)
+        if stats['elapsed'] > 0:
+            stats['labels_per_second'] = round(stats['processed'] / stats['elapsed'], 2)
+        return stats
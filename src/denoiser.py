@@ -0,0 +1,167 @@
+"""
+Module giảm nhiễu phân tầng cho ảnh nhãn chụp bằng điện thoại
+
+Đo độ nhiễu σ của ảnh (ước lượng Immerkær, trung vị nên nét chữ không làm sai lệch) rồi chọn
+tầng lọc rẻ nhất đủ đưa nhiễu về dưới ngưỡng mục tiêu trong ngân sách thời gian:
+    median (vài ms) → bilateral (giữ cạnh nét chữ) → Non-local Means chỉ trên các khối chữ
+Chi phí mỗi tầng (ms/megapixel) được hiệu chỉnh theo thời gian đo thực tế.
+"""
+import time
+import logging
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Thêm thư mục gốc vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import DENOISE_TARGET_SIGMA, DENOISE_BUDGET_MS, DENOISE_TIERS
+from src.metrics import timer
+from src.text_detector import TextRegionDetector
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TieredDenoiser:
+    """Chọn và áp dụng bộ lọc nhiễu rẻ nhất đạt mục tiêu"""
+
+    # Laplacian kép của Immerkær: triệt tiêu vùng phẳng/dốc đều, giữ lại nhiễu (chuẩn L2 = 6)
+    NOISE_KERNEL = np.array([[1, -2, 1],
+                             [-2, 4, -2],
+                             [1, -2, 1]], dtype=np.float32)
+    # Trọng số cập nhật chi phí ms/megapixel từ lần đo mới nhất
+    COST_SMOOTHING = 0.3
+
+    def __init__(self, target_sigma: float = DENOISE_TARGET_SIGMA, budget_ms: float = DENOISE_BUDGET_MS,
+                 tiers=DENOISE_TIERS, detector: TextRegionDetector = None):
+        """
+        Args:
+            target_sigma: Độ nhiễu còn lại mong muốn (mức xám)
+            budget_ms: Ngân sách thời gian cho một ảnh (gồm cả định vị khối chữ)
+            tiers: Các tầng (tên, hệ số nhiễu còn lại, chi phí ms/megapixel) từ rẻ đến đắt
+            detector: TextRegionDetector dùng cho tầng 'nlm_text' (mặc định tạo mới)
+        """
+        self.logger = logger
+        self.target_sigma = target_sigma
+        self.budget_ms = budget_ms
+        self.tiers = [(name, factor) for name, factor, _ in tiers]
+        self.cost = {name: cost for name, _, cost in tiers}
+        self.detector = detector or TextRegionDetector()
+
+    def estimate_noise(self, gray: np.ndarray) -> float:
+        """
+        Ước lượng độ lệch chuẩn của nhiễu Gauss (mức xám)
+
+        Args:
+            gray: Ảnh grayscale uint8
+
+        Returns:
+            float: σ ước lượng
+        """
+        response = cv2.convertScaleAbs(cv2.filter2D(gray, cv2.CV_16S, self.NOISE_KERNEL))
+        histogram = np.cumsum(cv2.calcHist([response], [0], None, [256], [0, 256]).ravel())
+        median = int(np.searchsorted(histogram, histogram[-1] / 2.0))
+        # median(|N(0, 36σ²)|) = 0.6745 × 6σ
+        return median / (0.6745 * 6)
+
+    def _calibrate(self, name: str, elapsed_ms: float, megapixels: float):
+        """Cập nhật chi phí ms/megapixel của một tầng từ thời gian đo được trên diện tích đã xử lý"""
+        if megapixels:
+            measured = elapsed_ms / megapixels
+            current = self.cost.get(name, measured)
+            self.cost[name] = current + self.COST_SMOOTHING * (measured - current)
+
+    def _median(self, gray: np.ndarray, sigma: float, blocks: list, deadline: float) -> np.ndarray:
+        return cv2.medianBlur(gray, 3)
+
+    def _bilateral(self, gray: np.ndarray, sigma: float, blocks: list, deadline: float) -> np.ndarray:
+        return cv2.bilateralFilter(gray, 5, 3.0 * sigma, 3)
+
+    def _nlm_text(self, gray: np.ndarray, sigma: float, blocks: list, deadline: float) -> np.ndarray:
+        """
+        Bilateral cho cả ảnh, NLM cho từng khối chữ cho tới khi hết ngân sách
+
+        Hai phần được đo riêng: bilateral theo diện tích cả ảnh, NLM theo diện tích các khối đã lọc.
+        """
+        bilateral_start = time.perf_counter()
+        denoised = self._bilateral(gray, sigma, blocks, deadline)
+        nlm_start = time.perf_counter()
+        self._calibrate('bilateral', (nlm_start - bilateral_start) * 1000, gray.size / 1e6)
+
+        done = 0
+        for x, y, w, h in blocks:
+            if time.perf_counter() > deadline:
+                self.logger.debug("Hết ngân sách thời gian - các khối chữ còn lại chỉ lọc bilateral")
+                break
+            denoised[y:y + h, x:x + w] = cv2.fastNlMeansDenoising(
+                np.ascontiguousarray(gray[y:y + h, x:x + w]), None, max(3.0, sigma), 7, 21)
+            done += w * h
+        self._calibrate('nlm_text', (time.perf_counter() - nlm_start) * 1000, done / 1e6)
+        return denoised
+
+    def denoise(self, image: np.ndarray) -> dict:
+        """
+        Giảm nhiễu ảnh bằng tầng lọc rẻ nhất đạt DENOISE_TARGET_SIGMA trong ngân sách
+
+        Args:
+            image: Ảnh BGR hoặc grayscale
+
+        Returns:
+            dict: {
+                'image': ảnh grayscale đã giảm nhiễu (ảnh gốc nếu đã đủ sạch),
+                'sigma': độ nhiễu đo được,
+                'tier': tên tầng đã dùng, None nếu không lọc,
+                'expected_sigma': độ nhiễu còn lại ước lượng,
+                'elapsed_ms': thời gian xử lý
+            }
+        """
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000.0
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        with timer('noise_estimate'):
+            sigma = self.estimate_noise(gray)
+
+        result = {'image': gray, 'sigma': round(sigma, 2), 'tier': None,
+                  'expected_sigma': round(sigma, 2), 'elapsed_ms': 0.0}
+        if sigma <= self.target_sigma:
+            result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+            return result
+
+        # Tầng rẻ nhất đạt mục tiêu; nếu không tầng nào vừa ngân sách mà đạt thì lấy tầng mạnh nhất vừa ngân sách
+        blocks = None
+        chosen = self.tiers[0]
+        megapixels = gray.size / 1e6
+        for name, factor in self.tiers:
+            estimate_ms = self.cost[name] * megapixels
+            if name == 'nlm_text':
+                # Chỉ định vị khối chữ khi các tầng rẻ hơn không đạt mục tiêu
+                if blocks is None:
+                    blocks = self.detector.detect(gray)['blocks']
+                # Bilateral trên cả ảnh + NLM trên phần khối chữ
+                estimate_ms = (self.cost.get('bilateral', 0.0) * megapixels
+                               + self.cost[name] * sum(w * h for _, _, w, h in blocks) / 1e6)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if elapsed_ms + estimate_ms > self.budget_ms:
+                continue
+            chosen = (name, factor)
+            if sigma * factor <= self.target_sigma:
+                break
+
+        name, factor = chosen
+        tier_start = time.perf_counter()
+        with timer(f'denoise_{name}'):
+            denoised = getattr(self, f'_{name}')(gray, sigma, blocks or [], deadline)
+        if name != 'nlm_text':
+            # 'nlm_text' tự hiệu chỉnh từng phần (bilateral cả ảnh, NLM trên khối chữ)
+            self._calibrate(name, (time.perf_counter() - tier_start) * 1000, megapixels)
+
+        result.update({
+            'image': denoised,
+            'tier': name,
+            'expected_sigma': round(sigma * factor, 2),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2),
+        })
+        self.logger.debug(f"Nhiễu σ={sigma:.1f} → lọc '{name}' ({result['elapsed_ms']:.0f} ms)")
+        return result
@@ -0,0 +1,350 @@
+"""
+Module danh mục đơn vị hành chính phân cấp: tỉnh/thành → quận/huyện → phường/xã
+
+Dữ liệu nguồn ở models/gazetteer.json được biên dịch một lần thành bảng tra cứu
+(dict từ tên đã bỏ dấu → đơn vị) và lưu dạng pickle; các lần khởi động sau chỉ
+cần load file nhị phân này.
+"""
+import json
+import logging
+import os
+import pickle
+import re
+import sys
+import unicodedata
+from pathlib import Path
+
+# Thêm thư mục config vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import GAZETTEER_FILE, GAZETTEER_CACHE_FILE
+from src.text_normalizer import fold_text, fold_with_offsets
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Tăng khi đổi cấu trúc dữ liệu biên dịch để bỏ qua cache cũ
+COMPILED_FORMAT_VERSION = 1
+
+LEVELS = ['province', 'district', 'ward']
+
+# Tiền tố đơn vị hành chính (đã bỏ dấu): (tiền tố, loại, viết tắt)
+UNIT_PREFIXES = [
+    ('thanh pho', 'thanh_pho', ['tp']),
+    ('thi xa', 'thi_xa', ['tx']),
+    ('thi tran', 'thi_tran', ['tt']),
+    ('quan', 'quan', ['q']),
+    ('huyen', 'huyen', ['h']),
+    ('phuong', 'phuong', ['p']),
+    ('xa', 'xa', ['x']),
+    ('tinh', 'tinh', []),
+]
+
+# Viết tắt dính liền số trong text OCR: "Q1", "P05", "Q.10"
+ABBREVIATED_NUMBER = re.compile(r'^(tp|tx|tt|q|h|p|x)(\d+)$')
+
+AREA_NAMES = {
+    'noi_o': 'NỘI Ô',
+    'ngoai_o': 'NGOẠI Ô',
+}
+
+
+def split_unit_name(name: str, default_type: str = '') -> tuple:
+    """
+    Tách tiền tố hành chính khỏi tên đơn vị
+
+    VD: "Quận Ba Đình" → ('quan', 'Ba Đình'), "TP. Hồ Chí Minh" → ('thanh_pho', 'Hồ Chí Minh')
+
+    Returns:
+        tuple: (loại đơn vị, tên không có tiền tố)
+    """
+    folded_words = fold_text(name).split()
+    for prefix, unit_type, abbreviations in UNIT_PREFIXES:
+        for form in [prefix] + abbreviations:
+            prefix_words = form.split()
+            if folded_words[:len(prefix_words)] == prefix_words and len(folded_words) > len(prefix_words):
+                # Bỏ đúng số từ của tiền tố trong tên gốc (dấu câu như "TP." không tính là từ)
+                words = re.findall(r'\w+', name)
+                rest = name[name.index(words[len(prefix_words)]):]
+                return unit_type, rest
+    return default_type, name
+
+
+def unit_keys(name: str, unit_type: str) -> list:
+    """
+    Sinh các khóa tra cứu (đã bỏ dấu) cho một đơn vị
+
+    Đơn vị đặt tên bằng số chỉ tra được kèm tiền tố ("quan 1", "q 1"),
+    đơn vị có tên riêng tra bằng tên ("ba dinh").
+    """
+    folded = fold_text(name)
+    if not folded.isdigit():
+        return [folded]
+
+    number = folded.lstrip('0') or '0'
+    keys = []
+    for prefix, prefix_type, abbreviations in UNIT_PREFIXES:
+        if prefix_type == unit_type:
+            keys.extend(f"{form} {number}" for form in [prefix] + abbreviations)
+    return keys
+
+
+def compile_gazetteer(data: dict) -> dict:
+    """
+    Biên dịch dữ liệu JSON thành bảng tra cứu
+
+    Returns:
+        dict: {
+            'units': list các tuple (tên, cấp, id cha, loại, khu vực, nội/ngoại ô),
+            'keys': dict khóa đã bỏ dấu → tuple id đơn vị,
+            'province_keys': dict khóa → id tỉnh/thành,
+            'key_sizes': tuple số từ của các khóa
+        }
+    """
+    units = []
+    keys = {}
+    province_keys = {}
+    default_area = data.get('default_area', 'ngoai_o')
+
+    def add_unit(name, level, parent, unit_type, region, area, extra_keys=()):
+        unit_id = len(units)
+        units.append((name, level, parent, unit_type, region, area))
+        for key in list(unit_keys(split_unit_name(name, unit_type)[1], unit_type)) + list(extra_keys):
+            ids = keys.setdefault(key, [])
+            if unit_id not in ids:
+                ids.append(unit_id)
+        return unit_id
+
+    def display_name(raw_name, default_type):
+        unit_type, name = split_unit_name(raw_name, default_type)
+        # Đơn vị đặt tên bằng số giữ tiền tố khi hiển thị ("Quận 1")
+        return (raw_name if fold_text(name).isdigit() else name), unit_type
+
+    for province in data.get('provinces', []):
+        region = province['region']
+        province_area = province.get('area', default_area)
+        aliases = [fold_text(alias) for alias in province.get('aliases', [])]
+        province_id = add_unit(province['name'], 0, None, province.get('type', 'tinh'),
+                               region, province_area, aliases)
+        for key in unit_keys(province['name'], '') + aliases:
+            province_keys[key] = province_id
+
+        for district in province.get('districts', []):
+            if isinstance(district, str):
+                district = {'name': district}
+            name, unit_type = display_name(district['name'], 'quan')
+            district_area = district.get('area', province_area)
+            district_id = add_unit(name, 1, province_id, unit_type, region, district_area)
+
+            for ward in district.get('wards', []):
+                if isinstance(ward, str):
+                    ward = {'name': ward}
+                name, unit_type = display_name(ward['name'], 'phuong')
+                add_unit(name, 2, district_id, unit_type, region, ward.get('area', district_area))
+
+    return {
+        'units': units,
+        'keys': {key: tuple(ids) for key, ids in keys.items()},
+        'province_keys': province_keys,
+        'key_sizes': tuple(sorted({len(key.split()) for key in keys})),
+    }
+
+
+class Gazetteer:
+    """Tra cứu đơn vị hành chính và chuỗi cấp cha bằng bảng băm"""
+
+    def __init__(self, source=GAZETTEER_FILE, cache_file=GAZETTEER_CACHE_FILE):
+        """
+        Khởi tạo gazetteer
+
+        Args:
+            source: File JSON danh mục đơn vị hành chính
+            cache_file: File pickle lưu bảng đã biên dịch (None = không dùng cache)
+        """
+        self.logger = logger
+        self.source = Path(source)
+        self.cache_file = Path(cache_file) if cache_file else None
+
+        compiled = self._load()
+        self.units = compiled['units']
+        self.keys = compiled['keys']
+        self.province_keys = compiled['province_keys']
+        self.key_sizes = compiled['key_sizes']
+
+    def _source_signature(self) -> tuple:
+        """Chữ ký file nguồn để phát hiện cache đã cũ"""
+        stat = self.source.stat()
+        return (COMPILED_FORMAT_VERSION, stat.st_mtime_ns, stat.st_size)
+
+    def _load(self) -> dict:
+        """Load bảng đã biên dịch từ cache, biên dịch lại nếu cache thiếu hoặc cũ"""
+        empty = {'units': [], 'keys': {}, 'province_keys': {}, 'key_sizes': ()}
+        try:
+            signature = self._source_signature()
+        except OSError as e:
+            self.logger.error(f"Không tìm thấy danh mục hành chính: {e}")
+            return empty
+
+        if self.cache_file and self.cache_file.exists():
+            try:
+                with open(self.cache_file, 'rb') as f:
+                    cached = pickle.load(f)
+                if cached.get('signature') == signature:
+                    return cached['data']
+            except Exception as e:
+                self.logger.warning(f"Bỏ qua cache danh mục hành chính lỗi: {e}")
+
+        try:
+            with open(self.source, 'r', encoding='utf-8') as f:
+                compiled = compile_gazetteer(json.load(f))
+        except Exception as e:
+            self.logger.error(f"Lỗi khi load danh mục hành chính: {e}")
+            return empty
+
+        if self.cache_file:
+            try:
+                self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.cache_file.with_suffix(f'.{os.getpid()}.tmp')
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump({'signature': signature, 'data': compiled}, f,
+                                protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.cache_file)
+            except OSError as e:
+                self.logger.warning(f"Không ghi được cache danh mục hành chính: {e}")
+
+        self.logger.info(f"Đã biên dịch danh mục hành chính: {len(compiled['units'])} đơn vị")
+        return compiled
+
+    def chain(self, unit_id: int) -> list:
+        """Chuỗi id từ tỉnh/thành xuống đơn vị"""
+        ids = []
+        while unit_id is not None:
+            ids.append(unit_id)
+            unit_id = self.units[unit_id][2]
+        return ids[::-1]
+
+    def describe(self, unit_id: int) -> dict:
+        """
+        Thông tin đầy đủ của một đơn vị
+
+        Returns:
+            dict: {
+                'name', 'level' (province/district/ward), 'type',
+                'province', 'district', 'ward', 'chain' (list tên từ tỉnh xuống),
+                'region' (mien_bac/mien_trung/mien_nam), 'area_type' (noi_o/ngoai_o)
+            }
+        """
+        name, level, _, unit_type, region, area = self.units[unit_id]
+        names = [self.units[i][0] for i in self.chain(unit_id)]
+        names += [''] * (len(LEVELS) - len(names))
+        return {
+            'name': name,
+            'level': LEVELS[level],
+            'type': unit_type,
+            'province': names[0],
+            'district': names[1],
+            'ward': names[2],
+            'chain': [n for n in names if n],
+            'region': region,
+            'area_type': area,
+        }
+
+    def lookup(self, name: str) -> list:
+        """
+        Tìm các đơn vị theo tên (không phân biệt dấu, có/không có tiền tố)
+
+        Args:
+            name: VD "Quận 1", "Ba Đình", "Thành phố Thủ Dầu Một", "Ha Noi"
+
+        Returns:
+            list: Các dict từ describe (một tên có thể thuộc nhiều tỉnh)
+        """
+        unit_type, bare = split_unit_name(name)
+        candidates = [fold_text(name)] + unit_keys(bare, unit_type)
+        for key in candidates:
+            ids = self.keys.get(key)
+            if ids:
+                return [self.describe(unit_id) for unit_id in ids]
+        return []
+
+    def find_province(self, name: str):
+        """
+        Tìm tỉnh/thành theo tên hoặc tên viết tắt ("TP. Hồ Chí Minh", "Sài Gòn", "hcm")
+
+        Returns:
+            dict hoặc None: Thông tin tỉnh/thành (describe)
+        """
+        if not name:
+            return None
+        unit_id = self.province_keys.get(fold_text(name))
+        if unit_id is None:
+            unit_id = self.province_keys.get(fold_text(split_unit_name(name)[1]))
+        return self.describe(unit_id) if unit_id is not None else None
+
+    def _tokenize(self, text: str) -> tuple:
+        """
+        Tách text thành các từ đã bỏ dấu kèm vị trí trong text gốc
+
+        "Q1"/"P05" được tách thành tiền tố + số, số bỏ các chữ số 0 ở đầu.
+        """
+        folded, offsets = fold_with_offsets(text)
+        tokens = []
+        for match in re.finditer(r'\S+', folded):
+            token = match.group()
+            start = offsets[match.start()]
+            end = offsets[match.end() - 1] + 1
+            abbreviated = ABBREVIATED_NUMBER.match(token)
+            if abbreviated:
+                tokens.append((abbreviated.group(1), start, end))
+                token = abbreviated.group(2)
+            if token.isdigit():
+                token = token.lstrip('0') or '0'
+            tokens.append((token, start, end))
+        return tokens
+
+    def locate(self, text: str):
+        """
+        Xác định đơn vị hành chính sâu nhất trong địa chỉ
+
+        Mỗi cụm từ của text chỉ cần một lần tra dict; trong các đơn vị tìm được,
+        chọn đơn vị có nhiều cấp cha cũng xuất hiện trong địa chỉ nhất
+        (VD: "Phường Vĩnh Phúc, Ba Đình, Hà Nội" → phường, không phải tỉnh Vĩnh Phúc),
+        nếu bằng nhau ưu tiên đơn vị xuất hiện sau rồi đến cấp cao hơn. Quận/huyện, phường/xã không có cấp cha
+        nào trong địa chỉ phải viết đúng dấu ("Nguyễn Huệ" không phải "Thành phố Huế").
+
+        Args:
+            text: Địa chỉ (có dấu hoặc không dấu)
+
+        Returns:
+            dict hoặc None: describe() của đơn vị kèm 'span' (start, end) trong text
+        """
+        tokens = self._tokenize(text)
+        text_lower = unicodedata.normalize('NFC', text).lower()
+        found = {}
+        exact = set()
+
+        for size in self.key_sizes:
+            for start in range(len(tokens) - size + 1):
+                key = ' '.join(token for token, _, _ in tokens[start:start + size])
+                span = (tokens[start][1], tokens[start + size - 1][2])
+                for unit_id in self.keys.get(key, ()):
+                    found[unit_id] = span
+                    if any(char.isdigit() for char in key) or \
+                            text_lower[span[0]:span[1]] == self.units[unit_id][0].lower():
+                        exact.add(unit_id)
+
+        candidates = []
+        for unit_id, span in found.items():
+            confirmed = sum(1 for ancestor in self.chain(unit_id) if ancestor in found)
+            level = self.units[unit_id][1]
+            if level > 0 and confirmed == 1 and unit_id not in exact:
+                continue
+            # Trùng tên cùng vị trí (phường Vĩnh Phúc / tỉnh Vĩnh Phúc): ưu tiên cấp cao hơn
+            candidates.append(((confirmed, span[1], -level), unit_id))
+
+        if not candidates:
+            return None
+
+        best = max(candidates)[1]
+        result = self.describe(best)
+        result['span'] = found[best]
+        return result
@@ -5,6 +5,15 @@ import cv2
 import numpy as np
 from PIL import Image
 import logging
+import sys
+from pathlib import Path
+
+# Thêm thư mục gốc vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import OCR_TARGET_X_HEIGHT, ADAPTIVE_MAX_SIDE, PREPROCESS_PIPELINES
+from src.metrics import timed, timer
+from src.preprocess_pipeline import PreprocessPipeline
+from src.denoiser import TieredDenoiser
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -13,40 +22,119 @@ logger = logging.getLogger(__name__)
 class ImageProcessor:
     """Xử lý ảnh để tăng độ chính xác của OCR"""
 
-    def __init__(self):
+    # Cạnh dài của bản thu nhỏ dùng để ước lượng cỡ chữ
+    TEXT_SIZE_WORK_SIZE = 1000
+    # Tỉ lệ x-height / chiều cao ký tự phổ biến (chữ hoa, chữ số, chữ có nét lên) của font Latin
+    X_HEIGHT_RATIO = 0.7
+
+    # Sửa nghiêng: cạnh dài bản thu nhỏ, số điểm nét chữ tối đa, góc tìm kiếm (±độ)
+    SKEW_WORK_SIZE = 800
+    SKEW_MAX_POINTS = 40000
+    MAX_SKEW_ANGLE = 15.0
+    # Góc nghiêng nhỏ hơn mức này không xoay (tránh nội suy làm mờ chữ vô ích)
+    MIN_SKEW_ANGLE = 0.3
+    # |điểm lộn ngược| nhỏ hơn mức này → hỏi Tesseract OSD (nếu có)
+    UPSIDE_DOWN_MARGIN = 0.2
+
+    # Tìm nhãn: cạnh dài bản thu nhỏ, diện tích tối thiểu (tỉ lệ ảnh), độ lấp đầy tứ giác tối thiểu
+    LABEL_WORK_SIZE = 800
+    LABEL_MIN_AREA = 0.02
+    LABEL_MIN_FILL = 0.85
+    # Nhãn chiếm gần hết ảnh (ảnh quét, ảnh đã cắt sát) → không cần nắn phối cảnh
+    RECTIFY_MAX_AREA = 0.9
+
+    _ROTATE_CODES = {
+        90: cv2.ROTATE_90_CLOCKWISE,
+        180: cv2.ROTATE_180,
+        270: cv2.ROTATE_90_COUNTERCLOCKWISE,
+    }
+
+    def __init__(self, osd=None):
+        """
+        Args:
+            osd: Hàm nhận ảnh đã nằm ngang, trả về góc xoay theo chiều kim đồng hồ
+                 (0/90/180/270) để ảnh đúng chiều hoặc None - VD: OCREngine.detect_orientation.
+                 Chỉ được gọi khi không tự xác định được ảnh có bị lộn ngược không
+        """
         self.logger = logger
+        self.osd = osd
+        # Các chuỗi tiền xử lý khai báo trong config (CLAHE, kernel, buffer được dùng lại giữa các ảnh)
+        self.pipelines = {name: PreprocessPipeline.from_spec(spec)
+                          for name, spec in PREPROCESS_PIPELINES.items()}
+        self.denoiser = TieredDenoiser()
+
+    @timed('decode')
+    def load_image(self, source) -> np.ndarray:
+        """
+        Đọc ảnh về numpy array (BGR) mà không cần ghi file tạm
+
+        Args:
+            source: Đường dẫn ảnh, bytes của file ảnh (VD: từ st.file_uploader),
+                    PIL Image hoặc numpy array
 
-    def preprocess_image(self, image_path: str, method: str = 'minimal') -> np.ndarray:
+        Returns:
+            np.ndarray: Ảnh dạng BGR (hoặc grayscale nếu đầu vào là ảnh xám)
+        """
+        if isinstance(source, np.ndarray):
+            return source
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            # Giải mã trực tiếp từ bộ nhớ
+            buffer = np.frombuffer(source, dtype=np.uint8)
+            image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError("Không thể giải mã ảnh từ dữ liệu bytes")
+            return image
+
+        if isinstance(source, Image.Image):
+            if source.mode == 'L':
+                return np.asarray(source)
+            rgb = np.asarray(source.convert('RGB'))
+            return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+        image = cv2.imread(str(source))
+        if image is None:
+            raise ValueError(f"Không thể đọc ảnh từ {source}")
+        return image
+
+    @timed('preprocess')
+    def preprocess_image(self, image_path, method: str = 'minimal') -> np.ndarray:
         """
         Tiền xử lý ảnh trước khi OCR
 
         Args:
-            image_path: Đường dẫn đến ảnh hoặc numpy array của ảnh
+            image_path: Đường dẫn đến ảnh, bytes của file ảnh, PIL Image
+                        hoặc numpy array của ảnh
             method: Phương pháp xử lý:
                 - 'minimal': Giữ nguyên ảnh gốc, chỉ resize nếu cần (KHUYẾN NGHỊ)
+                - 'adaptive': Như 'minimal' nhưng resize theo cỡ chữ ước lượng được,
+                  đưa x-height về khoảng OCR_TARGET_X_HEIGHT
+                - 'deskew': Xoay ảnh đúng chiều (90/180/270°), sửa nghiêng rồi như 'adaptive'
+                - 'rectify': Nắn phối cảnh nhãn về nhìn thẳng, resize theo x-height trong cùng một lần warp
                 - 'auto': Tăng contrast và độ sắc nét
                 - 'grayscale': Chuyển sang ảnh xám
                 - 'threshold': Nhị phân hóa (chỉ dùng khi ảnh rất rõ nét)
-                - 'denoise': Giảm nhiễu
+                - 'denoise': Giảm nhiễu phân tầng theo độ nhiễu đo được (trả về ảnh xám)
+                - Tên chuỗi khai báo trong PREPROCESS_PIPELINES (VD: 'auto_gray')
 
         Returns:
             np.ndarray: Ảnh đã được xử lý
         """
         try:
-            # Đọc ảnh nếu là đường dẫn, hoặc dùng trực tiếp nếu là numpy array
-            if isinstance(image_path, str):
-                image = cv2.imread(image_path)
-                if image is None:
-                    raise ValueError(f"Không thể đọc ảnh từ {image_path}")
-            else:
-                # Đã là numpy array
-                image = image_path
+            # Đọc ảnh (đường dẫn, bytes, PIL) hoặc dùng trực tiếp nếu là numpy array
+            image = self.load_image(image_path)
 
-            self.logger.info(f"Đọc ảnh thành công: {image_path}")
+            self.logger.debug(f"Đọc ảnh thành công: {image.shape[1]}x{image.shape[0]}")
 
             if method == 'minimal':
                 # Chỉ resize nếu ảnh quá lớn, giữ nguyên màu sắc
                 processed = self._minimal_process(image)
+            elif method == 'adaptive':
+                processed = self._adaptive_process(image)
+            elif method == 'deskew':
+                processed = self._adaptive_process(self.detect_and_correct_skew(image))
+            elif method == 'rectify':
+                processed = self._rectify_process(image)
             elif method == 'auto':
                 # Tự động xử lý với tăng contrast
                 processed = self._auto_process(image)
@@ -56,6 +144,8 @@ class ImageProcessor:
                 processed = self._apply_threshold(image)
             elif method == 'denoise':
                 processed = self._denoise(image)
+            elif method in self.pipelines:
+                processed = self.pipelines[method].run(image)
             else:
                 processed = image
 
@@ -66,43 +156,8 @@ class ImageProcessor:
             raise
 
     def _auto_process(self, image: np.ndarray) -> np.ndarray:
-        """Tự động xử lý ảnh với pipeline tối ưu cho nhãn bưu kiện"""
-        # Với nhãn bưu kiện, giữ ảnh gốc càng nhiều càng tốt
-
-        # Resize nếu ảnh quá lớn (giúp OCR nhanh hơn)
-        height, width = image.shape[:2]
-        if width > 2000 or height > 2000:
-            scale = min(2000/width, 2000/height)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
-            self.logger.info(f"Resize ảnh từ {width}x{height} xuống {new_width}x{new_height}")
-
-        # Tăng độ sắc nét nhẹ
-        kernel_sharpening = np.array([[-1,-1,-1],
-                                      [-1, 9,-1],
-                                      [-1,-1,-1]])
-        sharpened = cv2.filter2D(image, -1, kernel_sharpening)
-
-        # Tăng contrast nhẹ bằng CLAHE (áp dụng cho từng channel nếu ảnh màu)
-        if len(image.shape) == 3:
-            # Chuyển sang LAB color space
-            lab = cv2.cvtColor(sharpened, cv2.COLOR_BGR2LAB)
-            l, a, b = cv2.split(lab)
-
-            # Áp dụng CLAHE cho channel L
-            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-            l = clahe.apply(l)
-
-            # Merge và chuyển về BGR
-            enhanced_lab = cv2.merge([l, a, b])
-            enhanced = cv2.cvtColor(enhanced_lab, cv2.COLOR_LAB2BGR)
-        else:
-            # Ảnh grayscale
-            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-            enhanced = clahe.apply(sharpened)
-
-        return enhanced
+        """Tự động xử lý ảnh với pipeline tối ưu cho nhãn bưu kiện (resize, làm nét, CLAHE trên kênh L)"""
+        return self.pipelines['auto'].run(image)
 
     def _minimal_process(self, image: np.ndarray) -> np.ndarray:
         """Xử lý tối thiểu - chỉ resize nếu cần"""
@@ -113,39 +168,161 @@ class ImageProcessor:
             scale = min(3000/width, 3000/height)
             new_width = int(width * scale)
             new_height = int(height * scale)
-            resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
-            self.logger.info(f"Resize ảnh từ {width}x{height} xuống {new_width}x{new_height}")
+            with timer('resize'):
+                resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+            self.logger.debug(f"Resize ảnh từ {width}x{height} xuống {new_width}x{new_height}")
             return resized
         elif width < 800 and height < 800:
             # Upscale ảnh nhỏ
             scale = min(1200/width, 1200/height)
             new_width = int(width * scale)
             new_height = int(height * scale)
-            resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
-            self.logger.info(f"Upscale ảnh từ {width}x{height} lên {new_width}x{new_height}")
+            with timer('resize'):
+                resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
+            self.logger.debug(f"Upscale ảnh từ {width}x{height} lên {new_width}x{new_height}")
             return resized
 
         # Ảnh có kích thước vừa phải, giữ nguyên
         return image
 
+    @timed('text_size')
+    def estimate_x_height(self, image: np.ndarray) -> float:
+        """
+        Ước lượng x-height (px) của chữ chiếm đa số trên ảnh
+
+        Nhị phân hóa bản thu nhỏ, lấy chiều cao các thành phần liên thông giống ký tự
+        (trung vị có trọng số theo diện tích nên dấu thanh, nhiễu nhỏ không ảnh hưởng).
+
+        Args:
+            image: Ảnh BGR hoặc grayscale
+
+        Returns:
+            float: x-height theo pixel của ảnh gốc, 0 nếu không tìm thấy chữ
+        """
+        gray = self._convert_to_grayscale(image)
+        height, width = gray.shape[:2]
+        scale = min(1.0, self.TEXT_SIZE_WORK_SIZE / float(max(height, width)))
+
+        while True:
+            small = gray
+            if scale < 1.0:
+                small = cv2.resize(gray, (max(1, int(width * scale)), max(1, int(height * scale))),
+                                   interpolation=cv2.INTER_AREA)
+            binary = cv2.adaptiveThreshold(small, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                           cv2.THRESH_BINARY_INV, 31, 20)
+            _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+            w = stats[1:, cv2.CC_STAT_WIDTH]
+            h = stats[1:, cv2.CC_STAT_HEIGHT]
+            area = stats[1:, cv2.CC_STAT_AREA]
+            # Giống ký tự: không quá dẹt, không đặc kín (vết bẩn), không rỗng (đường kẻ)
+            glyph = ((h >= 4) & (h <= max(small.shape) // 8) & (w <= 5 * h)
+                     & (area >= 0.1 * w * h) & (area < 0.95 * w * h))
+            if not glyph.any():
+                return 0.0
+
+            h, area = h[glyph], area[glyph]
+            order = np.argsort(h)
+            cumulative = np.cumsum(area[order])
+            glyph_height = float(h[order][np.searchsorted(cumulative, cumulative[-1] / 2)])
+
+            # Chữ quá nhỏ trên bản thu nhỏ → đo lại ở độ phân giải gấp đôi
+            if glyph_height >= 8 or scale >= 1.0:
+                return glyph_height * self.X_HEIGHT_RATIO / scale
+            scale = min(1.0, scale * 2)
+
+    def _adaptive_process(self, image: np.ndarray) -> np.ndarray:
+        """Resize để x-height rơi vào khoảng Tesseract nhận dạng tốt nhất"""
+        x_height = self.estimate_x_height(image)
+        if not x_height:
+            # Không ước lượng được cỡ chữ - quay về xử lý tối thiểu
+            return self._minimal_process(image)
+
+        low, high = OCR_TARGET_X_HEIGHT
+        if low <= x_height <= high:
+            return image
+        return self._resize_to_x_height(image, x_height)
+
+    def _rectify_process(self, image: np.ndarray) -> np.ndarray:
+        """
+        Nắn phối cảnh nhãn lớn nhất về nhìn thẳng
+
+        Tỉ lệ để x-height về giữa OCR_TARGET_X_HEIGHT được gộp vào ma trận phối cảnh, nên cắt,
+        nắn và resize chỉ tốn một lần warpPerspective. Không tìm thấy nhãn hoặc nhãn chiếm
+        gần hết ảnh → như 'adaptive'.
+        """
+        labels = self.detect_labels(image, max_labels=1)
+        if not labels or labels[0]['area'] > self.RECTIFY_MAX_AREA:
+            return self._adaptive_process(image)
+
+        quad = labels[0]['quad']
+        tl, tr, br, bl = quad
+        width = max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl))
+        height = max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr))
+
+        # Đo cỡ chữ trên vùng bao quanh nhãn (trước khi nắn - đủ chính xác với phối cảnh vừa phải)
+        x, y, w, h = cv2.boundingRect(np.round(quad).astype(np.int32))
+        x, y = max(0, x), max(0, y)
+        x_height = self.estimate_x_height(image[y:y + h, x:x + w])
+
+        scale = 1.0
+        low, high = OCR_TARGET_X_HEIGHT
+        if x_height and not low <= x_height <= high:
+            scale = (low + high) / 2.0 / x_height
+        scale = min(scale, ADAPTIVE_MAX_SIDE / max(width, height))
+        size = (int(round(width * scale)), int(round(height * scale)))
+        with timer('rectify'):
+            rectified = self.warp_label(image, quad, size,
+                                        interpolation=cv2.INTER_CUBIC if scale > 1 else cv2.INTER_LINEAR)
+        self.logger.debug(f"Nắn nhãn {width:.0f}x{height:.0f} → {size[0]}x{size[1]} (x-height {x_height:.1f}px)")
+        return rectified
+
+    def _resize_to_x_height(self, image: np.ndarray, x_height: float) -> np.ndarray:
+        """Resize để x-height (đo trên ảnh này) về giữa khoảng OCR_TARGET_X_HEIGHT"""
+        low, high = OCR_TARGET_X_HEIGHT
+        height, width = image.shape[:2]
+        scale = (low + high) / 2.0 / x_height
+        scale = min(scale, ADAPTIVE_MAX_SIDE / float(max(height, width)))
+        new_width, new_height = max(1, int(width * scale)), max(1, int(height * scale))
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+        with timer('resize'):
+            resized = cv2.resize(image, (new_width, new_height), interpolation=interpolation)
+        self.logger.debug(f"x-height {x_height:.1f}px → resize {width}x{height} thành {new_width}x{new_height}")
+        return resized
+
     def _convert_to_grayscale(self, image: np.ndarray) -> np.ndarray:
         """Chuyển ảnh sang grayscale"""
         if len(image.shape) == 3:
             return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         return image
 
+    @timed('threshold')
     def _apply_threshold(self, image: np.ndarray) -> np.ndarray:
         """Áp dụng threshold để làm rõ text"""
         gray = self._convert_to_grayscale(image)
         _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
         return thresh
 
+    @timed('denoise')
     def _denoise(self, image: np.ndarray) -> np.ndarray:
-        """Giảm nhiễu trong ảnh"""
-        if len(image.shape) == 3:
-            return cv2.fastNlMeansDenoisingColored(image, None, 10, 10, 7, 21)
-        else:
-            return cv2.fastNlMeansDenoising(image, None, 10, 7, 21)
+        """
+        Giảm nhiễu trên ảnh xám trong ngân sách thời gian DENOISE_BUDGET_MS
+
+        Chữ lớn hơn cần thiết thì thu nhỏ trước (INTER_AREA cũng trung bình hóa nhiễu và các bộ lọc
+        chạy trên ít pixel hơn); chữ quá nhỏ thì lọc trước rồi mới phóng to.
+        """
+        gray = self._convert_to_grayscale(image)
+        x_height = self.estimate_x_height(gray)
+        low, high = OCR_TARGET_X_HEIGHT
+        if x_height > high:
+            gray = self._resize_to_x_height(gray, x_height)
+
+        result = self.denoiser.denoise(gray)
+        self.logger.debug(f"Nhiễu σ={result['sigma']} → tầng {result['tier']}, "
+                          f"còn ≈{result['expected_sigma']} ({result['elapsed_ms']} ms)")
+
+        if 0 < x_height < low:
+            return self._resize_to_x_height(result['image'], x_height)
+        return result['image']
 
     def resize_image(self, image: np.ndarray, max_width: int = 1920,
                      max_height: int = 1080) -> np.ndarray:
@@ -173,16 +350,17 @@ class ImageProcessor:
         resized = cv2.resize(image, (new_width, new_height),
                            interpolation=cv2.INTER_AREA)
 
-        self.logger.info(f"Resize ảnh từ {width}x{height} xuống {new_width}x{new_height}")
+        self.logger.debug(f"Resize ảnh từ {width}x{height} xuống {new_width}x{new_height}")
         return resized
 
-    def rotate_image(self, image: np.ndarray, angle: float) -> np.ndarray:
+    def rotate_image(self, image: np.ndarray, angle: float, expand: bool = False) -> np.ndarray:
         """
         Xoay ảnh theo góc cho trước
 
         Args:
             image: Ảnh cần xoay
             angle: Góc xoay (độ)
+            expand: Mở rộng khung ảnh để không mất các góc sau khi xoay
 
         Returns:
             np.ndarray: Ảnh đã được xoay
@@ -191,15 +369,167 @@ class ImageProcessor:
         center = (width // 2, height // 2)
 
         rotation_matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+        if expand:
+            cos, sin = abs(rotation_matrix[0, 0]), abs(rotation_matrix[0, 1])
+            new_width = int(round(height * sin + width * cos))
+            new_height = int(round(height * cos + width * sin))
+            rotation_matrix[0, 2] += new_width / 2.0 - center[0]
+            rotation_matrix[1, 2] += new_height / 2.0 - center[1]
+            width, height = new_width, new_height
         rotated = cv2.warpAffine(image, rotation_matrix, (width, height),
                                 flags=cv2.INTER_CUBIC,
                                 borderMode=cv2.BORDER_REPLICATE)
 
         return rotated
 
+    def _text_pixels(self, gray: np.ndarray) -> np.ndarray:
+        """Ảnh nhị phân (0/1) các nét chữ tối trên nền sáng, đã bỏ viền/đường kẻ dài"""
+        binary = cv2.adaptiveThreshold(gray, 1, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                       cv2.THRESH_BINARY_INV, 31, 20)
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        limit = max(gray.shape) // 8
+        too_long = (stats[:, cv2.CC_STAT_WIDTH] > limit) | (stats[:, cv2.CC_STAT_HEIGHT] > limit)
+        too_long[0] = False
+        if too_long.any():
+            binary[too_long[labels]] = 0
+        return binary
+
+    @staticmethod
+    def _profile_sharpness(points: np.ndarray, angle: float, axis: int = 1) -> float:
+        """
+        Độ "nhọn" của projection profile khi xoay các điểm một góc (độ)
+
+        Dòng chữ song song với trục chiếu cho profile có đỉnh cao, khe sâu → CV² lớn.
+        axis=1 chiếu theo hàng (dòng ngang), axis=0 chiếu theo cột (dòng dọc).
+        """
+        theta = np.deg2rad(angle)
+        x, y = points[:, 0], points[:, 1]
+        if axis == 1:
+            projected = -np.sin(theta) * x + np.cos(theta) * y
+        else:
+            projected = np.cos(theta) * x + np.sin(theta) * y
+        projected = np.round(projected - projected.min()).astype(np.int32)
+        histogram = np.bincount(projected).astype(np.float64)
+        # CV² của profile: B * Σh² / N² - 1 (không phụ thuộc số điểm và số bin)
+        return len(histogram) * float(np.dot(histogram, histogram)) / float(histogram.sum()) ** 2 - 1.0
+
+    def _search_angle(self, points: np.ndarray, axis: int = 1) -> tuple:
+        """Tìm góc (độ) làm profile nhọn nhất: lưới thô 0.5° trong ±MAX rồi tinh chỉnh 0.05°"""
+        coarse = np.arange(-self.MAX_SKEW_ANGLE, self.MAX_SKEW_ANGLE + 1e-6, 0.5)
+        scores = [self._profile_sharpness(points, angle, axis) for angle in coarse]
+        best = float(coarse[int(np.argmax(scores))])
+        fine = np.arange(best - 0.5, best + 0.5 + 1e-6, 0.05)
+        scores = [self._profile_sharpness(points, angle, axis) for angle in fine]
+        index = int(np.argmax(scores))
+        return float(fine[index]), scores[index]
+
+    @staticmethod
+    def _upside_down_score(binary: np.ndarray) -> float:
+        """
+        Điểm lộn ngược của các dòng chữ nằm ngang (> 0: đúng chiều, < 0: lộn ngược)
+
+        Mỗi dòng có vùng lõi x-height (các hàng đậm nhất). Chữ Latin/tiếng Việt đúng chiều
+        có nhiều nét phía trên lõi (chữ hoa, nét lên b/d/h/l, dấu thanh) hơn phía dưới
+        (chỉ nét xuống g/p/q/y); ảnh lộn ngược thì ngược lại.
+
+        Returns:
+            float: (trên - dưới) / (trên + dưới), trong khoảng [-1, 1]
+        """
+        profile = binary.sum(axis=1).astype(np.float64)
+        if not profile.any():
+            return 0.0
+        active = profile > profile.max() * 0.05
+        above = below = 0.0
+        row = 0
+        while row < len(profile):
+            if not active[row]:
+                row += 1
+                continue
+            top = row
+            while row < len(profile) and active[row]:
+                row += 1
+            band = profile[top:row]
+            if len(band) < 5:
+                continue
+            core = np.nonzero(band >= band.max() * 0.5)[0]
+            above += band[:core[0]].sum()
+            below += band[core[-1] + 1:].sum()
+        if above + below == 0:
+            return 0.0
+        return (above - below) / (above + below)
+
+    @timed('orientation')
+    def detect_orientation(self, image: np.ndarray) -> dict:
+        """
+        Ước lượng hướng (0/90/180/270°) và góc nghiêng của chữ trên bản thu nhỏ
+
+        Bộ nhớ bị chặn: chỉ làm việc trên ảnh cạnh dài SKEW_WORK_SIZE và tối đa
+        SKEW_MAX_POINTS điểm nét chữ, không phụ thuộc độ phân giải ảnh gốc.
+
+        Args:
+            image: Ảnh BGR hoặc grayscale
+
+        Returns:
+            dict: {
+                'rotation': góc xoay chẵn 90° theo chiều kim đồng hồ cần áp dụng trước,
+                'angle': góc (độ) truyền cho rotate_image sau khi xoay 'rotation',
+                'method': 'projection', 'osd' hoặc 'none' (không đủ nét chữ)
+            }
+        """
+        result = {'rotation': 0, 'angle': 0.0, 'method': 'none'}
+        gray = self._convert_to_grayscale(image)
+        height, width = gray.shape[:2]
+        scale = min(1.0, self.SKEW_WORK_SIZE / float(max(height, width)))
+        if scale < 1.0:
+            gray = cv2.resize(gray, (max(1, int(width * scale)), max(1, int(height * scale))),
+                              interpolation=cv2.INTER_AREA)
+
+        binary = self._text_pixels(gray)
+        ys, xs = np.nonzero(binary)
+        if len(xs) < 50:
+            return result
+        stride = max(1, len(xs) // self.SKEW_MAX_POINTS)
+        points = np.column_stack((xs[::stride], ys[::stride])).astype(np.float32)
+
+        # Dòng chữ nằm ngang hay dọc (nhãn xoay 90° khi quét bằng máy cầm tay)
+        angle, horizontal = self._search_angle(points, axis=1)
+        vertical_angle, vertical = self._search_angle(points, axis=0)
+        rotation = 0
+        if vertical > horizontal:
+            rotation, angle = 90, vertical_angle
+            binary = cv2.rotate(binary, cv2.ROTATE_90_CLOCKWISE)
+
+        # Đúng chiều hay lộn ngược: ước lượng từ hình dạng dòng, Tesseract OSD khi không chắc
+        if abs(angle) > 0.05:
+            matrix = cv2.getRotationMatrix2D((binary.shape[1] / 2.0, binary.shape[0] / 2.0), angle, 1.0)
+            binary = cv2.warpAffine(binary, matrix, (binary.shape[1], binary.shape[0]),
+                                    flags=cv2.INTER_NEAREST, borderValue=0)
+        score = self._upside_down_score(binary)
+        method = 'projection'
+        if abs(score) < self.UPSIDE_DOWN_MARGIN and self.osd is not None:
+            upright = self._apply_orientation(image, rotation, angle)
+            osd_rotation = self.osd(upright)
+            if osd_rotation is not None:
+                rotation = (rotation + osd_rotation) % 360
+                method = 'osd'
+        elif score < 0:
+            rotation = (rotation + 180) % 360
+
+        result.update({'rotation': rotation, 'angle': round(angle, 2), 'method': method})
+        return result
+
+    def _apply_orientation(self, image: np.ndarray, rotation: int, angle: float) -> np.ndarray:
+        """Xoay ảnh theo kết quả detect_orientation"""
+        if rotation:
+            image = cv2.rotate(image, self._ROTATE_CODES[rotation])
+        if abs(angle) >= self.MIN_SKEW_ANGLE:
+            image = self.rotate_image(image, angle, expand=True)
+        return image
+
+    @timed('deskew')
     def detect_and_correct_skew(self, image: np.ndarray) -> np.ndarray:
         """
-        Phát hiện và sửa độ nghiêng của ảnh
+        Phát hiện và sửa hướng (90/180/270°) và độ nghiêng của ảnh
 
         Args:
             image: Ảnh cần sửa
@@ -208,35 +538,117 @@ class ImageProcessor:
             np.ndarray: Ảnh đã được sửa nghiêng
         """
         try:
-            # Chuyển sang grayscale
-            gray = self._convert_to_grayscale(image)
+            orientation = self.detect_orientation(image)
+            if orientation['rotation'] or abs(orientation['angle']) >= self.MIN_SKEW_ANGLE:
+                self.logger.debug(f"Xoay {orientation['rotation']}°, sửa nghiêng {orientation['angle']:.2f}° "
+                                  f"({orientation['method']})")
+            return self._apply_orientation(image, orientation['rotation'], orientation['angle'])
 
-            # Áp dụng threshold
-            _, binary = cv2.threshold(gray, 0, 255,
-                                    cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        except Exception as e:
+            self.logger.warning(f"Không thể sửa độ nghiêng: {e}")
+            return image
 
-            # Tìm các điểm không phải background
-            coords = np.column_stack(np.where(binary > 0))
+    @staticmethod
+    def order_quad(points: np.ndarray) -> np.ndarray:
+        """Sắp xếp 4 đỉnh theo thứ tự trên-trái, trên-phải, dưới-phải, dưới-trái"""
+        points = np.asarray(points, dtype=np.float32).reshape(4, 2)
+        sums = points.sum(axis=1)
+        diffs = np.diff(points, axis=1).ravel()
+        return np.array([points[np.argmin(sums)], points[np.argmin(diffs)],
+                         points[np.argmax(sums)], points[np.argmax(diffs)]], dtype=np.float32)
+
+    @timed('label_detect')
+    def detect_labels(self, image: np.ndarray, max_labels: int = 8) -> list:
+        """
+        Tìm các nhãn (tờ giấy sáng hình tứ giác) trên ảnh chụp một hoặc nhiều kiện hàng
 
-            # Tính góc nghiêng
-            angle = cv2.minAreaRect(coords)[-1]
+        Trên bản thu nhỏ: Otsu tách vùng sáng, đóng hình thái học để lấp chữ, mỗi contour ngoài
+        đủ lớn được xấp xỉ thành tứ giác (approxPolyDP, hoặc minAreaRect nếu contour đủ đặc).
 
-            # Điều chỉnh góc
-            if angle < -45:
-                angle = 90 + angle
-            elif angle > 45:
-                angle = angle - 90
+        Args:
+            image: Ảnh BGR hoặc grayscale
+            max_labels: Số nhãn tối đa (lấy các nhãn lớn nhất)
 
-            # Xoay ảnh nếu góc nghiêng đáng kể
-            if abs(angle) > 0.5:
-                self.logger.info(f"Sửa độ nghiêng: {angle:.2f} độ")
-                return self.rotate_image(image, angle)
+        Returns:
+            list: Các dict {'quad': 4 đỉnh float32 (tọa độ ảnh gốc, thứ tự order_quad), 'area': tỉ lệ diện tích},
+                  theo thứ tự đọc (trên → dưới, trái → phải)
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        height, width = gray.shape[:2]
+        scale = min(1.0, self.LABEL_WORK_SIZE / max(height, width))
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+
+        blurred = cv2.GaussianBlur(small, (5, 5), 0)
+        _, mask = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        kernel_size = max(3, int(min(small.shape[:2]) * 0.02) | 1)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_size, kernel_size))
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        min_area = self.LABEL_MIN_AREA * small.shape[0] * small.shape[1]
+        labels = []
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:max_labels]:
+            area = cv2.contourArea(contour)
+            if area < min_area:
+                break
+            approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+            if len(approx) == 4 and cv2.isContourConvex(approx):
+                quad = approx.reshape(4, 2)
+            else:
+                # Góc nhãn bị che/bo tròn: dùng hình chữ nhật bao nhỏ nhất nếu contour gần như lấp đầy nó
+                rect = cv2.minAreaRect(contour)
+                if area < self.LABEL_MIN_FILL * rect[1][0] * rect[1][1]:
+                    continue
+                quad = cv2.boxPoints(rect)
+            labels.append({'quad': self.order_quad(quad) / scale,
+                           'area': round(area / (small.shape[0] * small.shape[1]), 4)})
+
+        # Thứ tự đọc theo góc trên-trái (các nhãn lệch nhau < 10% chiều cao ảnh coi như cùng hàng)
+        labels.sort(key=lambda label: (round(float(label['quad'][0][1]) / (0.1 * height)),
+                                       float(label['quad'][0][0])))
+        return labels
+
+    @staticmethod
+    def warp_label(image: np.ndarray, quad: np.ndarray, size: tuple = None,
+                   interpolation: int = cv2.INTER_LINEAR) -> np.ndarray:
+        """
+        Cắt và nắn phẳng nhãn bằng một lần warpPerspective
 
-            return image
+        Args:
+            image: Ảnh gốc
+            quad: 4 đỉnh nhãn (thứ tự order_quad)
+            size: (rộng, cao) của ảnh kết quả; mặc định theo độ dài cạnh của tứ giác
+            interpolation: Phép nội suy của warpPerspective
 
-        except Exception as e:
-            self.logger.warning(f"Không thể sửa độ nghiêng: {e}")
-            return image
+        Returns:
+            np.ndarray: Ảnh nhãn nhìn thẳng
+        """
+        tl, tr, br, bl = quad
+        if size is None:
+            size = (int(round(max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl)))),
+                    int(round(max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr)))))
+        width, height = max(1, size[0]), max(1, size[1])
+        target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+        matrix = cv2.getPerspectiveTransform(np.asarray(quad, dtype=np.float32), target)
+        return cv2.warpPerspective(image, matrix, (width, height), flags=interpolation,
+                                   borderMode=cv2.BORDER_REPLICATE)
+
+    def split_labels(self, image, max_labels: int = 8) -> list:
+        """
+        Tách ảnh chụp nhiều kiện thành ảnh từng nhãn đã nắn phẳng
+
+        Args:
+            image: Đường dẫn, bytes, PIL Image hoặc numpy array
+            max_labels: Số nhãn tối đa
+
+        Returns:
+            list: Các dict {'image': ảnh nhãn, 'quad': 4 đỉnh trên ảnh gốc}; rỗng nếu không tìm thấy nhãn
+        """
+        image = self.load_image(image)
+        labels = self.detect_labels(image, max_labels=max_labels)
+        with timer('label_warp'):
+            return [{'image': self.warp_label(image, label['quad']), 'quad': label['quad']} for label in labels]
 
     def crop_border(self, image: np.ndarray, border_size: int = 10) -> np.ndarray:
         """
@@ -0,0 +1,103 @@
+"""
+Module dựng bố cục nhãn từ tọa độ từng từ của Tesseract (details của extract_text_with_confidence)
+
+- group_lines: gom từ thành dòng theo tâm dọc, tách dòng tại khoảng trống ngang lớn (nhãn hai cột)
+- group_blocks: gom các dòng liền nhau, chồng nhau theo chiều ngang thành khối (cột/đoạn)
+"""
+
+# Khoảng trống ngang > GAP_RATIO × chiều cao chữ → hai cột khác nhau trên cùng một hàng
+GAP_RATIO = 2.5
+# Dòng dưới cách khối > BLOCK_GAP_RATIO × chiều cao dòng → khối mới
+BLOCK_GAP_RATIO = 1.2
+# Tỉ lệ chồng ngang tối thiểu (so với dòng hẹp hơn) để dòng thuộc cùng khối
+MIN_HORIZONTAL_OVERLAP = 0.3
+
+
+def _make_line(words: list) -> dict:
+    """Dòng từ các từ đã sắp xếp trái → phải"""
+    left = min(w['left'] for w in words)
+    top = min(w['top'] for w in words)
+    right = max(w['left'] + w['width'] for w in words)
+    bottom = max(w['top'] + w['height'] for w in words)
+    heights = sorted(w['height'] for w in words)
+    return {
+        'text': ' '.join(w['text'] for w in words),
+        'words': words,
+        'left': left,
+        'top': top,
+        'right': right,
+        'bottom': bottom,
+        'height': heights[len(heights) // 2],
+    }
+
+
+def group_lines(words: list) -> list:
+    """
+    Gom các từ thành dòng
+
+    Args:
+        words: list dict có 'text', 'left', 'top', 'width', 'height' (và 'block' - vùng OCR)
+
+    Returns:
+        list dict dòng {'text', 'words', 'left', 'top', 'right', 'bottom', 'height'},
+        sắp xếp trên → dưới, trái → phải
+    """
+    rows = []
+    ordered = sorted(words, key=lambda w: (w.get('block', 0), w['top'] + w['height'] / 2.0))
+    for word in ordered:
+        center = word['top'] + word['height'] / 2.0
+        row = rows[-1] if rows else None
+        # Cùng vùng OCR và tâm từ nằm trong dải dọc của dòng hiện tại
+        if (row is not None and row['block'] == word.get('block', 0)
+                and row['top'] <= center <= row['bottom']):
+            row['words'].append(word)
+            row['top'] = min(row['top'], word['top'])
+            row['bottom'] = max(row['bottom'], word['top'] + word['height'])
+        else:
+            rows.append({'block': word.get('block', 0), 'words': [word],
+                         'top': word['top'], 'bottom': word['top'] + word['height']})
+
+    lines = []
+    for row in rows:
+        row_words = sorted(row['words'], key=lambda w: w['left'])
+        heights = sorted(w['height'] for w in row_words)
+        max_gap = GAP_RATIO * heights[len(heights) // 2]
+
+        segment = [row_words[0]]
+        for word in row_words[1:]:
+            previous = segment[-1]
+            if word['left'] - (previous['left'] + previous['width']) > max_gap:
+                lines.append(_make_line(segment))
+                segment = []
+            segment.append(word)
+        lines.append(_make_line(segment))
+
+    return sorted(lines, key=lambda line: (line['top'], line['left']))
+
+
+def group_blocks(lines: list) -> list:
+    """
+    Gom các dòng thành khối: dòng nằm ngay dưới và chồng ngang với dòng cuối của khối
+
+    Args:
+        lines: Kết quả của group_lines
+
+    Returns:
+        list khối, mỗi khối là list dòng trên → dưới; các khối theo thứ tự dòng đầu (trên → dưới, trái → phải)
+    """
+    blocks = []
+    for line in lines:
+        target = None
+        for block in blocks:
+            last = block[-1]
+            overlap = min(last['right'], line['right']) - max(last['left'], line['left'])
+            narrower = min(last['right'] - last['left'], line['right'] - line['left'])
+            gap = line['top'] - last['bottom']
+            if (narrower > 0 and overlap >= MIN_HORIZONTAL_OVERLAP * narrower
+                    and gap <= BLOCK_GAP_RATIO * max(last['height'], line['height'])):
+                target = block
+        if target is None:
+            blocks.append([line])
+        else:
+            target.append(line)
+    return blocks
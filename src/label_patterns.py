@@ -0,0 +1,94 @@
+"""
+Module bảng regex đã biên dịch sẵn cho việc trích xuất thông tin nhãn bưu kiện
+
+Tất cả pattern được compile một lần khi import, dùng chung cho PostalLabelParser
+và các hàm _extract_* của OCREngine, để chi phí parse không tăng theo số nhãn.
+"""
+import re
+
+# Tỉnh/thành phố dùng để neo điểm kết thúc địa chỉ (_extract_address_after_name)
+ADDRESS_PROVINCES = [
+    'Hồ Chí Minh', 'Hà Nội', 'Đà Nẵng', 'Bình Dương', 'Đồng Nai',
+    'Bà Rịa', 'Thủ Đầu Một', 'Cần Thơ', 'Hải Phòng', 'Long An'
+]
+
+PATTERNS = {
+    # Nhãn phân đoạn "Người gửi" / "Người nhận"
+    'sender_label': re.compile(r'Ng[ưu]+[oơờớởỡợ]+i\s+g[ửữưu]+i', re.IGNORECASE),
+    'recipient_label': re.compile(r'Ng[ưu]+[oơờớởỡợ]+i\s+nh[ậâa]+n', re.IGNORECASE),
+
+    # Số điện thoại, mã bưu chính, mã đơn hàng, trọng lượng
+    'phone': re.compile(r'0\d{9,10}'),
+    'phone_word': re.compile(r'\b0\d{9,10}\b'),
+    'phone_separated': re.compile(r'\d{3}[-.\s]?\d{3}[-.\s]?\d{4}'),
+    'postal_code': re.compile(r'\b\d{5,6}\b'),
+    'order_id': re.compile(r'Order\s*[:\s]*(\d+)', re.IGNORECASE),
+    'weight': re.compile(r'[Tt]r[oọ]ng\s+l[uươ]+ng.*?(\d+[.,]\d+)\s*KG', re.IGNORECASE),
+
+    # Tên sau "gửi"/"nhận" (PostalLabelParser._extract_name_simple)
+    'name_after_gửi': re.compile(r'gửi\s+([A-ZÀ-Ỹ][A-Za-zÀ-ỹ\s]+?)(?=\s*[A-Z]?\d|\s+Số|$)',
+                                 re.IGNORECASE),
+    'name_after_nhận': re.compile(r'nhận\s+([A-ZÀ-Ỹ][A-Za-zÀ-ỹ\s]+?)(?=\s*[A-Z]?\d|\s+Số|$)',
+                                  re.IGNORECASE),
+
+    # Tên theo section (PostalLabelParser._extract_name_from_section)
+    'section_name_gửi': re.compile(r'g[ửữ]+i\s+([A-Z][A-Za-zÀ-ỹ\s]+?)(?=\s+\d+\s+[a-zà-ỹ]|\s*\d{2,}|$)',
+                                   re.IGNORECASE),
+    'section_name_nhận': re.compile(r'nh[ậa]+n\s+([A-Z][A-Za-zÀ-ỹ\s]+?)(?=\s+[A-Z]?\d|\s+[Ss]ố|$)',
+                                    re.IGNORECASE),
+
+    # Tên người gửi/nhận (OCREngine._extract_name)
+    'engine_name_sender': re.compile(
+        r'Ng[ưu]+[oơờớởỡợ]+i\s+g[ửữưu]+i\s+([A-Z][A-Za-zÀ-ỹ\s]+?)(?=\s*\d|\s+[pqthđ]|$)', re.IGNORECASE),
+    'engine_name_recipient': re.compile(
+        r'Ng[ưu]+[oơờớởỡợ]+i\s+nh[ậâa]+n\s+([A-Z][A-Za-zÀ-ỹ\s]+?)(?=\s*[A-Z]?\d|\s+[SsNn][ốoơ]|$)',
+        re.IGNORECASE),
+
+    # Địa chỉ theo section (PostalLabelParser._extract_address_from_section)
+    'section_addresses': [
+        # Có số nhà và đầy đủ thông tin
+        re.compile(r'(\d+[A-Za-z,.\s]+(?:phường|quận|huyện)[^,\n]{5,}?(?:Hồ Chí Minh|Hà Nội|Đà Nẵng|'
+                   r'Bình Dương|Thành Phố|Tỉnh)[^,\n]{0,30})', re.IGNORECASE),
+        # Có "Số" và địa chỉ
+        re.compile(r'(Số\s+\d+[^,\n]{10,}?(?:Phường|Quận|Huyện)[^,\n]{5,})', re.IGNORECASE),
+        # Từ số đến quận/huyện
+        re.compile(r'(\d+[^,\n]{10,}?(?:Quận|Huyện|Thành)[^,\n]{5,})', re.IGNORECASE),
+    ],
+
+    # Địa chỉ theo từ khóa hành chính (OCREngine._extract_address)
+    'engine_addresses': [
+        re.compile(r'(?:Số\s+)?(\d+[A-Z]?\d*[,\s]+[^,\n]+?(?:phường|phư[oơ]+ng|quận|qu[aậ]+n|huyện|'
+                   r'huy[eệ]+n|thành phố|tỉnh|thị xã)[^,\n]*(?:,\s*[^,\n]+)*)', re.IGNORECASE),
+        re.compile(r'(\d+\s+[^,\n]+?(?:đường|[đd]u[oơ]+ng)[^,\n]*(?:,\s*[^,\n]+)*)', re.IGNORECASE),
+        re.compile(r'((?:phường|quận|huyện|thành phố|tỉnh)\s+[^,\n]+(?:,\s*[^,\n]+)*)', re.IGNORECASE),
+    ],
+
+    # Từ khóa kết thúc địa chỉ
+    'address_end': re.compile(r'(?:Trọng lượng|Order|người nhận ký|Người nhận|\d{10,})', re.IGNORECASE),
+    'address_end_short': re.compile(r'(?:Trọng|Order|\d{10,})', re.IGNORECASE),
+    'section_address_end': re.compile(r'(?:Trọng|Order|người nhận ký)', re.IGNORECASE),
+
+    # Địa chỉ theo dòng (PostalLabelParser._address_from_lines)
+    # Chỗ bắt đầu địa chỉ trong phần còn lại của dòng nhãn/tên: "Số 96", số nhà đầu dòng, từ khóa hành chính
+    'address_start': re.compile(r'Số\s*\d+|^\d{1,4}\b|(?:đường|khu phố|phường|quận|huyện|thị xã|thành phố|tỉnh)\b',
+                                re.IGNORECASE),
+    # Nhóm số trần cuối địa chỉ (mã phân loại "800" sau tên tỉnh), trừ khi là số của phường/quận...
+    'trailing_digit_groups': re.compile(r'(?:[\s,]+\d+)+$'),
+    'numbered_unit': re.compile(r'(?:số|đường|khu phố|ấp|tổ|phường|quận|huyện|p|q)\.?$', re.IGNORECASE),
+
+    # Làm sạch
+    'whitespace': re.compile(r'\s+'),
+    'multi_space': re.compile(r'\s{2,}'),
+    'trailing_digits': re.compile(r'\s*\d.*$'),
+    'trailing_number_words': re.compile(r'\s+\d.*$'),
+}
+
+# Pattern địa chỉ theo từng tỉnh: (tỉnh, "Số" + số + ... + tỉnh, số 1-4 chữ số + ... + tỉnh)
+PROVINCE_ADDRESS_PATTERNS = [
+    (
+        province,
+        re.compile(rf'(Số\s+\d+.{{10,}}?{province})', re.IGNORECASE),
+        re.compile(rf'(\d{{1,4}}\s+.{{15,}}?{province})', re.IGNORECASE),
+    )
+    for province in ADDRESS_PROVINCES
+]
@@ -0,0 +1,285 @@
+"""
+Module đo thời gian từng bước xử lý (decode, resize, CLAHE, deskew, Tesseract, parse, classify)
+
+- timer('stage') / @timed('stage'): đo một bước, ghi vào histogram dùng chung của tiến trình
+- trace(): gom thời gian các bước của MỘT nhãn (hiển thị trên app)
+- to_prometheus() / to_dict(): xuất histogram dạng text Prometheus hoặc JSON
+- increment('metric', nhãn=...): bộ đếm sự kiện (VD: số lần cascade phải chuyển phương pháp)
+
+Khi tắt (METRICS_ENABLED = False hoặc set_enabled(False)) timer chỉ trả về một
+context manager rỗng dùng chung, chi phí gần như bằng 0.
+"""
+import bisect
+import functools
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+# Thêm thư mục config vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import METRICS_ENABLED
+
+# Biên trên các bucket (giây), tương tự mặc định của Prometheus client
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_NAME = 'label_stage_duration_seconds'
+
+_enabled = METRICS_ENABLED
+
+# Thời gian các bước của nhãn đang xử lý (mỗi luồng/tác vụ có trace riêng)
+_current_trace = ContextVar('label_trace', default=None)
+# Luồng phụ chạy trong copy_context() ghi chung trace với luồng gọi
+_trace_lock = threading.Lock()
+
+
+class Histogram:
+    """Histogram thời gian với bucket cố định (an toàn khi dùng nhiều luồng)"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Ghi nhận một lần đo (giây)"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Ước lượng phân vị từ bucket (nội suy tuyến tính trong bucket)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for index, count in enumerate(self.counts):
+            upper = self.buckets[index] if index < len(self.buckets) else self.max
+            if count and cumulative + count >= target:
+                return lower + (upper - lower) * (target - cumulative) / count
+            cumulative += count
+            lower = upper
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum_seconds': round(self.sum, 6),
+            'mean_ms': round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.quantile(0.5) * 1000, 3),
+            'p95_ms': round(self.quantile(0.95) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+        }
+
+
+class MetricsRegistry:
+    """Tập histogram theo tên bước xử lý"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        # (tên metric, ((nhãn, giá trị), ...)) → số đếm
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str) -> Histogram:
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Ghi nhận thời gian của một bước"""
+        self.histogram(stage).observe(seconds)
+
+    def increment(self, metric: str, labels: dict, amount: int = 1) -> None:
+        """Tăng bộ đếm metric với bộ nhãn labels"""
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def counters(self, metric: str) -> list:
+        """Các bộ đếm của metric: list (dict nhãn, số đếm)"""
+        return [(dict(labels), value) for (name, labels), value in sorted(self._counters.items())
+                if name == metric]
+
+    def to_dict(self) -> dict:
+        """Thống kê các bước dạng dict (JSON)"""
+        return {stage: histogram.to_dict() for stage, histogram in sorted(self._histograms.items())}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Xuất histogram theo định dạng text của Prometheus"""
+        lines = [
+            f'# HELP {METRIC_NAME} Thời gian từng bước xử lý nhãn bưu kiện',
+            f'# TYPE {METRIC_NAME} histogram',
+        ]
+        for stage, histogram in sorted(self._histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+            lines.append(f'{METRIC_NAME}_count{{stage="{stage}"}} {histogram.count}')
+
+        current = None
+        for (metric, labels), value in sorted(self._counters.items()):
+            if metric != current:
+                lines.append(f'# TYPE {metric} counter')
+                current = metric
+            label_text = ','.join(f'{name}="{label}"' for name, label in labels)
+            lines.append(f'{metric}{{{label_text}}} {value}' if label_text else f'{metric} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+# Registry mặc định của tiến trình
+registry = MetricsRegistry()
+
+
+def set_enabled(enabled: bool) -> None:
+    """Bật/tắt đo thời gian khi đang chạy"""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class _NullTimer:
+    """Context manager rỗng dùng khi tắt đo thời gian"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    """Đo thời gian một bước và ghi vào registry + trace của nhãn hiện tại"""
+
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def record(stage: str, seconds: float) -> None:
+    """Ghi nhận thời gian đã đo sẵn cho một bước"""
+    if not _enabled:
+        return
+    registry.observe(stage, seconds)
+    current = _current_trace.get()
+    if current is not None:
+        # Một bước có thể chạy nhiều lần trong một nhãn (VD: OCR từng khối) → cộng dồn
+        with _trace_lock:
+            current[stage] = current.get(stage, 0.0) + seconds
+
+
+def increment(metric: str, amount: int = 1, **labels) -> None:
+    """
+    Tăng bộ đếm (bỏ qua khi tắt đo)
+
+    Ví dụ:
+        metrics.increment('label_cascade_stage_total', stage='minimal', outcome='escalated')
+    """
+    if _enabled:
+        registry.increment(metric, labels, amount)
+
+
+def counters(metric: str) -> list:
+    return registry.counters(metric)
+
+
+def timer(stage: str):
+    """
+    Context manager đo thời gian một bước
+
+    Ví dụ:
+        with metrics.timer('deskew'):
+            image = processor.detect_and_correct_skew(image)
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _StageTimer(stage)
+
+
+def timed(stage: str):
+    """Decorator đo thời gian mỗi lần gọi hàm"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _StageTimer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def trace():
+    """
+    Gom thời gian các bước của một nhãn
+
+    Yields:
+        dict: Tên bước → tổng số giây (được điền khi các timer bên trong kết thúc)
+    """
+    timings = {}
+    token = _current_trace.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_trace.reset(token)
+
+
+def to_dict() -> dict:
+    return registry.to_dict()
+
+
+def to_json() -> str:
+    return registry.to_json()
+
+
+def to_prometheus() -> str:
+    return registry.to_prometheus()
+
+
+def reset() -> None:
+    registry.reset()
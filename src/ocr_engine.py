@@ -1,59 +1,288 @@
 """
 Module OCR Engine - Nhận dạng text từ hình ảnh
 """
-import pytesseract
 from PIL import Image
 import cv2
 import numpy as np
 import logging
+import json
 import os
+import re
+import shutil
+import subprocess
 import sys
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Thêm thư mục config vào path
 sys.path.append(str(Path(__file__).parent.parent))
-from config.config import TESSERACT_CMD, OCR_LANG, MIN_CONFIDENCE
+from config.config import (TESSERACT_CMD, OCR_LANG, MIN_CONFIDENCE, OCR_BACKEND, TESSERACT_POOL_SIZE,
+                           OCR_PARALLEL_WORKERS, TESSDATA_DIR, TESSERACT_PROBE_CACHE_FILE,
+                           FIELD_REOCR_SKIP_CONFIDENCE)
+from src.tesseract_pool import TesseractPool, parse_tesseract_config, PER_CALL_VARIABLES
+from src.postal_label_parser import PostalLabelParser
+from src.label_patterns import PATTERNS
+from src.label_layout import group_lines
+from src import metrics
+from src.metrics import timed
 
-# Cấu hình Tesseract
-if os.path.exists(TESSERACT_CMD):
-    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+# OCR song song nhiều vùng: tắt đa luồng OpenMP bên trong Tesseract để các luồng không tranh core
+if OCR_PARALLEL_WORKERS > 1:
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+_PSM_OPTION = re.compile(r'--psm\s+\d+')
+
+# Ký tự Tesseract (vie+eng) hay nhầm với chữ số: O/0, l/1, S/5, B/8, Z/2
+_DIGIT_CONFUSABLES = str.maketrans('OoQDlIi|!SsBZz', '00001111155822')
+
+# Bộ đếm OCR lần hai theo trường: outcome = corrected / confirmed / rejected
+FIELD_REOCR_METRIC = 'field_reocr_total'
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_pytesseract_module = None
+# Kết quả kiểm tra Tesseract theo chữ ký binary - dùng chung cho mọi OCREngine trong tiến trình
+_probe_results = {}
+_probe_lock = threading.Lock()
+
+
+def _pytesseract():
+    """Import pytesseract ở lần dùng đầu tiên (pytesseract kéo theo pandas, ~0.3 s khi khởi động)"""
+    global _pytesseract_module
+    if _pytesseract_module is None:
+        import pytesseract
+        # Cấu hình Tesseract
+        if os.path.exists(TESSERACT_CMD):
+            pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        _pytesseract_module = pytesseract
+    return _pytesseract_module
+
+
+def _tesseract_signature(cmd) -> tuple:
+    """Chữ ký binary Tesseract + thư mục tessdata để phát hiện kết quả kiểm tra đã cũ"""
+    path = cmd or (TESSERACT_CMD if os.path.exists(TESSERACT_CMD) else shutil.which('tesseract'))
+    if not path or not os.path.exists(path):
+        raise RuntimeError(f"Không tìm thấy binary Tesseract ({cmd or TESSERACT_CMD})")
+    stat = os.stat(path)
+    tessdata = str(TESSDATA_DIR or os.environ.get('TESSDATA_PREFIX', ''))
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, tessdata)
+
+
+def _run_tesseract_probe(path: str) -> dict:
+    """Chạy `tesseract --version` và `--list-langs` (mỗi lệnh một tiến trình)"""
+    env = dict(os.environ)
+    if TESSDATA_DIR:
+        env['TESSDATA_PREFIX'] = str(TESSDATA_DIR)
+    version = subprocess.run([path, '--version'], capture_output=True, text=True,
+                             timeout=30, env=env, check=True)
+    # Tesseract cũ in version ra stderr
+    first_line = (version.stdout or version.stderr).strip().splitlines()[0]
+    langs = subprocess.run([path, '--list-langs'], capture_output=True, text=True, timeout=30, env=env)
+    # Dòng đầu: 'List of available languages in "..." (N):'
+    languages = [line.strip() for line in (langs.stdout or langs.stderr).splitlines()[1:] if line.strip()]
+    return {'version': first_line.split()[-1], 'languages': languages}
+
+
+def probe_tesseract(cmd: str = None, cache_file=TESSERACT_PROBE_CACHE_FILE) -> dict:
+    """
+    Kiểm tra version và ngôn ngữ Tesseract một lần, dùng chung giữa các OCREngine và tiến trình
+
+    Kết quả được giữ trong bộ nhớ tiến trình và ghi ra cache_file (JSON) theo chữ ký binary
+    (đường dẫn, mtime, kích thước, tessdata), nên worker mới không phải chạy lại tesseract.
+
+    Args:
+        cmd: Đường dẫn binary Tesseract (mặc định TESSERACT_CMD hoặc 'tesseract' trong PATH)
+        cache_file: File JSON lưu kết quả (None = chỉ giữ trong bộ nhớ)
+
+    Returns:
+        dict: {'version': str, 'languages': list}
+
+    Raises:
+        RuntimeError: Không tìm thấy hoặc không chạy được Tesseract
+    """
+    signature = _tesseract_signature(cmd)
+    with _probe_lock:
+        cached = _probe_results.get(signature)
+        if cached is not None:
+            return cached
+
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    stored = json.load(f)
+                if tuple(stored.get('signature', ())) == signature:
+                    _probe_results[signature] = stored['data']
+                    return stored['data']
+            except Exception as e:
+                logger.warning(f"Bỏ qua cache kiểm tra Tesseract lỗi: {e}")
+
+        try:
+            data = _run_tesseract_probe(signature[0])
+        except (OSError, IndexError, subprocess.SubprocessError) as e:
+            raise RuntimeError(f"Không chạy được Tesseract: {e}") from e
+        _probe_results[signature] = data
+
+        if cache_file:
+            try:
+                Path(cache_file).parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = Path(cache_file).with_suffix(f'.{os.getpid()}.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'signature': list(signature), 'data': data}, f)
+                os.replace(tmp_path, cache_file)
+            except OSError as e:
+                logger.warning(f"Không ghi được cache kiểm tra Tesseract: {e}")
+        return data
+
 
 class OCREngine:
     """Engine xử lý OCR để nhận dạng text từ ảnh"""
 
-    def __init__(self, lang: str = OCR_LANG):
+    # Parser không có trạng thái - dùng chung cho mọi nhãn thay vì tạo mới mỗi lần
+    parser = PostalLabelParser()
+
+    # Số luồng OCR các vùng đồng thời (1 = tuần tự)
+    workers = 1
+    _executor = None
+
+    def __init__(self, lang: str = OCR_LANG, backend: str = OCR_BACKEND,
+                 pool_size: int = TESSERACT_POOL_SIZE, workers: int = OCR_PARALLEL_WORKERS):
         """
         Khởi tạo OCR Engine
 
         Args:
             lang: Ngôn ngữ nhận dạng (mặc định: vie+eng)
+            backend: 'auto', 'capi' (pool worker Tesseract sống lâu) hoặc 'pytesseract'
+            pool_size: Số worker Tesseract tối đa khi dùng backend 'capi'
+            workers: Số vùng chữ được OCR đồng thời trong một nhãn
         """
         self.lang = lang
         self.logger = logger
         self.min_confidence = MIN_CONFIDENCE
+        self.backend = backend
+        self.pool_size = pool_size
+        self.workers = max(1, int(workers))
+        self._pools = {}
 
         # Kiểm tra Tesseract
         self._check_tesseract()
+        self._init_backend()
+
+    def _init_backend(self):
+        """Chọn backend gọi Tesseract, ưu tiên pool worker qua C API"""
+        if self.backend not in ('auto', 'capi'):
+            self.backend = 'pytesseract'
+            return
+
+        try:
+            pool = self._get_pool(None, {})
+            # Load traineddata cho worker đầu tiên ngay lúc khởi tạo
+            pool.warm_up(1)
+            self.backend = 'capi'
+            self.logger.info(f"✅ Dùng pool Tesseract C API (tối đa {self.pool_size} worker)")
+        except RuntimeError as e:
+            if self.backend == 'capi':
+                raise
+            self._pools = {}
+            self.backend = 'pytesseract'
+            self.logger.info(f"Không dùng được Tesseract C API ({e}), chuyển sang pytesseract")
+
+    @staticmethod
+    def _split_variables(variables: dict) -> tuple:
+        """Tách biến Tesseract: (biến cố định của pool, biến đặt cho từng lần gọi - VD: whitelist)"""
+        fixed = {name: value for name, value in variables.items() if name not in PER_CALL_VARIABLES}
+        per_call = {name: value for name, value in variables.items() if name in PER_CALL_VARIABLES}
+        return fixed, per_call
+
+    def _get_pool(self, oem, variables: dict) -> TesseractPool:
+        """Lấy pool ứng với bộ (oem, biến Tesseract cố định); mỗi bộ có worker riêng"""
+        key = (oem, tuple(sorted(variables.items())))
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = TesseractPool(self.lang, size=self.pool_size, oem=oem, variables=variables)
+            pool = self._pools.setdefault(key, pool)
+        return pool
+
+    @timed('tesseract')
+    def _image_to_data(self, image, config: str = '') -> dict:
+        """Gọi image_to_data qua pool worker nếu có, ngược lại qua pytesseract"""
+        if self.backend == 'capi':
+            try:
+                psm, oem, dpi, variables = parse_tesseract_config(config)
+            except ValueError:
+                pass
+            else:
+                # Whitelist/blacklist đặt trên worker mượn từ pool chung, không tạo pool riêng
+                fixed, per_call = self._split_variables(variables)
+                return self._get_pool(oem, fixed).image_to_data(image, psm=psm, dpi=dpi, variables=per_call)
+
+        pytesseract = _pytesseract()
+        return pytesseract.image_to_data(
+            self._to_pil_image(image),
+            lang=self.lang,
+            config=config,
+            output_type=pytesseract.Output.DICT
+        )
+
+    @timed('tesseract')
+    def _image_to_string(self, image, config: str = '') -> str:
+        """Gọi image_to_string qua pool worker nếu có, ngược lại qua pytesseract"""
+        if self.backend == 'capi':
+            try:
+                psm, oem, dpi, variables = parse_tesseract_config(config)
+            except ValueError:
+                pass
+            else:
+                # Whitelist/blacklist đặt trên worker mượn từ pool chung, không tạo pool riêng
+                fixed, per_call = self._split_variables(variables)
+                return self._get_pool(oem, fixed).image_to_string(image, psm=psm, dpi=dpi, variables=per_call)
+
+        return _pytesseract().image_to_string(
+            self._to_pil_image(image),
+            lang=self.lang,
+            config=config
+        )
+
+    def _prepare_image(self, image):
+        """Chuẩn bị ảnh cho backend: numpy RGB/xám cho C API, PIL cho pytesseract"""
+        if self.backend == 'capi':
+            if isinstance(image, np.ndarray):
+                if len(image.shape) == 3:
+                    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                return image
+            if not isinstance(image, Image.Image):
+                image = Image.open(image)
+            return image
+        return self._to_pil_image(image)
+
+    def close(self):
+        """Giải phóng các worker Tesseract trong pool và luồng OCR song song"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for pool in self._pools.values():
+            pool.close()
+        self._pools = {}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Thread pool OCR các vùng (Tesseract nhả GIL khi nhận dạng)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ocr')
+        return self._executor
 
     def _check_tesseract(self):
-        """Kiểm tra Tesseract đã được cài đặt chưa"""
+        """Kiểm tra Tesseract đã được cài đặt chưa (kết quả dùng chung, xem probe_tesseract)"""
         try:
-            version = pytesseract.get_tesseract_version()
-            self.logger.info(f"✅ Tesseract version: {version}")
+            probe = probe_tesseract()
+            self.logger.info(f"✅ Tesseract version: {probe['version']}")
 
             # Kiểm tra ngôn ngữ có sẵn
-            try:
-                langs = pytesseract.get_languages()
-                if 'vie' in langs:
-                    self.logger.info("✅ Vietnamese language pack available")
-                else:
-                    self.logger.warning("⚠️ Vietnamese language pack not found. OCR accuracy may be reduced.")
-            except:
-                pass
+            if 'vie' in probe['languages']:
+                self.logger.info("✅ Vietnamese language pack available")
+            else:
+                self.logger.warning("⚠️ Vietnamese language pack not found. OCR accuracy may be reduced.")
 
         except Exception as e:
             self.logger.error(f"❌ Lỗi: Tesseract chưa được cài đặt hoặc cấu hình sai. {e}")
@@ -62,6 +291,35 @@ class OCREngine:
             self.logger.info("   Linux: sudo apt-get install tesseract-ocr tesseract-ocr-vie")
             raise RuntimeError("Tesseract OCR not properly configured")
 
+    def _to_pil_image(self, image) -> Image.Image:
+        """Chuyển đầu vào (đường dẫn, PIL Image, numpy array BGR/xám) sang PIL Image"""
+        if isinstance(image, Image.Image):
+            return image
+        if isinstance(image, np.ndarray):
+            if len(image.shape) == 3:
+                return Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+            return Image.fromarray(image)
+        return Image.open(image)
+
+    def detect_orientation(self, image):
+        """
+        Xác định hướng trang bằng Tesseract OSD (--psm 0, cần osd.traineddata)
+
+        Args:
+            image: numpy array BGR/xám hoặc PIL Image
+
+        Returns:
+            int: Góc cần xoay theo chiều kim đồng hồ (0/90/180/270), None nếu OSD thất bại
+        """
+        try:
+            pytesseract = _pytesseract()
+            osd = pytesseract.image_to_osd(self._to_pil_image(image), config='--psm 0',
+                                           output_type=pytesseract.Output.DICT)
+            return int(osd['rotate']) % 360
+        except Exception as e:
+            self.logger.debug(f"Không chạy được Tesseract OSD: {e}")
+            return None
+
     def extract_text(self, image_path, config: str = '--psm 6') -> str:
         """
         Trích xuất text từ ảnh
@@ -77,87 +335,79 @@ class OCREngine:
             str: Text được nhận dạng
         """
         try:
-            # Đọc ảnh nếu là đường dẫn, hoặc dùng trực tiếp nếu là numpy array
-            if isinstance(image_path, str):
-                image = Image.open(image_path)
-            else:
-                # Convert numpy array to PIL Image
-                import cv2
-                if len(image_path.shape) == 3:
-                    image = Image.fromarray(cv2.cvtColor(image_path, cv2.COLOR_BGR2RGB))
-                else:
-                    image = Image.fromarray(image_path)
+            # Đọc ảnh nếu là đường dẫn, hoặc chuyển trực tiếp từ numpy array
+            image = self._prepare_image(image_path)
 
             # OCR với config
-            text = pytesseract.image_to_string(
-                image,
-                lang=self.lang,
-                config=config
-            )
+            text = self._image_to_string(image, config=config)
 
-            self.logger.info(f"Trích xuất text thành công từ: {image_path}")
+            self.logger.debug("Trích xuất text thành công")
             return text.strip()
 
         except Exception as e:
             self.logger.error(f"Lỗi khi trích xuất text: {e}")
             return ""
 
-    def extract_text_with_confidence(self, image_path) -> dict:
+    def extract_text_with_confidence(self, image_path, config: str = '', regions=None) -> dict:
         """
         Trích xuất text kèm độ tin cậy
 
         Args:
             image_path: Đường dẫn đến ảnh hoặc numpy array
+            config: Cấu hình Tesseract (mặc định: tự động phân đoạn)
+            regions: Các vùng (x, y, w, h) hoặc (x, y, w, h, psm) cần OCR, VD: từ
+                     TextRegionDetector.ocr_regions. Tesseract chỉ chạy trên từng vùng cắt
+                     (song song khi workers > 1), kết quả ghép theo thứ tự của regions;
+                     None = cả ảnh
 
         Returns:
             dict: {
                 'text': str,
                 'confidence': float,
-                'details': list of dict
+                'details': list of dict (tọa độ theo ảnh gốc)
             }
         """
         try:
-            # Đọc ảnh nếu là đường dẫn, hoặc dùng trực tiếp nếu là numpy array
-            if isinstance(image_path, str):
-                image = Image.open(image_path)
-            else:
-                # Convert numpy array to PIL Image
-                import cv2
-                if len(image_path.shape) == 3:
-                    image = Image.fromarray(cv2.cvtColor(image_path, cv2.COLOR_BGR2RGB))
-                else:
-                    image = Image.fromarray(image_path)
-
-            # Lấy dữ liệu chi tiết
-            data = pytesseract.image_to_data(
-                image,
-                lang=self.lang,
-                output_type=pytesseract.Output.DICT
-            )
-
-            # Lọc các từ có độ tin cậy đủ
+            # Đọc ảnh nếu là đường dẫn, hoặc chuyển trực tiếp từ numpy array
+            image = self._prepare_image(image_path)
+
             filtered_text = []
             confidences = []
             details = []
 
-            n_boxes = len(data['text'])
-            for i in range(n_boxes):
-                confidence = int(data['conf'][i])
-                text = data['text'][i].strip()
+            jobs = list(self._iter_regions(image, regions, config))
 
-                if confidence > 0 and text:
-                    if confidence >= self.min_confidence:
-                        filtered_text.append(text)
-                        confidences.append(confidence)
-
-                    details.append({
-                        'text': text,
-                        'confidence': confidence,
-                        'left': data['left'][i],
-                        'top': data['top'][i],
-                        'width': data['width'][i],
-                        'height': data['height'][i]
-                    })
+            # Lấy dữ liệu chi tiết từng vùng
+            if self.workers > 1 and len(jobs) > 1:
+                executor = self._get_executor()
+                # copy_context: thời gian OCR trong luồng phụ vẫn được cộng vào trace của nhãn
+                futures = [executor.submit(contextvars.copy_context().run, self._image_to_data, crop, job_config)
+                           for _, _, crop, job_config in jobs]
+                results = [future.result() for future in futures]
+            else:
+                results = [self._image_to_data(crop, config=job_config) for _, _, crop, job_config in jobs]
+
+            for block, ((left, top, _, _), data) in enumerate(zip(jobs, results)):
+                # Lọc các từ có độ tin cậy đủ
+                n_boxes = len(data['text'])
+                for i in range(n_boxes):
+                    confidence = int(data['conf'][i])
+                    text = data['text'][i].strip()
+
+                    if confidence > 0 and text:
+                        if confidence >= self.min_confidence:
+                            filtered_text.append(text)
+                            confidences.append(confidence)
+
+                        details.append({
+                            'text': text,
+                            'confidence': confidence,
+                            'left': data['left'][i] + left,
+                            'top': data['top'][i] + top,
+                            'width': data['width'][i],
+                            'height': data['height'][i],
+                            'block': block
+                        })
 
             avg_confidence = sum(confidences) / len(confidences) if confidences else 0
 
@@ -167,19 +417,167 @@ class OCREngine:
                 'details': details
             }
 
-            self.logger.info(f"Độ tin cậy trung bình: {avg_confidence:.2f}%")
+            self.logger.debug(f"Độ tin cậy trung bình: {avg_confidence:.2f}%")
             return result
 
         except Exception as e:
             self.logger.error(f"Lỗi khi trích xuất text với confidence: {e}")
             return {'text': '', 'confidence': 0, 'details': []}
 
-    def extract_structured_data(self, image_path: str) -> dict:
+    @staticmethod
+    def _iter_regions(image, regions, config: str):
+        """Sinh (left, top, vùng cắt, config) cho từng vùng; không có vùng nào thì trả về cả ảnh"""
+        if not regions:
+            yield 0, 0, image, config
+            return
+        for region in regions:
+            x, y, w, h = region[:4]
+            region_config = config
+            if len(region) > 4 and region[4] is not None:
+                # PSM riêng của vùng thay cho --psm trong config chung
+                region_config = f"{_PSM_OPTION.sub('', config)} --psm {region[4]}".strip()
+            if isinstance(image, Image.Image):
+                yield x, y, image.crop((x, y, x + w, y + h)), region_config
+            else:
+                yield x, y, image[y:y + h, x:x + w], region_config
+
+    # OCR lần hai: whitelist ký tự và định dạng hợp lệ của từng loại trường
+    FIELD_WHITELISTS = {
+        'phone': '0123456789',
+        'order_id': '0123456789',
+        # 'KG' dính liền số (VD: '0.059KG') nằm trong vùng cắt - cho phép để Tesseract không ép K/G thành số
+        'weight': '0123456789.,KGkg',
+    }
+    FIELD_FORMATS = {
+        'phone': re.compile(r'0\d{9,10}'),
+        'order_id': re.compile(r'\d{6,}'),
+        'weight': re.compile(r'\d+(?:[.,]\d+)?'),
+    }
+
+    @staticmethod
+    def _digit_like(text: str) -> str:
+        """Text sau khi thay các ký tự hay nhầm bằng chữ số, bỏ dấu phân cách"""
+        return re.sub(r'[-.\s]', '', text.translate(_DIGIT_CONFUSABLES))
+
+    def _field_targets(self, words: list) -> list:
+        """
+        Tìm các từ là SĐT, mã đơn (sau 'Order') hoặc trọng lượng (trước 'KG') từ lần OCR đầu
+
+        Returns:
+            list: (từ, loại trường) - từ đã đúng định dạng với độ tin cậy cao bị bỏ qua
+        """
+        targets = []
+        for line in group_lines(words):
+            line_words = line['words']
+            for index, word in enumerate(line_words):
+                text = word['text']
+                previous = line_words[index - 1]['text'] if index else ''
+                following = line_words[index + 1]['text'] if index + 1 < len(line_words) else ''
+                digits = self._digit_like(text)
+                true_digits = sum(ch.isdigit() for ch in text)
+
+                kind = None
+                if re.match(r'order', previous, re.IGNORECASE) and len(digits) >= 6 and true_digits >= 4:
+                    kind = 'order_id'
+                elif (following.upper().startswith('KG') or text.upper().endswith('KG')) and true_digits:
+                    kind = 'weight'
+                elif digits.startswith('0') and 10 <= len(digits) <= 11 and true_digits >= 6:
+                    kind = 'phone'
+                if kind is None:
+                    continue
+
+                valid = self.FIELD_FORMATS[kind].fullmatch(re.sub(r'(?i)kg$', '', text))
+                if valid and word.get('confidence', 0) >= FIELD_REOCR_SKIP_CONFIDENCE:
+                    continue
+                targets.append((word, kind))
+        return targets
+
+    @timed('field_reocr')
+    def refine_fields(self, image, ocr_result: dict) -> dict:
+        """
+        OCR lần hai cho các trường số quan trọng (SĐT, mã đơn, trọng lượng)
+
+        Mỗi từ ứng viên (định vị từ tọa độ của lần OCR đầu) được cắt riêng và OCR lại ở chế độ
+        một dòng (--psm 7) với whitelist ký tự - rẻ hơn nhiều so với OCR lại cả nhãn và không còn
+        nhầm O/0, l/1. Kết quả chỉ được nhận khi đúng định dạng của trường.
+
+        Args:
+            image: Ảnh đã dùng cho lần OCR đầu (numpy array, cùng hệ tọa độ với details)
+            ocr_result: Kết quả extract_text_with_confidence
+
+        Returns:
+            dict: ocr_result với details/text đã sửa và 'refined' - list {'field', 'before', 'after'};
+                  không có tọa độ từ hoặc không có ứng viên → trả về nguyên ocr_result
+        """
+        words = ocr_result.get('details') or []
+        if not words or 'left' not in words[0]:
+            return ocr_result
+
+        details = [dict(word) for word in words]
+        targets = self._field_targets(details)
+        if not targets:
+            return ocr_result
+
+        image = self._prepare_image(image)
+        is_pil = isinstance(image, Image.Image)
+        width, height = image.size if is_pil else (image.shape[1], image.shape[0])
+        jobs = []
+        for word, kind in targets:
+            # Lề quanh từ để Tesseract thấy đủ nền trắng
+            pad = max(2, word['height'] // 3)
+            x0, y0 = max(0, word['left'] - pad), max(0, word['top'] - pad)
+            x1 = min(width, word['left'] + word['width'] + pad)
+            y1 = min(height, word['top'] + word['height'] + pad)
+            config = f"--psm 7 -c tessedit_char_whitelist={self.FIELD_WHITELISTS[kind]}"
+            crop = image.crop((x0, y0, x1, y1)) if is_pil else image[y0:y1, x0:x1]
+            jobs.append((crop, config))
+
+        if self.workers > 1 and len(jobs) > 1:
+            executor = self._get_executor()
+            futures = [executor.submit(contextvars.copy_context().run, self._image_to_string, crop, config)
+                       for crop, config in jobs]
+            texts = [future.result() for future in futures]
+        else:
+            texts = [self._image_to_string(crop, config=config) for crop, config in jobs]
+
+        refined = []
+        for (word, kind), text in zip(targets, texts):
+            text = re.sub(r'\s+', '', text)
+            # Giữ 'KG' dính liền (VD: '0.059KG') để parser vẫn nhận ra trọng lượng; lần hai phải đọc
+            # lại được đúng 'KG' thì phần số mới đáng tin
+            suffix = 'KG' if kind == 'weight' and word['text'].upper().endswith('KG') else ''
+            if suffix:
+                text = text[:-2] if text.upper().endswith('KG') else ''
+            if not self.FIELD_FORMATS[kind].fullmatch(text):
+                metrics.increment(FIELD_REOCR_METRIC, field=kind, outcome='rejected')
+                continue
+            outcome = 'confirmed' if word['text'] == text + suffix else 'corrected'
+            metrics.increment(FIELD_REOCR_METRIC, field=kind, outcome=outcome)
+            if outcome == 'corrected':
+                refined.append({'field': kind, 'before': word['text'], 'after': text + suffix})
+                word['text'] = text + suffix
+            word['confidence'] = max(word['confidence'], self.min_confidence)
+
+        if refined:
+            self.logger.debug(f"OCR lần hai sửa {len(refined)} trường: {refined}")
+        # text và confidence trung bình tính lại như extract_text_with_confidence (chỉ từ đủ độ tin cậy)
+        accepted = [word for word in details if word['confidence'] >= self.min_confidence]
+        result = dict(ocr_result)
+        result['details'] = details
+        result['text'] = ' '.join(word['text'] for word in accepted)
+        if accepted:
+            result['confidence'] = round(sum(word['confidence'] for word in accepted) / len(accepted), 2)
+        result['refined'] = refined
+        return result
+
+    def extract_structured_data(self, image_path) -> dict:
         """
         Trích xuất dữ liệu có cấu trúc từ nhãn bưu kiện
 
         Args:
-            image_path: Đường dẫn đến ảnh hoặc text đã OCR
+            image_path: Đường dẫn đến ảnh, text đã OCR, hoặc kết quả
+                       của extract_text_with_confidence (dict) để không
+                       phải chạy lại Tesseract
 
         Returns:
             dict: Thông tin được trích xuất
@@ -201,10 +599,17 @@ class OCREngine:
         try:
             # Lấy text với confidence (hoặc dùng text đã có)
             import os
-            if isinstance(image_path, str) and os.path.isfile(image_path):
+            words = None
+            if isinstance(image_path, dict):
+                # Đã có kết quả OCR - dùng lại, không gọi Tesseract lần nữa
+                text = image_path.get('text', '')
+                words = image_path.get('details')
+                result['confidence'] = image_path.get('confidence', 0)
+            elif isinstance(image_path, str) and os.path.isfile(image_path):
                 # Là đường dẫn file ảnh
                 ocr_result = self.extract_text_with_confidence(image_path)
                 text = ocr_result['text']
+                words = ocr_result['details']
                 result['confidence'] = ocr_result['confidence']
             else:
                 # Đã là text hoặc không phải file
@@ -213,15 +618,17 @@ class OCREngine:
 
             result['raw_text'] = text
 
-            # Sử dụng PostalLabelParser để trích xuất thông tin
-            from src.postal_label_parser import PostalLabelParser
-            parser = PostalLabelParser()
-            parsed = parser.parse(text)
+            # Sử dụng PostalLabelParser để trích xuất thông tin: có tọa độ từng từ thì phân tích
+            # theo bố cục (tìm khối người gửi/nhận theo vị trí), ngược lại phân tích text phẳng
+            if words and 'left' in words[0]:
+                parsed = self.parser.parse_layout(words, min_confidence=self.min_confidence)
+            else:
+                parsed = self.parser.parse(text)
 
             # Cập nhật result với dữ liệu đã parse
             result.update(parsed)
 
-            self.logger.info("Trích xuất dữ liệu có cấu trúc thành công")
+            self.logger.debug("Trích xuất dữ liệu có cấu trúc thành công")
             return result
 
         except Exception as e:
@@ -232,11 +639,9 @@ class OCREngine:
 
     def _split_sender_recipient(self, text: str) -> tuple:
         """Tách text thành phần người gửi và người nhận"""
-        import re
-
         # Tìm vị trí của "Người gửi" và "Người nhận"
-        sender_match = re.search(r'Ng[ưu]+[oơ]+i\s+g[ửữ]+i', text, re.IGNORECASE)
-        recipient_match = re.search(r'Ng[ưu]+[oơ]+i\s+nh[ậa]+n', text, re.IGNORECASE)
+        sender_match = PATTERNS['sender_label'].search(text)
+        recipient_match = PATTERNS['recipient_label'].search(text)
 
         if sender_match and recipient_match:
             sender_start = sender_match.start()
@@ -264,23 +669,21 @@ class OCREngine:
 
     def _extract_name(self, text: str, person_type: str) -> str:
         """Trích xuất tên người từ text"""
-        import re
-
         # Pattern: Người gửi/nhận + TÊN (viết hoa chữ cái đầu) + số/địa chỉ
         # VD: "Người gửi LUX PERFUMEE" hoặc "Người nhận Bùi Tuấn Vũ"
         if person_type == 'sender':
             # Tìm text sau "Người gửi" đến trước số hoặc địa chỉ
-            pattern = r'Ng[ưu]+[oơ]+i\s+g[ửữ]+i\s+([A-Z][A-Za-zÀ-ỹ\s]+?)(?=\s*\d|\s+[pqthđ]|$)'
+            pattern = PATTERNS['engine_name_sender']
         else:
             # Tìm text sau "Người nhận" đến trước số hoặc địa chỉ
-            pattern = r'Ng[ưu]+[oơ]+i\s+nh[ậa]+n\s+([A-Z][A-Za-zÀ-ỹ\s]+?)(?=\s*[A-Z]?\d|\s+[SsNn][ốoơ]|$)'
+            pattern = PATTERNS['engine_name_recipient']
 
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = pattern.search(text)
         if match:
             name = match.group(1).strip()
             # Loại bỏ số và ký tự lạ ở cuối
-            name = re.sub(r'\s+\d.*$', '', name)
-            name = re.sub(r'\s{2,}', ' ', name)
+            name = PATTERNS['trailing_number_words'].sub('', name)
+            name = PATTERNS['multi_space'].sub(' ', name)
             # Chỉ lấy tối đa 5 từ (tên người thường không quá dài)
             words = name.split()
             if len(words) > 5:
@@ -291,22 +694,14 @@ class OCREngine:
 
     def _extract_address(self, text: str) -> str:
         """Trích xuất địa chỉ từ text"""
-        import re
-
         # Tìm địa chỉ dựa trên keywords
-        address_keywords = [
-            r'(?:Số\s+)?(\d+[A-Z]?\d*[,\s]+[^,\n]+?(?:phường|phư[oơ]+ng|quận|qu[aậ]+n|huyện|huy[eệ]+n|thành phố|tỉnh|thị xã)[^,\n]*(?:,\s*[^,\n]+)*)',
-            r'(\d+\s+[^,\n]+?(?:đường|[đd]u[oơ]+ng)[^,\n]*(?:,\s*[^,\n]+)*)',
-            r'((?:phường|quận|huyện|thành phố|tỉnh)\s+[^,\n]+(?:,\s*[^,\n]+)*)'
-        ]
-
-        for pattern in address_keywords:
-            matches = re.findall(pattern, text, re.IGNORECASE)
+        for pattern in PATTERNS['engine_addresses']:
+            matches = pattern.findall(text)
             if matches:
                 # Lấy địa chỉ dài nhất (thường là đầy đủ nhất)
                 address = max(matches, key=len)
                 # Làm sạch địa chỉ
-                address = re.sub(r'\s+', ' ', address)
+                address = PATTERNS['whitespace'].sub(' ', address)
                 address = address.strip()
                 return address
 
@@ -316,9 +711,9 @@ class OCREngine:
             line = line.strip()
             if any(kw in line.lower() for kw in ['phường', 'quận', 'huyện', 'tỉnh', 'thành phố']):
                 # Loại bỏ số điện thoại và mã nếu có
-                cleaned = re.sub(r'\b0\d{9,10}\b', '', line)
-                cleaned = re.sub(r'\b\d{5,6}\b', '', cleaned)
-                cleaned = re.sub(r'\s+', ' ', cleaned).strip()
+                cleaned = PATTERNS['phone_word'].sub('', line)
+                cleaned = PATTERNS['postal_code'].sub('', cleaned)
+                cleaned = PATTERNS['whitespace'].sub(' ', cleaned).strip()
                 if len(cleaned) > 20:  # Địa chỉ phải có độ dài nhất định
                     return cleaned
 
@@ -326,23 +721,15 @@ class OCREngine:
 
     def _is_phone_number(self, text: str) -> bool:
         """Kiểm tra xem text có chứa số điện thoại không"""
-        import re
         # Tìm chuỗi số liên tiếp 10-11 chữ số bắt đầu bằng 0
-        pattern = r'0\d{9,10}'
-        return bool(re.search(pattern, text))
+        return bool(PATTERNS['phone'].search(text))
 
     def _extract_phone_number(self, text: str) -> str:
         """Trích xuất số điện thoại từ text"""
-        import re
-
-        # Pattern cho số điện thoại Việt Nam
-        patterns = [
-            r'0\d{9,10}',  # 10-11 số bắt đầu bằng 0
-            r'\d{3}[-.\s]?\d{3}[-.\s]?\d{4}',  # Format có dấu phân cách
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text)
+        # Pattern cho số điện thoại Việt Nam: 10-11 số bắt đầu bằng 0,
+        # sau đó đến format có dấu phân cách
+        for pattern in (PATTERNS['phone'], PATTERNS['phone_separated']):
+            match = pattern.search(text)
             if match:
                 phone = match.group()
                 # Loại bỏ ký tự đặc biệt
@@ -352,11 +739,8 @@ class OCREngine:
 
     def _extract_postal_code(self, text: str) -> str:
         """Trích xuất mã bưu chính"""
-        import re
-
         # Mã bưu chính Việt Nam: 5-6 số
-        pattern = r'\b\d{5,6}\b'
-        match = re.search(pattern, text)
+        match = PATTERNS['postal_code'].search(text)
 
         if match:
             return match.group()
@@ -376,12 +760,7 @@ class OCREngine:
             image = cv2.imread(image_path)
 
             # Lấy dữ liệu OCR
-            pil_image = Image.open(image_path)
-            data = pytesseract.image_to_data(
-                pil_image,
-                lang=self.lang,
-                output_type=pytesseract.Output.DICT
-            )
+            data = self._image_to_data(self._prepare_image(image))
 
             # Vẽ bounding boxes
             n_boxes = len(data['text'])
@@ -0,0 +1,409 @@
+"""
+Module dịch vụ HTTP nhận dạng nhãn bưu kiện (asyncio, chỉ dùng thư viện chuẩn)
+
+Endpoint:
+    POST /ocr      - ảnh trong body (image/*, application/octet-stream), multipart/form-data
+                     (trường file đầu tiên) hoặc JSON {"path": "..."} / {"url": "file:///..."}
+                     cho file nằm trong OCR_SERVICE_FILE_ROOTS
+    GET  /health   - trạng thái hàng đợi, số worker
+    GET  /metrics  - histogram thời gian từng bước + bộ đếm của dịch vụ (text Prometheus)
+
+Yêu cầu được đưa vào hàng đợi có giới hạn (đầy → 429 kèm Retry-After). Mỗi worker lấy một yêu cầu,
+gom thêm các yêu cầu đến trong OCR_SERVICE_BATCH_WAIT_MS (tối đa OCR_SERVICE_MAX_BATCH) rồi xử lý
+cả lô trên một luồng có LabelPipeline riêng; ảnh trùng nội dung trong lô chỉ được xử lý một lần.
+"""
+import asyncio
+import json
+import logging
+import math
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+from email.policy import HTTP
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import urlsplit, unquote
+
+import numpy as np
+
+# Thêm thư mục gốc vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import (OCR_SERVICE_WORKERS, OCR_SERVICE_QUEUE_SIZE, OCR_SERVICE_MAX_BATCH,
+                           OCR_SERVICE_BATCH_WAIT_MS, OCR_SERVICE_MAX_BODY, OCR_SERVICE_TIMEOUT,
+                           OCR_SERVICE_FILE_ROOTS, PREPROCESS_METHOD, RESULT_CACHE_ENABLED)
+from src import metrics
+from src.result_cache import content_digest
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REQUESTS_METRIC = 'ocr_service_requests_total'
+BATCHES_METRIC = 'ocr_service_batches_total'
+BATCH_ITEMS_METRIC = 'ocr_service_batch_items_total'
+
+
+class ServiceError(Exception):
+    """Lỗi trả về cho client với mã HTTP tương ứng"""
+
+    def __init__(self, status: int, message: str, headers: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+def build_pipeline():
+    """Tạo LabelPipeline cho một luồng worker (mỗi luồng một worker Tesseract)"""
+    from src.ocr_engine import OCREngine
+    from src.region_classifier import RegionClassifier
+    from src.image_processor import ImageProcessor
+    from src.pipeline import LabelPipeline
+    from src.result_cache import ResultCache
+
+    ocr = OCREngine(pool_size=1, workers=1)
+    cache = ResultCache() if RESULT_CACHE_ENABLED else None
+    return LabelPipeline(ocr, RegionClassifier(), ImageProcessor(osd=ocr.detect_orientation),
+                         method=PREPROCESS_METHOD, cache=cache)
+
+
+def _json_default(value):
+    """Chuyển kiểu numpy trong kết quả sang kiểu JSON"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError(f"Không thể chuyển {type(value).__name__} sang JSON")
+
+
+def serialize_result(result: dict) -> dict:
+    """Kết quả LabelPipeline.run() bỏ ảnh đã xử lý (không gửi qua HTTP)"""
+    return {key: value for key, value in result.items() if key != 'processed_image'}
+
+
+class OCRService:
+    """Dịch vụ HTTP: hàng đợi giới hạn → worker gom lô → LabelPipeline"""
+
+    def __init__(self, pipeline_factory=build_pipeline, workers: int = OCR_SERVICE_WORKERS,
+                 queue_size: int = OCR_SERVICE_QUEUE_SIZE, max_batch: int = OCR_SERVICE_MAX_BATCH,
+                 batch_wait_ms: float = OCR_SERVICE_BATCH_WAIT_MS, max_body: int = OCR_SERVICE_MAX_BODY,
+                 timeout: float = OCR_SERVICE_TIMEOUT, file_roots=OCR_SERVICE_FILE_ROOTS):
+        """
+        Args:
+            pipeline_factory: Hàm tạo LabelPipeline (gọi một lần trong mỗi luồng worker)
+            workers: Số lô được xử lý đồng thời
+            queue_size: Số yêu cầu chờ tối đa; vượt quá trả về 429
+            max_batch: Số yêu cầu tối đa trong một lô
+            batch_wait_ms: Thời gian chờ gom thêm yêu cầu vào lô
+            max_body: Kích thước body tối đa (bytes); vượt quá trả về 413
+            timeout: Thời gian chờ kết quả tối đa (giây); quá hạn trả về 504
+            file_roots: Các thư mục được phép đọc ảnh theo đường dẫn
+        """
+        self.logger = logger
+        self.pipeline_factory = pipeline_factory
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.max_batch = max(1, max_batch)
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.max_body = max_body
+        self.timeout = timeout
+        self.file_roots = [Path(root).resolve() for root in file_roots]
+        self.in_flight = 0
+        self._idle = 0
+
+        self._queue = None
+        self._server = None
+        self._tasks = []
+        self._executor = None
+        self._local = threading.local()
+
+    # ------------------------------------------------------------------ vòng đời
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0):
+        """Mở cổng và khởi động worker; trả về asyncio.Server (port thực ở self.port)"""
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ocr-service')
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info(f"Dịch vụ OCR lắng nghe tại http://{host}:{self.port} ({self.workers} worker)")
+        return self._server
+
+    async def stop(self) -> None:
+        """Dừng nhận kết nối, hủy worker và giải phóng luồng"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    async def serve_forever(self, host: str, port: int) -> None:
+        server = await self.start(host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.stop()
+
+    # ------------------------------------------------------------------ hàng đợi + worker
+
+    async def submit(self, image) -> dict:
+        """
+        Đưa một ảnh vào hàng đợi và chờ kết quả
+
+        Raises:
+            ServiceError: 429 khi hàng đợi đầy, 504 khi quá thời gian chờ
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((image, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            raise ServiceError(HTTPStatus.TOO_MANY_REQUESTS, "Hàng đợi đã đầy, thử lại sau",
+                               headers={'Retry-After': '1'})
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            raise ServiceError(HTTPStatus.GATEWAY_TIMEOUT, "Quá thời gian xử lý")
+
+    def _batch_limit(self, size: int) -> int:
+        """
+        Số yêu cầu tối đa của lô đang gom: chia đều hàng đợi cho các worker đang rảnh
+
+        Các yêu cầu trong một lô chạy tuần tự trên một luồng (gom lô chỉ tiết kiệm được ảnh trùng),
+        nên không để một worker ôm cả hàng đợi trong khi worker khác ngồi chờ.
+        """
+        if not self._idle:
+            return self.max_batch
+        pending = size + self._queue.qsize()
+        return max(1, min(self.max_batch, math.ceil(pending / (self._idle + 1))))
+
+    async def _next_batch(self) -> list:
+        """Chờ yêu cầu đầu tiên rồi gom thêm các yêu cầu đến trong batch_wait (tối đa _batch_limit)"""
+        self._idle += 1
+        try:
+            batch = [await self._queue.get()]
+        finally:
+            self._idle -= 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_wait
+        while len(batch) < self._batch_limit(len(batch)):
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            # Còn worker rảnh → yêu cầu đến sau sẽ có worker nhận ngay, không chờ gom
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self._idle:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            # Bỏ các yêu cầu client đã hết thời gian chờ
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            now = time.perf_counter()
+            for _, _, queued_at in batch:
+                metrics.record('queue_wait', now - queued_at)
+            metrics.increment(BATCHES_METRIC)
+            metrics.increment(BATCH_ITEMS_METRIC, amount=len(batch))
+
+            self.in_flight += len(batch)
+            try:
+                outcomes = await loop.run_in_executor(self._executor, self._process_batch,
+                                                      [image for image, _, _ in batch])
+            except Exception as e:
+                outcomes = [e] * len(batch)
+            finally:
+                self.in_flight -= len(batch)
+
+            for (_, future, _), outcome in zip(batch, outcomes):
+                if future.done():
+                    continue
+                if isinstance(outcome, Exception):
+                    future.set_exception(outcome)
+                else:
+                    future.set_result(outcome)
+
+    def _pipeline(self):
+        """LabelPipeline của luồng hiện tại (tạo lần đầu dùng)"""
+        pipeline = getattr(self._local, 'pipeline', None)
+        if pipeline is None:
+            pipeline = self._local.pipeline = self.pipeline_factory()
+        return pipeline
+
+    def _process_batch(self, images: list) -> list:
+        """Xử lý một lô trên luồng worker; trả về kết quả hoặc Exception cho từng ảnh"""
+        pipeline = self._pipeline()
+        done = {}
+        outcomes = []
+        for image in images:
+            try:
+                digest = content_digest(image)
+                if digest not in done:
+                    done[digest] = serialize_result(pipeline.run(image))
+                outcomes.append(done[digest])
+            except Exception as e:
+                self.logger.error(f"Lỗi xử lý ảnh: {e}")
+                outcomes.append(e)
+        return outcomes
+
+    # ------------------------------------------------------------------ HTTP
+
+    def health(self) -> dict:
+        return {
+            'status': 'ok',
+            'workers': self.workers,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'queue_size': self.queue_size,
+            'in_flight': self.in_flight,
+        }
+
+    def metrics_text(self) -> str:
+        """Metrics của tiến trình (metrics.to_prometheus) + độ dài hàng đợi hiện tại"""
+        health = self.health()
+        return (metrics.to_prometheus()
+                + '# TYPE ocr_service_queue_depth gauge\n'
+                + f"ocr_service_queue_depth {health['queue_depth']}\n"
+                + '# TYPE ocr_service_in_flight gauge\n'
+                + f"ocr_service_in_flight {health['in_flight']}\n")
+
+    def _resolve_path(self, value: str) -> str:
+        """Đường dẫn/URL file:// → đường dẫn tuyệt đối nằm trong file_roots"""
+        if value.startswith('file:'):
+            value = unquote(urlsplit(value).path)
+        path = Path(value).resolve()
+        if not any(path.is_relative_to(root) for root in self.file_roots):
+            raise ServiceError(HTTPStatus.FORBIDDEN, "Đường dẫn nằm ngoài các thư mục được phép")
+        if not path.is_file():
+            raise ServiceError(HTTPStatus.NOT_FOUND, f"Không tìm thấy file: {path.name}")
+        return str(path)
+
+    def _extract_image(self, headers: dict, body: bytes):
+        """Lấy ảnh (bytes hoặc đường dẫn) từ body của POST /ocr"""
+        content_type = headers.get('content-type', 'application/octet-stream')
+        media_type = content_type.split(';')[0].strip().lower()
+
+        if media_type == 'application/json':
+            try:
+                payload = json.loads(body or b'{}')
+            except ValueError:
+                raise ServiceError(HTTPStatus.BAD_REQUEST, "JSON không hợp lệ")
+            location = (payload.get('path') or payload.get('url')) if isinstance(payload, dict) else None
+            if not location:
+                raise ServiceError(HTTPStatus.BAD_REQUEST, "Cần trường 'path' hoặc 'url'")
+            return self._resolve_path(str(location))
+
+        if media_type == 'multipart/form-data':
+            message = BytesParser(policy=HTTP).parsebytes(
+                f'Content-Type: {content_type}\r\n\r\n'.encode('latin-1') + body)
+            for part in message.iter_parts():
+                if part.get_filename() or part.get_param('name', header='content-disposition') in ('image', 'file'):
+                    data = part.get_payload(decode=True)
+                    if data:
+                        return data
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "Không có file ảnh trong form")
+
+        if not body:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "Body rỗng")
+        return body
+
+    async def _read_request(self, reader) -> tuple:
+        """Đọc request line, header và body (theo Content-Length)"""
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.LimitOverrunError:
+            raise ServiceError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Header quá lớn")
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "Request line không hợp lệ")
+
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        return method.upper(), urlsplit(target).path, headers
+
+    async def _read_body(self, reader, writer, headers: dict) -> bytes:
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "Content-Length không hợp lệ")
+        if length > self.max_body:
+            raise ServiceError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Ảnh quá lớn")
+        if headers.get('expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            await writer.drain()
+        return await reader.readexactly(length) if length else b''
+
+    async def _route(self, reader, writer) -> tuple:
+        """Xử lý một request; trả về (status, content_type, body)"""
+        method, path, headers = await self._read_request(reader)
+
+        if path == '/health' and method == 'GET':
+            return HTTPStatus.OK, 'application/json', self.health()
+        if path == '/metrics' and method == 'GET':
+            return HTTPStatus.OK, 'text/plain; version=0.0.4', self.metrics_text()
+        if path == '/ocr':
+            if method != 'POST':
+                raise ServiceError(HTTPStatus.METHOD_NOT_ALLOWED, "Chỉ hỗ trợ POST")
+            body = await self._read_body(reader, writer, headers)
+            image = self._extract_image(headers, body)
+            return HTTPStatus.OK, 'application/json', await self.submit(image)
+        raise ServiceError(HTTPStatus.NOT_FOUND, "Không có endpoint này")
+
+    async def _handle(self, reader, writer) -> None:
+        """Một kết nối = một request (Connection: close)"""
+        extra_headers = {}
+        try:
+            status, content_type, payload = await self._route(reader, writer)
+        except ServiceError as e:
+            status, content_type, payload = e.status, 'application/json', {'error': e.message}
+            extra_headers = e.headers
+        except asyncio.IncompleteReadError:
+            writer.close()
+            return
+        except ValueError as e:
+            # Ảnh không giải mã được
+            status, content_type, payload = HTTPStatus.UNPROCESSABLE_ENTITY, 'application/json', {'error': str(e)}
+        except Exception as e:
+            self.logger.error(f"Lỗi xử lý request: {e}")
+            status, content_type, payload = HTTPStatus.INTERNAL_SERVER_ERROR, 'application/json', {'error': str(e)}
+
+        if content_type == 'application/json':
+            body = json.dumps(payload, ensure_ascii=False, default=_json_default).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+        else:
+            body = payload.encode('utf-8')
+        metrics.increment(REQUESTS_METRIC, status=str(int(status)))
+
+        status = HTTPStatus(status)
+        head = [f'HTTP/1.1 {status.value} {status.phrase}',
+                f'Content-Type: {content_type}',
+                f'Content-Length: {len(body)}',
+                'Connection: close']
+        head.extend(f'{name}: {value}' for name, value in extra_headers.items())
+        try:
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,245 @@
+"""
+Module pipeline xử lý nhãn bưu kiện: tiền xử lý → OCR → phân tích → phân loại
+"""
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Thêm thư mục config vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import (TEXT_DETECTION_ENABLED, PREPROCESS_METHOD, PREPROCESS_CASCADE,
+                           CASCADE_MIN_CONFIDENCE, CASCADE_REQUIRED_FIELDS, FIELD_REOCR_ENABLED,
+                           PREPROCESS_PIPELINES)
+from src import metrics
+from src.result_cache import ResultCache, content_digest
+from src.text_detector import TextRegionDetector
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bộ đếm kết quả từng bậc cascade: outcome = accepted / escalated / exhausted
+CASCADE_METRIC = 'label_cascade_stage_total'
+
+
+class LabelPipeline:
+    """Chạy toàn bộ chuỗi xử lý cho một nhãn (một lần gọi Tesseract cho mỗi phương pháp tiền xử lý)"""
+
+    def __init__(self, ocr_engine, classifier, processor, method: str = PREPROCESS_METHOD,
+                 cache: ResultCache = None, ocr_config: str = '',
+                 detect_regions: bool = TEXT_DETECTION_ENABLED, cascade: list = None,
+                 refine_fields: bool = FIELD_REOCR_ENABLED):
+        """
+        Khởi tạo pipeline
+
+        Args:
+            ocr_engine: OCREngine dùng để nhận dạng text
+            classifier: RegionClassifier dùng để phân loại khu vực
+            processor: ImageProcessor dùng để tiền xử lý ảnh
+            method: Phương pháp tiền xử lý truyền cho preprocess_image,
+                    'cascade' = thử lần lượt các phương pháp của cascade
+            cache: ResultCache để dùng lại kết quả của ảnh đã xử lý (tùy chọn)
+            ocr_config: Chuỗi config Tesseract cho lần OCR
+            detect_regions: Định vị khối chữ trước, chỉ OCR trên các vùng cắt
+            cascade: Các phương pháp từ rẻ đến đắt cho method='cascade' (mặc định PREPROCESS_CASCADE)
+            refine_fields: OCR lần hai SĐT/mã đơn/trọng lượng trên vùng cắt với whitelist ký tự
+        """
+        self.ocr_engine = ocr_engine
+        self.classifier = classifier
+        self.processor = processor
+        self.method = method
+        self.cache = cache
+        self.ocr_config = ocr_config
+        self.detector = TextRegionDetector() if detect_regions else None
+        self.cascade = list(cascade or PREPROCESS_CASCADE)
+        self.refine_fields = refine_fields
+        self.logger = logger
+        self._label_executor = None
+
+    def _cache_key(self, image) -> str:
+        """Khóa cache: hash nội dung ảnh + phương pháp xử lý + ngôn ngữ + config Tesseract + thiết lập khác"""
+        method = f"{self.method}+regions" if self.detector is not None else self.method
+        methods = self.cascade if self.method == 'cascade' else [self.method]
+        settings = {
+            'refine_fields': self.refine_fields,
+            'pipelines': {name: PREPROCESS_PIPELINES[name] for name in methods if name in PREPROCESS_PIPELINES},
+        }
+        if self.method == 'cascade':
+            settings.update({'cascade': self.cascade, 'min_confidence': CASCADE_MIN_CONFIDENCE,
+                             'required_fields': CASCADE_REQUIRED_FIELDS})
+        return self.cache.make_key(content_digest(image), method,
+                                   self.ocr_engine.lang, self.ocr_config, settings)
+
+    def run(self, image) -> dict:
+        """
+        Xử lý một nhãn bưu kiện
+
+        Args:
+            image: Đường dẫn đến ảnh, bytes của file ảnh hoặc numpy array.
+                   Ảnh được giữ trong bộ nhớ suốt pipeline, không ghi file tạm
+
+        Returns:
+            dict: {
+                'ocr': dict (text, confidence, details, regions),
+                'structured': dict (thông tin người gửi/nhận, đơn hàng),
+                'classification': dict (khu vực, nội ô/ngoại ô),
+                'processed_image': np.ndarray (None nếu lấy từ cache),
+                'method': phương pháp tiền xử lý cho kết quả cuối cùng,
+                'cascade': list các lần thử {'method', 'confidence', 'failed'} (rỗng nếu không cascade),
+                'cached': bool,
+                'timings': dict (tên bước → ms, rỗng nếu tắt METRICS_ENABLED)
+            }
+        """
+        with metrics.trace() as timings:
+            with metrics.timer('total'):
+                result = self._run(image)
+
+        result['timings'] = {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()}
+        return result
+
+    def run_multi(self, image, max_labels: int = 8) -> list:
+        """
+        Xử lý ảnh chụp nhiều kiện: tách từng nhãn (tứ giác, nắn phẳng) rồi chạy run() song song
+
+        Args:
+            image: Đường dẫn đến ảnh, bytes của file ảnh hoặc numpy array
+            max_labels: Số nhãn tối đa trên một ảnh
+
+        Returns:
+            list: Kết quả run() của từng nhãn theo thứ tự đọc, thêm 'label_index' và 'quad'
+                  (4 đỉnh trên ảnh gốc). Không tìm thấy hoặc chỉ có một nhãn → [run(ảnh gốc)]
+        """
+        image = self.processor.load_image(image)
+        labels = self.processor.split_labels(image, max_labels=max_labels)
+        if len(labels) < 2:
+            result = self.run(image)
+            result.update({'label_index': 0, 'quad': labels[0]['quad'].tolist() if labels else None})
+            return [result]
+
+        # Tesseract nhả GIL - các nhãn được OCR đồng thời, tổng thời gian gần bằng một nhãn
+        if self._label_executor is None:
+            self._label_executor = ThreadPoolExecutor(max_workers=max(1, self.ocr_engine.workers),
+                                                      thread_name_prefix='label')
+        results = list(self._label_executor.map(lambda label: self.run(label['image']), labels))
+        for index, (label, result) in enumerate(zip(labels, results)):
+            result.update({'label_index': index, 'quad': label['quad'].tolist()})
+        self.logger.info(f"Tách được {len(results)} nhãn trên một ảnh")
+        return results
+
+    def _run(self, image) -> dict:
+        """Các bước của run() (được đo thời gian trong run)"""
+        with metrics.timer('cache_lookup'):
+            cache_key = self._cache_key(image) if self.cache is not None else None
+            cached = self.cache.get(cache_key) if cache_key else None
+
+        attempts = []
+        if cached is not None:
+            # Ảnh đã từng xử lý - bỏ qua tiền xử lý và OCR
+            ocr_result, structured = cached['ocr'], cached['structured']
+            method = cached.get('method', self.method)
+            processed = None
+        else:
+            if self.method == 'cascade':
+                best, attempts = self._run_cascade(image)
+            else:
+                best = self._recognize(image, self.method)
+            method, processed = best['method'], best['processed']
+            ocr_result, structured = best['ocr'], best['structured']
+
+            if cache_key:
+                self.cache.put(cache_key, {'ocr': ocr_result, 'structured': structured, 'method': method})
+
+        # Phân loại khu vực - ƯU TIÊN địa chỉ người nhận
+        address_to_classify = structured.get('recipient_address', '') or ocr_result['text']
+        classification = self.classifier.classify(address_to_classify)
+
+        return {
+            'ocr': ocr_result,
+            'structured': structured,
+            'classification': classification,
+            'processed_image': processed,
+            'method': method,
+            'cascade': attempts,
+            'cached': cached is not None
+        }
+
+    def _recognize(self, image, method: str) -> dict:
+        """Tiền xử lý bằng method, OCR và trích xuất thông tin"""
+        processed = self.processor.preprocess_image(image, method=method)
+
+        # Chỉ OCR các khối chữ (ảnh chụp cả thùng hàng → ít điểm ảnh hơn nhiều lần),
+        # khối dài được chia thành dải để OCR song song
+        regions = []
+        if self.detector is not None:
+            regions = self.detector.ocr_regions(self.detector.detect(processed))
+
+        # OCR một lần cho mỗi phương pháp - kết quả được dùng lại cho parse và phân loại
+        ocr_result = self.ocr_engine.extract_text_with_confidence(processed, config=self.ocr_config,
+                                                                 regions=regions or None)
+        ocr_result['regions'] = regions
+        if self.refine_fields:
+            ocr_result = self.ocr_engine.refine_fields(processed, ocr_result)
+        structured = self.ocr_engine.extract_structured_data(ocr_result)
+        return {'method': method, 'processed': processed, 'ocr': ocr_result, 'structured': structured}
+
+    @staticmethod
+    def _failed_checks(attempt: dict) -> list:
+        """Các tiêu chí chất lượng chưa đạt: 'confidence' và/hoặc tên các trường còn thiếu"""
+        failed = []
+        if attempt['ocr'].get('confidence', 0) < CASCADE_MIN_CONFIDENCE:
+            failed.append('confidence')
+        failed.extend(field for field in CASCADE_REQUIRED_FIELDS if not attempt['structured'].get(field))
+        return failed
+
+    def _run_cascade(self, image) -> tuple:
+        """
+        Chạy các phương pháp tiền xử lý từ rẻ đến đắt, dừng ở phương pháp đầu tiên đạt chất lượng
+
+        Returns:
+            tuple: (lần thử được chọn, list tóm tắt các lần thử)
+                   Không phương pháp nào đạt → chọn lần thử tìm được nhiều trường nhất,
+                   hòa thì lấy confidence cao hơn
+        """
+        # Giải mã ảnh một lần cho mọi bậc
+        image = self.processor.load_image(image)
+
+        best, best_score, attempts = None, None, []
+        for index, method in enumerate(self.cascade):
+            attempt = self._recognize(image, method)
+            failed = self._failed_checks(attempt)
+            attempts.append({'method': method, 'confidence': attempt['ocr'].get('confidence', 0),
+                             'failed': failed})
+
+            score = (-sum(field != 'confidence' for field in failed), attempt['ocr'].get('confidence', 0))
+            if best is None or score > best_score:
+                best, best_score = attempt, score
+
+            if not failed:
+                metrics.increment(CASCADE_METRIC, stage=method, outcome='accepted')
+                return attempt, attempts
+
+            last = index == len(self.cascade) - 1
+            metrics.increment(CASCADE_METRIC, stage=method, outcome='exhausted' if last else 'escalated')
+            if not last:
+                self.logger.debug(f"'{method}' chưa đạt ({', '.join(failed)}) → thử phương pháp tiếp theo")
+
+        return best, attempts
+
+
+def cascade_escalation_rates() -> dict:
+    """
+    Tỉ lệ phải chuyển sang phương pháp tiếp theo ở từng bậc cascade (từ bộ đếm metrics)
+
+    Returns:
+        dict: phương pháp → {'runs': số lần chạy, 'escalated': số lần chuyển bậc, 'rate': tỉ lệ}
+              (lần chạy ở bậc cuối không đạt được tính là 'exhausted', không tính vào escalated)
+    """
+    rates = {}
+    for labels, value in metrics.counters(CASCADE_METRIC):
+        stats = rates.setdefault(labels['stage'], {'runs': 0, 'escalated': 0, 'rate': 0.0})
+        stats['runs'] += value
+        if labels['outcome'] == 'escalated':
+            stats['escalated'] += value
+    for stats in rates.values():
+        stats['rate'] = round(stats['escalated'] / stats['runs'], 4) if stats['runs'] else 0.0
+    return rates
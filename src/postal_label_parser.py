@@ -1,8 +1,15 @@
 """
 Module phân tích và trích xuất thông tin từ nhãn bưu kiện
 """
-import re
 import logging
+import sys
+from pathlib import Path
+
+# Thêm thư mục gốc vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from src.label_patterns import PATTERNS, PROVINCE_ADDRESS_PATTERNS
+from src.label_layout import group_lines, group_blocks
+from src.metrics import timed
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,6 +21,7 @@ class PostalLabelParser:
     def __init__(self):
         self.logger = logger
 
+    @timed('parse')
     def parse(self, text: str) -> dict:
         """
         Phân tích text OCR và trích xuất thông tin có cấu trúc
@@ -24,7 +32,11 @@ class PostalLabelParser:
         Returns:
             dict: Thông tin đã trích xuất
         """
-        result = {
+        return self._parse_text(text)
+
+    @staticmethod
+    def _empty_result() -> dict:
+        return {
             'sender_name': '',
             'sender_address': '',
             'sender_phone': '',
@@ -36,13 +48,16 @@ class PostalLabelParser:
             'order_id': '',
         }
 
+    def _parse_text(self, text: str) -> dict:
+        """Phần thân của parse() (không đo thời gian riêng - parse_layout cũng gọi)"""
+        result = self._empty_result()
         try:
             # 1. Trích xuất thông tin chung trước
             result['order_id'] = self._extract_order_id(text)
             result['weight'] = self._extract_weight(text)
 
             # 2. Trích xuất tất cả số điện thoại
-            all_phones = re.findall(r'0\d{9,10}', text)
+            all_phones = PATTERNS['phone'].findall(text)
 
             # 3. Tách thành 2 phần: Người gửi và Người nhận
             sender_section, recipient_section = self._split_sections(text)
@@ -64,7 +79,7 @@ class PostalLabelParser:
                 if len(all_phones) > 1:
                     result['recipient_phone'] = all_phones[1]
 
-            self.logger.info("Phân tích nhãn bưu kiện thành công")
+            self.logger.debug("Phân tích nhãn bưu kiện thành công")
             return result
 
         except Exception as e:
@@ -73,6 +88,145 @@ class PostalLabelParser:
             self.logger.error(traceback.format_exc())
             return result
 
+    @timed('parse')
+    def parse_layout(self, words: list, min_confidence: float = 0) -> dict:
+        """
+        Phân tích nhãn theo bố cục: gom từ thành dòng/khối theo tọa độ, tìm khối người gửi/người nhận
+        theo vị trí rồi trích xuất từng trường trên text của khối đó (không chạy regex trên cả nhãn)
+
+        Args:
+            words: details của OCREngine.extract_text_with_confidence
+                   (dict có 'text', 'confidence', 'left', 'top', 'width', 'height', 'block')
+            min_confidence: Bỏ các từ có độ tin cậy thấp hơn
+
+        Returns:
+            dict: Cùng các trường với parse(); không tìm thấy "Người gửi"/"Người nhận"
+                  thì quay về parse() trên text các dòng theo thứ tự đọc
+        """
+        words = [w for w in words if w.get('confidence', 100) >= min_confidence and w.get('text')]
+        if not words:
+            return self._empty_result()
+
+        lines = group_lines(words)
+        text = ' '.join(line['text'] for line in lines)
+        sections = self._layout_sections(group_blocks(lines))
+        if not sections['sender'] and not sections['recipient']:
+            return self._parse_text(text)
+
+        result = self._empty_result()
+        try:
+            result['order_id'] = self._extract_order_id(text)
+            result['weight'] = self._extract_weight(text)
+
+            for role, after in (('sender', 'gửi'), ('recipient', 'nhận')):
+                section_lines = sections[role]
+                if not section_lines:
+                    continue
+                section = ' '.join(line['text'] for line in section_lines)
+                name = self._name_from_lines(section_lines) or self._extract_name_simple(section, after=after)
+                phones = PATTERNS['phone'].findall(section)
+                if len(section_lines) > 1:
+                    # Nhiều dòng: mỗi dòng còn lại (trừ nhãn, tên, SĐT) là một phần địa chỉ
+                    address = self._address_from_lines(section_lines, name)
+                else:
+                    address = self._extract_address_after_name(section, name)
+
+                result[f'{role}_name'] = name
+                result[f'{role}_phone'] = phones[0] if phones else ''
+                result[f'{role}_address'] = address
+
+            self.logger.debug("Phân tích nhãn theo bố cục thành công")
+            return result
+
+        except Exception as e:
+            self.logger.error(f"Lỗi khi phân tích theo bố cục: {e}")
+            return result
+
+    def _layout_sections(self, blocks: list) -> dict:
+        """
+        Chia các dòng thành phần người gửi / người nhận theo vị trí
+
+        Trong một khối, phần bắt đầu từ dòng có "Người gửi"/"Người nhận" và kéo dài tới dòng
+        có nhãn còn lại. Nếu phần chỉ có dòng tiêu đề (ô "NGƯỜI NHẬN" tách riêng), lấy thêm
+        khối nằm ngay bên dưới và chồng ngang với nó.
+        """
+        sections = {'sender': [], 'recipient': []}
+        used = set()
+        for index, block in enumerate(blocks):
+            current = None
+            for line in block:
+                label = self._section_label(line['text'])
+                if label is not None:
+                    # Chỉ lấy lần xuất hiện đầu tiên ("người nhận ký" cuối nhãn kết thúc phần người nhận)
+                    current = label if not sections[label] else None
+                    if current:
+                        used.add(index)
+                if current:
+                    sections[current].append(line)
+
+        for role, section_lines in sections.items():
+            if len(section_lines) != 1:
+                continue
+            header = section_lines[0]
+            for index, block in enumerate(blocks):
+                first = block[0]
+                overlap = min(first['right'], header['right']) - max(first['left'], header['left'])
+                if index not in used and first['top'] >= header['bottom'] and overlap > 0:
+                    section_lines.extend(block)
+                    used.add(index)
+                    break
+        return sections
+
+    @staticmethod
+    def _section_label(text: str):
+        """'sender'/'recipient' nếu dòng có nhãn "Người gửi"/"Người nhận" (nhãn đứng trước được ưu tiên)"""
+        sender = PATTERNS['sender_label'].search(text)
+        recipient = PATTERNS['recipient_label'].search(text)
+        if sender and (not recipient or sender.start() < recipient.start()):
+            return 'sender'
+        if recipient:
+            return 'recipient'
+        return None
+
+    def _name_from_lines(self, lines: list) -> str:
+        """Tên = phần chữ đầu tiên sau nhãn "Người gửi/nhận" (cùng dòng hoặc dòng kế tiếp)"""
+        for line in lines[:2]:
+            text = PATTERNS['sender_label'].sub('', PATTERNS['recipient_label'].sub('', line['text']))
+            words = []
+            for word in text.strip(' :,.-').split():
+                if any(c.isdigit() for c in word) or len(words) == 5:
+                    break
+                words.append(word.strip(' :,.-'))
+            name = ' '.join(w for w in words if w)
+            if name:
+                return name
+        return ''
+
+    def _address_from_lines(self, lines: list, name: str) -> str:
+        """Địa chỉ = các dòng của phần (trừ nhãn, tên, số điện thoại) tới trước dòng kết thúc"""
+        parts = []
+        for line in lines:
+            text = PATTERNS['sender_label'].sub('', PATTERNS['recipient_label'].sub('', line['text']))
+            if name:
+                text = text.replace(name, '')
+            header = text != line['text']
+            text = PATTERNS['phone'].sub('', text).strip(' :,.-')
+            if PATTERNS['section_address_end'].match(text):
+                break
+            if text and header:
+                # Phần còn lại trên dòng nhãn/tên (VD: mã phân loại "D274A52 011") chỉ giữ từ chỗ địa chỉ bắt đầu
+                start = PATTERNS['address_start'].search(text)
+                text = text[start.start():] if start else ''
+            if text:
+                parts.append(text)
+
+        address = ', '.join(parts)
+        # Bỏ nhóm số trần ở cuối (VD: "Hồ Chí Minh 800"), giữ "Quận 10", "Phường 5"
+        trailing = PATTERNS['trailing_digit_groups'].search(address)
+        if trailing and not PATTERNS['numbered_unit'].search(address[:trailing.start()]):
+            address = address[:trailing.start()]
+        return address
+
     def _split_sections(self, text: str) -> tuple:
         """Tách text thành phần người gửi và người nhận"""
         # Tìm vị trí "Người gửi" và "Người nhận"
@@ -80,12 +234,12 @@ class PostalLabelParser:
         recipient_pos = -1
 
         # Tìm "Người gửi"
-        sender_match = re.search(r'Ng[ưu]+[oơ]+i\s+g[ửữ]+i', text, re.IGNORECASE)
+        sender_match = PATTERNS['sender_label'].search(text)
         if sender_match:
             sender_pos = sender_match.start()
 
         # Tìm "Người nhận"
-        recipient_match = re.search(r'Ng[ưu]+[oơ]+i\s+nh[ậa]+n', text, re.IGNORECASE)
+        recipient_match = PATTERNS['recipient_label'].search(text)
         if recipient_match:
             recipient_pos = recipient_match.start()
 
@@ -110,14 +264,13 @@ class PostalLabelParser:
         # VD: "Người nhận Bùi Tuấn Vũ D274A52..." → "Bùi Tuấn Vũ"
 
         # Tìm text sau keyword
-        pattern = rf'{after}\s+([A-ZÀ-Ỹ][A-Za-zÀ-ỹ\s]+?)(?=\s*[A-Z]?\d|\s+Số|$)'
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = PATTERNS[f'name_after_{after}'].search(text)
 
         if match:
             name = match.group(1).strip()
             # Loại bỏ số và ký tự lạ
-            name = re.sub(r'\s*\d.*$', '', name)
-            name = re.sub(r'\s+', ' ', name)
+            name = PATTERNS['trailing_digits'].sub('', name)
+            name = PATTERNS['whitespace'].sub(' ', name)
             # Lấy tối đa 5 từ
             words = [w for w in name.split()[:5] if not w.isdigit()]
             return ' '.join(words)
@@ -126,12 +279,6 @@ class PostalLabelParser:
 
     def _extract_address_after_name(self, text: str, name: str) -> str:
         """Trích xuất địa chỉ SAU tên - ƯU TIÊN địa chỉ người nhận"""
-        # List tỉnh/thành phố mở rộng
-        provinces = [
-            'Hồ Chí Minh', 'Hà Nội', 'Đà Nẵng', 'Bình Dương', 'Đồng Nai',
-            'Bà Rịa', 'Thủ Đầu Một', 'Cần Thơ', 'Hải Phòng', 'Long An'
-        ]
-
         # Xác định vùng tìm kiếm
         search_text = text
         if name:
@@ -140,29 +287,27 @@ class PostalLabelParser:
                 search_text = text[name_pos + len(name):]
 
         # Chiến lược 1: Tìm "Số" + số + ... + tỉnh (chuẩn địa chỉ VN)
-        for province in provinces:
+        for province, so_pattern, _ in PROVINCE_ADDRESS_PATTERNS:
             if province in search_text:
-                pattern = rf'(Số\s+\d+.{{10,}}?{province})'
-                match = re.search(pattern, search_text, re.IGNORECASE)
+                match = so_pattern.search(search_text)
                 if match:
                     address = match.group(1)
                     # Làm sạch
-                    address = re.sub(r'\s+', ' ', address)
+                    address = PATTERNS['whitespace'].sub(' ', address)
                     # Cắt bỏ các keyword kết thúc
-                    address = re.split(r'(?:Trọng lượng|Order|người nhận ký|Người nhận|\d{10,})', address, flags=re.IGNORECASE)[0]
+                    address = PATTERNS['address_end'].split(address)[0]
                     address = address.strip(' ,.-')
                     if len(address) >= 20:
                         return address
 
         # Chiến lược 2: Tìm số 1-4 chữ số + text dài + tỉnh
-        for province in provinces:
+        for province, _, number_pattern in PROVINCE_ADDRESS_PATTERNS:
             if province in search_text:
-                pattern = rf'(\d{{1,4}}\s+.{{15,}}?{province})'
-                match = re.search(pattern, search_text, re.IGNORECASE)
+                match = number_pattern.search(search_text)
                 if match:
                     address = match.group(1)
-                    address = re.sub(r'\s+', ' ', address)
-                    address = re.split(r'(?:Trọng|Order|\d{{10,}})', address, flags=re.IGNORECASE)[0]
+                    address = PATTERNS['whitespace'].sub(' ', address)
+                    address = PATTERNS['address_end_short'].split(address)[0]
                     address = address.strip(' ,.-')
                     if len(address) >= 20:
                         return address
@@ -176,15 +321,15 @@ class PostalLabelParser:
         # VD: "Người nhận Bùi Tuấn Vũ D274A52..." → "Bùi Tuấn Vũ"
 
         if person_type == 'gửi':
-            pattern = r'g[ửữ]+i\s+([A-Z][A-Za-zÀ-ỹ\s]+?)(?=\s+\d+\s+[a-zà-ỹ]|\s*\d{2,}|$)'
+            pattern = PATTERNS['section_name_gửi']
         else:
-            pattern = r'nh[ậa]+n\s+([A-Z][A-Za-zÀ-ỹ\s]+?)(?=\s+[A-Z]?\d|\s+[Ss]ố|$)'
+            pattern = PATTERNS['section_name_nhận']
 
-        match = re.search(pattern, section, re.IGNORECASE)
+        match = pattern.search(section)
         if match:
             name = match.group(1).strip()
             # Làm sạch
-            name = re.sub(r'\s+', ' ', name)
+            name = PATTERNS['whitespace'].sub(' ', name)
             # Loại bỏ các từ chứa nhiều số
             words = []
             for word in name.split():
@@ -204,23 +349,14 @@ class PostalLabelParser:
         # Địa chỉ thường bắt đầu từ số nhà và có chứa: phường, quận, huyện, tỉnh, thành phố
 
         # Pattern: Số + tên đường/địa danh + phường/quận + tỉnh/TP
-        patterns = [
-            # Có số nhà và đầy đủ thông tin
-            r'(\d+[A-Za-z,.\s]+(?:phường|quận|huyện)[^,\n]{5,}?(?:Hồ Chí Minh|Hà Nội|Đà Nẵng|Bình Dương|Thành Phố|Tỉnh)[^,\n]{0,30})',
-            # Có "Số" và địa chỉ
-            r'(Số\s+\d+[^,\n]{10,}?(?:Phường|Quận|Huyện)[^,\n]{5,})',
-            # Từ số đến quận/huyện
-            r'(\d+[^,\n]{10,}?(?:Quận|Huyện|Thành)[^,\n]{5,})',
-        ]
-
-        for pattern in patterns:
-            matches = re.findall(pattern, section, re.IGNORECASE)
+        for pattern in PATTERNS['section_addresses']:
+            matches = pattern.findall(section)
             if matches:
                 address = matches[0]
                 # Làm sạch
-                address = re.sub(r'\s+', ' ', address)
+                address = PATTERNS['whitespace'].sub(' ', address)
                 # Cắt bỏ phần sau "Trọng lượng" hoặc "Order" nếu có
-                address = re.split(r'(?:Trọng|Order|người nhận ký)', address, flags=re.IGNORECASE)[0]
+                address = PATTERNS['section_address_end'].split(address)[0]
                 address = address.strip(' ,.')
 
                 # Kiểm tra độ dài hợp lý
@@ -231,21 +367,21 @@ class PostalLabelParser:
 
     def _extract_phone_from_section(self, section: str, index: int = 0) -> str:
         """Trích xuất số điện thoại từ section"""
-        phones = re.findall(r'0\d{9,10}', section)
+        phones = PATTERNS['phone'].findall(section)
         if phones and index < len(phones):
             return phones[index]
         return ''
 
     def _extract_order_id(self, text: str) -> str:
         """Trích xuất mã đơn hàng"""
-        match = re.search(r'Order\s*[:\s]*(\d+)', text, re.IGNORECASE)
+        match = PATTERNS['order_id'].search(text)
         if match:
             return match.group(1)
         return ''
 
     def _extract_weight(self, text: str) -> str:
         """Trích xuất trọng lượng"""
-        match = re.search(r'[Tt]r[oọ]ng\s+l[uươ]+ng.*?(\d+[.,]\d+)\s*KG', text, re.IGNORECASE)
+        match = PATTERNS['weight'].search(text)
         if match:
             return match.group(1) + ' KG'
         return ''
@@ -253,7 +389,7 @@ class PostalLabelParser:
     def _extract_postal_code(self, text: str) -> str:
         """Trích xuất mã bưu chính (5-6 số)"""
         # Tìm các chuỗi 5-6 số
-        codes = re.findall(r'\b\d{5,6}\b', text)
+        codes = PATTERNS['postal_code'].findall(text)
         for code in codes:
             # Loại trừ số điện thoại (10-11 số)
             if len(code) <= 6:
@@ -0,0 +1,206 @@
+"""
+Module chuỗi tiền xử lý ảnh có thể ghép nối (khai báo trong config.PREPROCESS_PIPELINES)
+
+- Các bước hình học (resize) chạy trên ảnh gốc trước, các bước còn lại chỉ chạy trên
+  một kênh: kênh L (LAB) khi cần giữ màu, ảnh xám khi không cần màu
+- Đối tượng CLAHE, kernel được tạo một lần và dùng lại (CLAHE riêng cho từng luồng)
+- Ảnh trung gian được ghi vào buffer cấp sẵn (dst=) và dùng lại giữa các lần gọi;
+  chỉ ảnh kết quả cuối cùng được cấp phát mới
+"""
+import threading
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Thêm thư mục gốc vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from src.metrics import timer
+
+
+class ResizeStep:
+    """Thu nhỏ ảnh có cạnh dài vượt max_side (và phóng to ảnh có cạnh dài dưới min_side)"""
+
+    name = 'resize'
+    geometric = True
+
+    def __init__(self, max_side: int = None, min_side: int = None):
+        self.max_side = max_side
+        self.min_side = min_side
+
+    def output_shape(self, shape: tuple) -> tuple:
+        height, width = shape[:2]
+        longest = max(height, width)
+        scale = 1.0
+        if self.max_side and longest > self.max_side:
+            scale = self.max_side / float(longest)
+        elif self.min_side and longest < self.min_side:
+            scale = self.min_side / float(longest)
+        if scale == 1.0:
+            return shape
+        return (max(1, int(height * scale)), max(1, int(width * scale))) + tuple(shape[2:])
+
+    def __call__(self, src: np.ndarray, dst: np.ndarray = None) -> np.ndarray:
+        shape = self.output_shape(src.shape)
+        if shape == src.shape:
+            return src
+        interpolation = cv2.INTER_AREA if shape[0] < src.shape[0] else cv2.INTER_CUBIC
+        return cv2.resize(src, (shape[1], shape[0]), dst=dst, interpolation=interpolation)
+
+
+class SharpenStep:
+    """Tăng độ sắc nét bằng kernel Laplacian (kernel tạo một lần)"""
+
+    name = 'sharpen'
+    geometric = False
+
+    def __init__(self, strength: float = 1.0):
+        self.kernel = np.array([[-1, -1, -1],
+                                [-1, 8, -1],
+                                [-1, -1, -1]], dtype=np.float32) * strength
+        self.kernel[1, 1] += 1.0
+
+    def __call__(self, src: np.ndarray, dst: np.ndarray = None) -> np.ndarray:
+        return cv2.filter2D(src, -1, self.kernel, dst=dst)
+
+
+class ClaheStep:
+    """Tăng contrast cục bộ bằng CLAHE (mỗi luồng giữ một đối tượng CLAHE)"""
+
+    name = 'clahe'
+    geometric = False
+
+    def __init__(self, clip_limit: float = 3.0, tile_grid: int = 8):
+        self.clip_limit = clip_limit
+        self.tile_grid = (tile_grid, tile_grid)
+        self._local = threading.local()
+
+    def __call__(self, src: np.ndarray, dst: np.ndarray = None) -> np.ndarray:
+        clahe = getattr(self._local, 'clahe', None)
+        if clahe is None:
+            clahe = cv2.createCLAHE(clipLimit=self.clip_limit, tileGridSize=self.tile_grid)
+            self._local.clahe = clahe
+        return clahe.apply(src, dst=dst)
+
+
+class ThresholdStep:
+    """Nhị phân hóa Otsu"""
+
+    name = 'threshold'
+    geometric = False
+
+    def __call__(self, src: np.ndarray, dst: np.ndarray = None) -> np.ndarray:
+        _, binary = cv2.threshold(src, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=dst)
+        return binary
+
+
+class DenoiseStep:
+    """Giảm nhiễu Non-local Means trên một kênh"""
+
+    name = 'denoise'
+    geometric = False
+
+    def __init__(self, strength: float = 10.0, template_window: int = 7, search_window: int = 21):
+        self.strength = strength
+        self.template_window = template_window
+        self.search_window = search_window
+
+    def __call__(self, src: np.ndarray, dst: np.ndarray = None) -> np.ndarray:
+        return cv2.fastNlMeansDenoising(src, dst, self.strength, self.template_window, self.search_window)
+
+
+# Tên bước dùng trong spec của config → lớp
+STEP_TYPES = {step.name: step for step in (ResizeStep, SharpenStep, ClaheStep, ThresholdStep, DenoiseStep)}
+
+
+class PreprocessPipeline:
+    """Chuỗi bước tiền xử lý, khai báo bằng spec"""
+
+    def __init__(self, steps: list, keep_color: bool = True):
+        """
+        Args:
+            steps: Các bước (ResizeStep, SharpenStep, ...) theo thứ tự; bước hình học phải đứng trước
+            keep_color: True = xử lý kênh L rồi trả về ảnh BGR, False = trả về ảnh xám
+        """
+        geometric = [step.geometric for step in steps]
+        if geometric != sorted(geometric, reverse=True):
+            raise ValueError("Các bước hình học (resize) phải đứng trước các bước xử lý kênh")
+        self.geometric_steps = [step for step in steps if step.geometric]
+        self.channel_steps = [step for step in steps if not step.geometric]
+        self.keep_color = keep_color
+        self._buffers = threading.local()
+
+    @classmethod
+    def from_spec(cls, spec: dict) -> 'PreprocessPipeline':
+        """
+        Tạo pipeline từ spec trong config
+
+        Ví dụ:
+            {'keep_color': True, 'steps': [('resize', {'max_side': 2000}), ('sharpen', {}), ('clahe', {})]}
+
+        Raises:
+            ValueError: Nếu spec có bước không hỗ trợ
+        """
+        steps = []
+        for name, options in spec.get('steps', []):
+            if name not in STEP_TYPES:
+                raise ValueError(f"Bước tiền xử lý không hỗ trợ: {name}")
+            steps.append(STEP_TYPES[name](**(options or {})))
+        return cls(steps, keep_color=spec.get('keep_color', True))
+
+    def _buffer(self, slot: str, shape: tuple, dtype=np.uint8) -> np.ndarray:
+        """Buffer dùng lại của luồng hiện tại (cấp phát lại khi kích thước ảnh thay đổi)"""
+        buffers = getattr(self._buffers, 'arrays', None)
+        if buffers is None:
+            buffers = self._buffers.arrays = {}
+        buffer = buffers.get(slot)
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+            buffer = buffers[slot] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def _run_channel_steps(self, plane: np.ndarray, last_dst: np.ndarray = None) -> np.ndarray:
+        """Chạy các bước trên một kênh, luân phiên hai buffer; bước cuối ghi vào last_dst"""
+        slots = ('plane_a', 'plane_b')
+        for index, step in enumerate(self.channel_steps):
+            if index == len(self.channel_steps) - 1:
+                dst = last_dst
+            else:
+                dst = self._buffer(slots[index % 2], plane.shape)
+                if dst is plane:
+                    dst = self._buffer(slots[(index + 1) % 2], plane.shape)
+            with timer(step.name):
+                plane = step(plane, dst=dst)
+        return plane
+
+    def run(self, image: np.ndarray) -> np.ndarray:
+        """
+        Chạy pipeline
+
+        Args:
+            image: Ảnh BGR hoặc grayscale (uint8); không bị thay đổi
+
+        Returns:
+            np.ndarray: Ảnh mới (BGR nếu keep_color và ảnh vào có màu, ngược lại ảnh xám)
+        """
+        current = image
+        for step in self.geometric_steps:
+            with timer(step.name):
+                current = step(current, dst=self._buffer('resized', step.output_shape(current.shape)))
+
+        if not self.channel_steps:
+            return current.copy()
+
+        if current.ndim == 2:
+            plane = current
+        elif self.keep_color:
+            lab = cv2.cvtColor(current, cv2.COLOR_BGR2LAB, dst=self._buffer('lab', current.shape))
+            plane = cv2.extractChannel(lab, 0, dst=self._buffer('luma', current.shape[:2]))
+            plane = self._run_channel_steps(plane, last_dst=self._buffer('luma_out', current.shape[:2]))
+            cv2.insertChannel(plane, lab, 0)
+            # Ảnh kết quả là mảng mới - buffer chỉ dùng cho dữ liệu trung gian
+            return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+        else:
+            plane = cv2.cvtColor(current, cv2.COLOR_BGR2GRAY, dst=self._buffer('gray', current.shape[:2]))
+
+        return self._run_channel_steps(plane)
@@ -6,10 +6,15 @@ import logging
 import re
 from pathlib import Path
 import sys
+import unicodedata
 
 # Thêm thư mục config vào path
 sys.path.append(str(Path(__file__).parent.parent))
 from config.config import REGION_MAPPING_FILE
+from src.gazetteer import AREA_NAMES, Gazetteer
+from src.metrics import timed
+from src.text_matcher import AhoCorasick
+from src.text_normalizer import DeleteIndex, fold_text, fold_with_offsets, normalize_ocr_token
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,6 +27,98 @@ class RegionClassifier:
         """Khởi tạo Region Classifier"""
         self.logger = logger
         self.region_data = self._load_region_data()
+        self.gazetteer = Gazetteer()
+        # Dạng viết đúng (lowercase) của từng pattern, dùng để phân biệt khớp chính xác/khớp bỏ dấu
+        self._exact_forms = {}
+        self.matcher = self._build_matcher()
+        self.fuzzy_index = self._build_fuzzy_index()
+
+    def _build_matcher(self) -> AhoCorasick:
+        """
+        Dựng automaton Aho–Corasick một lần từ region_mapping.json
+
+        Pattern được lưu ở dạng bỏ dấu (fold_text) nên "Ho Chi Minh", "Hồ Chi Mình"
+        đều khớp "Hồ Chí Minh"; tên viết tắt trong "aliases" (hcm, tphcm, hn...) cũng được thêm.
+
+        Payload của mỗi pattern: (loại, khóa, tên gốc, thứ tự)
+            loại: 'province' | 'keyword'
+        """
+        matcher = AhoCorasick()
+        order = 0
+
+        def add(name, payload, exact_form=None):
+            matcher.add(fold_text(name), payload)
+            if exact_form is not None:
+                self._exact_forms[payload[3]] = exact_form
+
+        for region_key, region_info in self.region_data.get('provinces', {}).items():
+            for province in region_info['provinces']:
+                add(province, ('province', region_key, province, order), province.lower())
+                order += 1
+
+        province_regions = self._province_regions()
+        for province, aliases in self.region_data.get('aliases', {}).items():
+            region_key = province_regions.get(province)
+            if region_key is None:
+                continue
+            for alias in aliases:
+                add(alias, ('province', region_key, province, order))
+                order += 1
+
+        for region, keywords in self.region_data.get('keywords', {}).items():
+            for keyword in keywords:
+                add(keyword, ('keyword', region, keyword, order), keyword)
+                order += 1
+
+        matcher.build()
+        return matcher
+
+    def _build_fuzzy_index(self) -> DeleteIndex:
+        """Dựng chỉ mục tra cứu gần đúng tên tỉnh/thành (kể cả tên viết tắt) cho text OCR lỗi"""
+        index = DeleteIndex(max_distance=2)
+        province_regions = self._province_regions()
+
+        names = [(province, province) for province in province_regions]
+        for province, aliases in self.region_data.get('aliases', {}).items():
+            names.extend((alias, province) for alias in aliases if province in province_regions)
+
+        for name, province in names:
+            term = ' '.join(normalize_ocr_token(token) for token in fold_text(name).split())
+            index.add(term, (province_regions[province], province))
+
+        return index
+
+    def _province_regions(self) -> dict:
+        """Ánh xạ tên tỉnh/thành → khóa khu vực"""
+        return {
+            province: region_key
+            for region_key, region_info in self.region_data.get('provinces', {}).items()
+            for province in region_info['provinces']
+        }
+
+    def _find_matches(self, text: str) -> list:
+        """
+        Tìm tất cả tỉnh/thành và từ khóa trong text với một lần duyệt
+
+        Text được bỏ dấu trước khi so khớp; vị trí trả về là vị trí trong `text`.
+        Chỉ nhận các match trọn từ ("hà nam" không khớp bên trong "hà namh").
+        """
+        folded, offsets = fold_with_offsets(text)
+        matches = []
+
+        for start, end, payload in self.matcher.find_all(folded):
+            if start > 0 and folded[start - 1] != ' ':
+                continue
+            if end < len(folded) and folded[end] != ' ':
+                continue
+            matches.append((offsets[start], offsets[end - 1] + 1, payload))
+
+        return matches
+
+    def _is_exact(self, text: str, match: tuple) -> bool:
+        """Match có được viết đúng dấu như trong region_mapping.json không"""
+        start, end, payload = match
+        return text[start:end] == self._exact_forms.get(payload[3])
 
     def _load_region_data(self) -> dict:
         """Load dữ liệu ánh xạ khu vực từ file JSON"""
@@ -34,6 +131,7 @@ class RegionClassifier:
             self.logger.error(f"Lỗi khi load dữ liệu khu vực: {e}")
             return {}
 
+    @timed('classify')
     def classify(self, text: str) -> dict:
         """
         Phân loại khu vực dựa trên text
@@ -49,7 +147,8 @@ class RegionClassifier:
                 'province': str,
                 'matched_keywords': list,
                 'area_type': str (noi_o/ngoai_o),  # THÊM MỚI
-                'area_name': str  # THÊM MỚI
+                'area_name': str,  # THÊM MỚI
+                'district': str, 'ward': str  # quận/huyện, phường/xã (theo danh mục hành chính)
             }
         """
         result = {
@@ -59,7 +158,11 @@ class RegionClassifier:
             'province': '',
             'matched_keywords': [],
             'area_type': 'unknown',
-            'area_name': 'Không xác định'
+            'area_name': 'Không xác định',
+            'district': '',
+            'ward': '',
+            'matched_spans': [],
+            'match_method': ''
         }
 
         if not text:
@@ -68,121 +171,219 @@ class RegionClassifier:
         # Chuẩn hóa text
         text_lower = self._normalize_text(text)
 
+        # Tìm tất cả tỉnh, từ khóa trong MỘT lần duyệt text
+        matches = self._find_matches(text_lower)
+
+        # Đơn vị hành chính sâu nhất (phường/xã → quận/huyện → tỉnh)
+        location = self.gazetteer.locate(text_lower)
+
         # Phân loại theo tỉnh/thành phố
-        province_result = self._classify_by_province(text_lower)
+        province_result = self._classify_by_province(text_lower, matches, location)
+        if province_result['confidence'] <= 0 and location:
+            # Không có tên tỉnh: suy ra từ quận/huyện, phường/xã
+            province_result = self._classify_by_location(location)
+        if province_result['confidence'] <= 0:
+            # Phân loại theo keywords
+            province_result = self._classify_by_keywords(text_lower, matches)
+        if province_result['confidence'] <= 0:
+            # Phân loại theo mã bưu chính
+            province_result = self._classify_by_postal_code(text)
+
         if province_result['confidence'] > 0:
             result.update(province_result)
-            # Phân loại NỘI Ô / NGOẠI Ô
-            area_result = self._classify_urban_suburban(text_lower, result.get('province', ''))
-            result.update(area_result)
-            return result
 
-        # Phân loại theo keywords
-        keyword_result = self._classify_by_keywords(text_lower)
-        if keyword_result['confidence'] > 0:
-            result.update(keyword_result)
-            # Phân loại NỘI Ô / NGOẠI Ô
-            area_result = self._classify_urban_suburban(text_lower, result.get('province', ''))
-            result.update(area_result)
-            return result
+            # Chỉ dùng quận/huyện, phường/xã nếu thuộc đúng tỉnh đã xác định
+            province_unit = self.gazetteer.find_province(result['province'])
+            if location and (province_unit is None or location['province'] == province_unit['province']):
+                result['district'] = location['district']
+                result['ward'] = location['ward']
+            else:
+                location = None
 
-        # Phân loại theo mã bưu chính
-        postal_result = self._classify_by_postal_code(text)
-        if postal_result['confidence'] > 0:
-            result.update(postal_result)
             # Phân loại NỘI Ô / NGOẠI Ô
-            area_result = self._classify_urban_suburban(text, result.get('province', ''))
+            area_result = self._classify_urban_suburban(result.get('province', ''), location)
             result.update(area_result)
-            return result
 
         return result
 
     def _normalize_text(self, text: str) -> str:
         """Chuẩn hóa text để so sánh"""
-        # Chuyển về lowercase
-        text = text.lower()
+        # Dựng sẵn ký tự có dấu (NFC) và chuyển về lowercase
+        text = unicodedata.normalize('NFC', text).lower()
 
-        # Loại bỏ dấu tiếng Việt (giữ nguyên cho độ chính xác)
-        # Có thể thêm logic loại bỏ dấu nếu cần
+        # Giữ nguyên dấu tiếng Việt; so khớp bỏ dấu được thực hiện trong _find_matches
 
         # Loại bỏ ký tự đặc biệt thừa
         text = re.sub(r'\s+', ' ', text)
 
         return text.strip()
 
-    def _classify_by_province(self, text: str) -> dict:
-        """Phân loại theo tỉnh/thành phố"""
+    def _classify_by_province(self, text: str, matches: list = None, location: dict = None) -> dict:
+        """
+        Phân loại theo tỉnh/thành phố
+
+        Thứ tự ưu tiên: khớp chính xác (có dấu) → khớp bỏ dấu/tên viết tắt
+        → khớp gần đúng (sai 1-2 ký tự do OCR).
+
+        Args:
+            text: Text đã normalize
+            matches: Kết quả _find_matches(text) (tự tính nếu không truyền)
+            location: Kết quả Gazetteer.locate(text) (tùy chọn). Nếu tỉnh của đơn vị này
+                      có trong text thì chỉ xét tỉnh đó (VD: "Điện Biên Phủ, Huyện Vĩnh Thạnh,
+                      Cần Thơ" → Cần Thơ, không phải tỉnh Điện Biên)
+        """
         result = {
             'region': 'unknown',
             'region_name': 'Không xác định',
             'confidence': 0.0,
             'province': '',
-            'matched_keywords': []
+            'matched_keywords': [],
+            'matched_spans': [],
+            'match_method': ''
         }
 
         if 'provinces' not in self.region_data:
             return result
 
-        max_confidence = 0
+        if matches is None:
+            matches = self._find_matches(text)
+
+        province_matches = [m for m in matches if m[2][0] == 'province']
+        if location:
+            confirmed = [m for m in province_matches
+                         if (self.gazetteer.find_province(m[2][2]) or {}).get('name') == location['province']]
+            province_matches = confirmed or province_matches
+
+        best_key = None
         best_match = None
-        matched_province = ''
 
-        for region_key, region_info in self.region_data['provinces'].items():
-            for province in region_info['provinces']:
-                province_lower = province.lower()
+        for match in province_matches:
+            start, end, payload = match
 
-                # Kiểm tra exact match hoặc partial match
-                if province_lower in text or text.find(province_lower) != -1:
-                    confidence = 0.9  # High confidence cho exact match
+            match_ratio = (end - start) / len(text)
+            if self._is_exact(text, match):
+                # High confidence cho exact match, cộng thêm theo độ dài match
+                confidence = min(0.9 + match_ratio * 0.1, 1.0)
+                method = 'exact'
+            else:
+                confidence = min(0.8 + match_ratio * 0.1, 0.9)
+                method = 'folded'
 
-                    # Tính confidence dựa trên độ dài match
-                    match_ratio = len(province_lower) / len(text)
-                    confidence = min(confidence + match_ratio * 0.1, 1.0)
+            # Cùng độ tin cậy: ưu tiên tên xuất hiện sau (địa chỉ VN kết thúc bằng tỉnh/thành)
+            key = (confidence, end)
+            if best_key is None or key > best_key:
+                best_key = key
+                best_match = (start, end, payload[1], payload[2], method)
 
-                    if confidence > max_confidence:
-                        max_confidence = confidence
-                        best_match = region_key
-                        matched_province = province
+        if best_match is None:
+            best_key, best_match = self._fuzzy_province_match(text)
 
         if best_match:
-            region_info = self.region_data['provinces'][best_match]
+            start, end, region_key, province, method = best_match
+            region_info = self.region_data['provinces'][region_key]
             result.update({
-                'region': best_match,
+                'region': region_key,
                 'region_name': region_info['name'],
-                'confidence': round(max_confidence, 2),
-                'province': matched_province,
-                'matched_keywords': [matched_province]
+                'confidence': round(best_key[0], 2),
+                'province': province,
+                'matched_keywords': [province],
+                'matched_spans': [(start, end)],
+                'match_method': method
             })
 
         return result
 
-    def _classify_by_keywords(self, text: str) -> dict:
-        """Phân loại theo keywords đặc trưng"""
+    def _classify_by_location(self, location: dict) -> dict:
+        """
+        Phân loại theo đơn vị hành chính tìm được trong danh mục (VD: chỉ có "Thủ Dầu Một")
+
+        Args:
+            location: Kết quả Gazetteer.locate
+        """
+        region_info = self.region_data.get('provinces', {}).get(location['region'], {})
+        return {
+            'region': location['region'],
+            'region_name': region_info.get('name', 'Không xác định'),
+            'confidence': 0.85,
+            'province': location['province'],
+            'matched_keywords': [location['name']],
+            'matched_spans': [location['span']],
+            'match_method': 'gazetteer'
+        }
+
+    def _fuzzy_province_match(self, text: str) -> tuple:
+        """
+        Tìm tên tỉnh/thành gần đúng (lỗi OCR như "Ho Chi Mirh", "B1nh Duong")
+
+        Returns:
+            tuple: (khóa so sánh, (start, end, khóa khu vực, tỉnh, 'fuzzy')) hoặc (None, None)
+        """
+        folded, offsets = fold_with_offsets(text)
+        token_spans = [(m.start(), m.end()) for m in re.finditer(r'\S+', folded)]
+        tokens = [normalize_ocr_token(folded[start:end]) for start, end in token_spans]
+
+        best_key = None
+        best_match = None
+
+        for distance, first, last, _, (region_key, province) in self.fuzzy_index.search_tokens(tokens):
+            start = offsets[token_spans[first][0]]
+            end = offsets[token_spans[last - 1][1] - 1] + 1
+            confidence = 0.75 - 0.05 * distance
+
+            key = (confidence, end)
+            if best_key is None or key > best_key:
+                best_key = key
+                best_match = (start, end, region_key, province, 'fuzzy')
+
+        return best_key, best_match
+
+    def _classify_by_keywords(self, text: str, matches: list = None) -> dict:
+        """
+        Phân loại theo keywords đặc trưng
+
+        Args:
+            text: Text đã normalize
+            matches: Kết quả _find_matches(text) (tự tính nếu không truyền)
+        """
         result = {
             'region': 'unknown',
             'region_name': 'Không xác định',
             'confidence': 0.0,
             'province': '',
-            'matched_keywords': []
+            'matched_keywords': [],
+            'matched_spans': [],
+            'match_method': ''
         }
 
         if 'keywords' not in self.region_data:
             return result
 
+        if matches is None:
+            matches = self._find_matches(text)
+
         scores = {
             'north': 0,
             'central': 0,
             'south': 0
         }
 
+        # Mỗi keyword chỉ tính một lần, giữ vị trí xuất hiện đầu tiên.
+        # Keyword phải khớp đúng dấu: "huế" bỏ dấu sẽ trùng với "Nguyễn Huệ"
+        first_hits = {}
+        for match in matches:
+            start, end, payload = match
+            if payload[0] == 'keyword' and payload[3] not in first_hits and self._is_exact(text, match):
+                first_hits[payload[3]] = match
+
         matched_keywords = []
+        matched_spans = []
 
-        # Đếm số keyword match
-        for region, keywords in self.region_data['keywords'].items():
-            for keyword in keywords:
-                if keyword in text:
-                    scores[region] += 1
-                    matched_keywords.append(keyword)
+        # Đếm số keyword match (theo thứ tự trong region_mapping.json)
+        for order in sorted(first_hits):
+            start, end, (_, region, keyword, _) = first_hits[order]
+            scores[region] += 1
+            matched_keywords.append(keyword)
+            matched_spans.append((start, end))
 
         # Tìm region có score cao nhất
         if max(scores.values()) > 0:
@@ -203,7 +404,9 @@ class RegionClassifier:
                 'region': region_key,
                 'region_name': region_info['name'],
                 'confidence': round(confidence, 2),
-                'matched_keywords': matched_keywords
+                'matched_keywords': matched_keywords,
+                'matched_spans': matched_spans,
+                'match_method': 'keyword'
             })
 
         return result
@@ -215,7 +418,8 @@ class RegionClassifier:
             'region_name': 'Không xác định',
             'confidence': 0.0,
             'province': '',
-            'matched_keywords': []
+            'matched_keywords': [],
+            'match_method': ''
         }
 
         if 'postal_codes' not in self.region_data:
@@ -246,23 +450,23 @@ class RegionClassifier:
                         'region': region_key,
                         'region_name': region_info['name'],
                         'confidence': 0.7,  # Medium confidence cho postal code
-                        'matched_keywords': [f'Mã bưu chính: {postal_code}']
+                        'matched_keywords': [f'Mã bưu chính: {postal_code}'],
+                        'match_method': 'postal'
                     })
                     return result
 
         return result
 
-    def _classify_urban_suburban(self, text: str, province: str = '') -> dict:
+    def _classify_urban_suburban(self, province: str = '', location: dict = None) -> dict:
         """
-        Phân loại NỘI Ô / NGOẠI Ô dựa trên địa chỉ
+        Phân loại NỘI Ô / NGOẠI Ô theo danh mục hành chính
 
-        Logic đơn giản:
-        - NỘI Ô = Thành phố Hồ Chí Minh
-        - NGOẠI Ô = Tất cả các tỉnh/thành khác
+        Trạng thái nội/ngoại ô được khai báo theo từng đơn vị trong models/gazetteer.json
+        (mặc định kế thừa từ cấp cha; hiện tại NỘI Ô = Thành phố Hồ Chí Minh).
 
         Args:
-            text: Text đã normalize (lowercase)
             province: Tỉnh/Thành phố đã được xác định
+            location: Đơn vị hành chính sâu nhất (Gazetteer.locate) thuộc tỉnh đó (tùy chọn)
 
         Returns:
             dict: {'area_type': 'noi_o'/'ngoai_o', 'area_name': str}
@@ -272,32 +476,19 @@ class RegionClassifier:
             'area_name': 'Không xác định'
         }
 
-        # Kiểm tra Thành phố Hồ Chí Minh
-        hcm_keywords = [
-            'hồ chí minh',
-            'tp hồ chí minh',
-            'tp. hồ chí minh',
-            'thành phố hồ chí minh',
-            'sài gòn',
-            'saigon',
-            'tp hcm',
-            'tp. hcm',
-            'hcm'
-        ]
-
-        # Kiểm tra trong text hoặc province
-        text_to_check = (text + ' ' + province.lower()).lower()
-
-        for keyword in hcm_keywords:
-            if keyword in text_to_check:
-                result['area_type'] = 'noi_o'
-                result['area_name'] = 'NỘI Ô'
-                return result
-
-        # Nếu không phải HCM và đã xác định được tỉnh → NGOẠI Ô
-        if province and province.strip():
+        unit = location or self.gazetteer.find_province(province)
+        if unit is None and province:
+            # Tên không phải tỉnh/thành (VD: "Biên Hòa") → tra như quận/huyện
+            units = self.gazetteer.lookup(province)
+            unit = units[0] if units else None
+
+        if unit:
+            result['area_type'] = unit['area_type']
+            result['area_name'] = AREA_NAMES.get(unit['area_type'], 'Không xác định')
+        elif province and province.strip():
+            # Tỉnh không có trong danh mục → NGOẠI Ô
             result['area_type'] = 'ngoai_o'
-            result['area_name'] = 'NGOẠI Ô'
+            result['area_name'] = AREA_NAMES['ngoai_o']
 
         return result
 
@@ -0,0 +1,161 @@
+"""
+Module cache kết quả OCR theo hash nội dung ảnh (lưu SQLite trên đĩa)
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Thêm thư mục config vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import RESULT_CACHE_FILE, RESULT_CACHE_MAX_ENTRIES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Phiên bản định dạng khóa/kết quả cache: tăng khi thay đổi cách OCR hoặc phân tích
+# làm kết quả cũ không còn đúng (khóa cũ tự động bị bỏ qua và bị loại dần theo LRU)
+CACHE_SCHEMA_VERSION = 2
+
+
+def content_digest(image) -> str:
+    """
+    Tính hash nội dung ảnh
+
+    Args:
+        image: Bytes của file ảnh, đường dẫn ảnh hoặc numpy array
+
+    Returns:
+        str: SHA-256 dạng hex
+    """
+    digest = hashlib.sha256()
+    if isinstance(image, np.ndarray):
+        # Ảnh đã giải mã: hash cả kích thước để tránh trùng giữa các shape
+        digest.update(f"{image.shape}{image.dtype}".encode('utf-8'))
+        digest.update(np.ascontiguousarray(image).data)
+    elif isinstance(image, (bytes, bytearray, memoryview)):
+        digest.update(image)
+    else:
+        with open(image, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Cache kết quả OCR (words + dữ liệu có cấu trúc) với cơ chế loại bỏ LRU"""
+
+    def __init__(self, path=RESULT_CACHE_FILE, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        """
+        Khởi tạo cache
+
+        Args:
+            path: File SQLite lưu cache (':memory:' để chỉ lưu trong RAM)
+            max_entries: Số kết quả tối đa; vượt quá sẽ xóa các kết quả ít dùng gần đây nhất
+        """
+        self.logger = logger
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if self.path != ':memory:':
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        if self.path != ':memory:':
+            # WAL cho phép nhiều tiến trình (batch OCR) đọc/ghi cùng lúc
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_last_access ON results (last_access)')
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(digest: str, method: str, lang: str, config: str, settings: dict = None) -> str:
+        """
+        Tạo khóa cache
+
+        Args:
+            digest: Hash nội dung ảnh (content_digest)
+            method: Phương pháp tiền xử lý
+            lang: Ngôn ngữ OCR
+            config: Chuỗi config Tesseract
+            settings: Các thiết lập khác ảnh hưởng tới kết quả (chuỗi tiền xử lý, cascade, OCR lần hai...)
+        """
+        extra = json.dumps(settings or {}, sort_keys=True, ensure_ascii=False, default=str)
+        settings_hash = hashlib.sha1(extra.encode('utf-8')).hexdigest()[:16]
+        return f"v{CACHE_SCHEMA_VERSION}|{digest}|{method}|{lang}|{config}|{settings_hash}"
+
+    def get(self, key: str):
+        """
+        Lấy kết quả từ cache
+
+        Returns:
+            dict hoặc None: Kết quả đã lưu, None nếu chưa có
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute('UPDATE results SET last_access = ? WHERE key = ?',
+                               (time.time(), key))
+            self._conn.commit()
+
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict) -> None:
+        """Lưu kết quả vào cache và loại bỏ các kết quả cũ nếu vượt giới hạn"""
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO results (key, value, last_access) VALUES (?, ?, ?)',
+                (key, payload, time.time())
+            )
+            count = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    'DELETE FROM results WHERE key IN '
+                    '(SELECT key FROM results ORDER BY last_access ASC LIMIT ?)',
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """Thống kê cache: số lần hit/miss, tỉ lệ hit và số kết quả đang lưu"""
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'entries': entries,
+        }
+
+    def clear(self) -> None:
+        """Xóa toàn bộ cache"""
+        with self._lock:
+            self._conn.execute('DELETE FROM results')
+            self._conn.commit()
+
+    def close(self) -> None:
+        """Đóng kết nối SQLite"""
+        with self._lock:
+            self._conn.close()
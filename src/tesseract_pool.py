@@ -0,0 +1,410 @@
+"""
+Module pool Tesseract - giữ các worker Tesseract sống lâu, đã load sẵn traineddata
+
+Thay vì mỗi lần gọi pytesseract lại fork một tiến trình `tesseract`, load lại
+`vie+eng` và ghi file PNG tạm, pool này gọi thẳng Tesseract C API (libtesseract)
+qua ctypes. Mỗi worker là một TessBaseAPI đã Init sẵn ngôn ngữ; ảnh được truyền
+trực tiếp từ bộ nhớ.
+"""
+import ctypes
+import ctypes.util
+import glob
+import logging
+import os
+import queue
+import shlex
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Thêm thư mục config vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import TESSERACT_CMD, TESSERACT_LIB, TESSDATA_DIR, TESSERACT_POOL_SIZE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Các cột của output TSV - giống hệt pytesseract.image_to_data(output_type=DICT)
+TSV_COLUMNS = ['level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+               'left', 'top', 'width', 'height', 'conf', 'text']
+
+# Biến dạng chuỗi (mặc định rỗng) được đặt riêng cho từng lần nhận dạng trên worker mượn từ pool,
+# không cần pool riêng (mỗi pool giữ tới `size` bản traineddata trong RAM)
+PER_CALL_VARIABLES = frozenset({'tessedit_char_whitelist', 'tessedit_char_blacklist',
+                                'tessedit_char_unblacklist'})
+
+# Đặt vào hàng đợi worker rảnh khi pool đóng để đánh thức các luồng đang chờ trong _acquire()
+_CLOSED = object()
+
+# Tên thư viện thường gặp trên từng hệ điều hành
+_LIBRARY_NAMES = [
+    'libtesseract.so.5', 'libtesseract.so.4', 'libtesseract.so',
+    'libtesseract.5.dylib', 'libtesseract.dylib',
+]
+
+
+def parse_tesseract_config(config: str) -> tuple:
+    """
+    Phân tích chuỗi config kiểu pytesseract ('--psm 6 -c key=value')
+
+    Args:
+        config: Chuỗi config truyền cho Tesseract CLI
+
+    Returns:
+        tuple: (psm, oem, dpi, variables) - psm/oem/dpi là int hoặc None,
+               variables là dict {tên biến: giá trị}
+
+    Raises:
+        ValueError: Nếu config có tham số C API không hỗ trợ
+    """
+    psm = oem = dpi = None
+    variables = {}
+
+    tokens = shlex.split(config or '')
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in ('--psm', '--oem', '--dpi') and i + 1 < len(tokens):
+            value = int(tokens[i + 1])
+            if token == '--psm':
+                psm = value
+            elif token == '--oem':
+                oem = value
+            else:
+                dpi = value
+            i += 2
+        elif token == '-c' and i + 1 < len(tokens) and '=' in tokens[i + 1]:
+            name, value = tokens[i + 1].split('=', 1)
+            variables[name] = value
+            i += 2
+        elif token.startswith('-c') and '=' in token:
+            name, value = token[2:].split('=', 1)
+            variables[name] = value
+            i += 1
+        else:
+            raise ValueError(f"Tham số Tesseract không hỗ trợ qua C API: {token}")
+
+    return psm, oem, dpi, variables
+
+
+def tsv_to_dict(tsv: str) -> dict:
+    """Chuyển output TSV của Tesseract sang dict giống pytesseract Output.DICT"""
+    data = {column: [] for column in TSV_COLUMNS}
+
+    for line in tsv.splitlines():
+        fields = line.split('\t')
+        if len(fields) < len(TSV_COLUMNS) - 1 or fields[0] == 'level':
+            continue
+        if len(fields) == len(TSV_COLUMNS) - 1:
+            fields.append('')
+
+        for column, value in zip(TSV_COLUMNS, fields):
+            if column == 'text':
+                data[column].append(value)
+            elif column == 'conf':
+                data[column].append(float(value))
+            else:
+                data[column].append(int(value))
+
+    return data
+
+
+def find_tesseract_library(lib_path=TESSERACT_LIB):
+    """
+    Tìm đường dẫn thư viện libtesseract
+
+    Returns:
+        str hoặc None: Đường dẫn/tên thư viện có thể load bằng ctypes
+    """
+    if lib_path:
+        return str(lib_path)
+
+    # Windows: DLL nằm cạnh tesseract.exe (bản cài UB-Mannheim)
+    if os.path.exists(TESSERACT_CMD):
+        tesseract_dir = Path(TESSERACT_CMD).parent
+        dlls = sorted(glob.glob(str(tesseract_dir / 'libtesseract*.dll')))
+        if dlls:
+            return dlls[-1]
+
+    found = ctypes.util.find_library('tesseract')
+    if found:
+        return found
+
+    for name in _LIBRARY_NAMES:
+        try:
+            ctypes.CDLL(name)
+            return name
+        except OSError:
+            continue
+
+    return None
+
+
+def _load_library(lib_path):
+    """Load libtesseract và khai báo kiểu cho các hàm C API cần dùng"""
+    lib = ctypes.CDLL(lib_path)
+
+    handle = ctypes.c_void_p
+    lib.TessBaseAPICreate.restype = handle
+    lib.TessBaseAPICreate.argtypes = []
+    lib.TessBaseAPIInit2.restype = ctypes.c_int
+    lib.TessBaseAPIInit2.argtypes = [handle, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
+    lib.TessBaseAPISetVariable.restype = ctypes.c_int
+    lib.TessBaseAPISetVariable.argtypes = [handle, ctypes.c_char_p, ctypes.c_char_p]
+    lib.TessBaseAPISetPageSegMode.restype = None
+    lib.TessBaseAPISetPageSegMode.argtypes = [handle, ctypes.c_int]
+    lib.TessBaseAPISetImage.restype = None
+    lib.TessBaseAPISetImage.argtypes = [handle, ctypes.c_void_p, ctypes.c_int, ctypes.c_int,
+                                        ctypes.c_int, ctypes.c_int]
+    lib.TessBaseAPISetSourceResolution.restype = None
+    lib.TessBaseAPISetSourceResolution.argtypes = [handle, ctypes.c_int]
+    lib.TessBaseAPIRecognize.restype = ctypes.c_int
+    lib.TessBaseAPIRecognize.argtypes = [handle, ctypes.c_void_p]
+    # Trả về c_void_p để tự giải phóng bằng TessDeleteText
+    lib.TessBaseAPIGetTsvText.restype = ctypes.c_void_p
+    lib.TessBaseAPIGetTsvText.argtypes = [handle, ctypes.c_int]
+    lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_void_p
+    lib.TessBaseAPIGetUTF8Text.argtypes = [handle]
+    lib.TessDeleteText.restype = None
+    lib.TessDeleteText.argtypes = [ctypes.c_void_p]
+    lib.TessBaseAPIClear.restype = None
+    lib.TessBaseAPIClear.argtypes = [handle]
+    lib.TessBaseAPIEnd.restype = None
+    lib.TessBaseAPIEnd.argtypes = [handle]
+    lib.TessBaseAPIDelete.restype = None
+    lib.TessBaseAPIDelete.argtypes = [handle]
+
+    return lib
+
+
+class TesseractPool:
+    """Pool các TessBaseAPI sống lâu, dùng chung giữa các thread"""
+
+    # OEM_DEFAULT và PSM_AUTO của Tesseract (giống khi chạy CLI không tham số)
+    DEFAULT_OEM = 3
+    DEFAULT_PSM = 3
+
+    def __init__(self, lang: str, size: int = TESSERACT_POOL_SIZE, oem: int = None,
+                 variables: dict = None, lib_path=None, datapath=TESSDATA_DIR):
+        """
+        Khởi tạo pool (worker được tạo dần khi cần, tối đa `size`)
+
+        Args:
+            lang: Ngôn ngữ nhận dạng (VD: vie+eng)
+            size: Số worker tối đa (mỗi worker giữ một bản traineddata trong RAM)
+            oem: OCR Engine Mode khi Init (mặc định OEM_DEFAULT)
+            variables: Biến Tesseract cố định cho mọi worker của pool này
+            lib_path: Đường dẫn libtesseract (mặc định tự tìm)
+            datapath: Thư mục tessdata (mặc định theo TESSDATA_PREFIX)
+
+        Raises:
+            RuntimeError: Nếu không tìm thấy libtesseract
+        """
+        self.logger = logger
+        self.lang = lang
+        self.size = max(1, int(size))
+        self.oem = self.DEFAULT_OEM if oem is None else oem
+        self.variables = dict(variables or {})
+        self.datapath = self._resolve_datapath(datapath)
+
+        lib_path = lib_path or find_tesseract_library()
+        if not lib_path:
+            raise RuntimeError("Không tìm thấy thư viện libtesseract cho Tesseract C API")
+
+        try:
+            self._lib = _load_library(lib_path)
+        except (OSError, AttributeError) as e:
+            raise RuntimeError(f"Không thể load libtesseract từ {lib_path}: {e}")
+
+        self._idle = queue.LifoQueue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @staticmethod
+    def _resolve_datapath(datapath):
+        """Xác định thư mục tessdata"""
+        if datapath:
+            return str(datapath)
+        if os.path.exists(TESSERACT_CMD):
+            tessdata = Path(TESSERACT_CMD).parent / 'tessdata'
+            if tessdata.is_dir():
+                return str(tessdata)
+        return None
+
+    def _create_worker(self):
+        """Tạo và Init một TessBaseAPI mới (load traineddata một lần duy nhất)"""
+        api = self._lib.TessBaseAPICreate()
+        datapath = self.datapath.encode('utf-8') if self.datapath else None
+        if self._lib.TessBaseAPIInit2(api, datapath, self.lang.encode('utf-8'), self.oem) != 0:
+            self._lib.TessBaseAPIDelete(api)
+            raise RuntimeError(f"Không thể khởi tạo Tesseract với ngôn ngữ '{self.lang}'")
+
+        self._set_variables(api, self.variables)
+
+        self.logger.info(f"Khởi tạo Tesseract worker #{len(self._workers) + 1} ({self.lang})")
+        return api
+
+    def warm_up(self, count: int = None) -> None:
+        """
+        Tạo trước worker để request đầu tiên không phải chờ load model
+
+        Args:
+            count: Số worker cần tạo sẵn (mặc định toàn bộ pool)
+        """
+        count = self.size if count is None else min(count, self.size)
+        apis = [self._acquire() for _ in range(count)]
+        for api in apis:
+            self._release(api)
+
+    def _acquire(self):
+        """Lấy một worker rảnh, tạo mới nếu pool chưa đầy, ngược lại chờ"""
+        try:
+            api = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("TesseractPool đã đóng")
+                if len(self._workers) < self.size:
+                    api = self._create_worker()
+                    self._workers.append(api)
+                    return api
+            api = self._idle.get()
+
+        if api is _CLOSED:
+            # Trả lại dấu hiệu cho luồng chờ tiếp theo
+            self._idle.put(_CLOSED)
+            raise RuntimeError("TesseractPool đã đóng")
+        return api
+
+    def _release(self, api) -> None:
+        """Trả worker về pool; pool đã đóng thì giải phóng luôn worker vừa dùng xong"""
+        with self._lock:
+            if not self._closed:
+                self._idle.put(api)
+                return
+            self._free(api)
+
+    def _free(self, api) -> None:
+        """Giải phóng một TessBaseAPI (gọi khi giữ self._lock)"""
+        self._lib.TessBaseAPIEnd(api)
+        self._lib.TessBaseAPIDelete(api)
+        self._workers.remove(api)
+
+    def _set_variables(self, api, variables: dict) -> None:
+        for name, value in variables.items():
+            self._lib.TessBaseAPISetVariable(api, name.encode('utf-8'), str(value).encode('utf-8'))
+
+    @contextmanager
+    def worker(self, variables: dict = None):
+        """
+        Context manager mượn một worker trong pool
+
+        Args:
+            variables: Biến trong PER_CALL_VARIABLES chỉ áp dụng cho lần mượn này;
+                       trả về giá trị của pool (hoặc rỗng) trước khi worker về pool
+        """
+        variables = variables or {}
+        unsupported = set(variables) - PER_CALL_VARIABLES
+        if unsupported:
+            raise ValueError(f"Biến không đặt được cho từng lần gọi: {', '.join(sorted(unsupported))}")
+
+        api = self._acquire()
+        try:
+            self._set_variables(api, variables)
+            yield api
+        finally:
+            self._set_variables(api, {name: self.variables.get(name, '') for name in variables})
+            self._lib.TessBaseAPIClear(api)
+            self._release(api)
+
+    @contextmanager
+    def _image(self, api, image, psm, dpi):
+        """
+        Đưa ảnh (PIL Image hoặc numpy array RGB/xám) vào worker
+
+        Tesseract chỉ giữ con trỏ tới buffer, nên buffer được giữ sống (và trả về qua `as`)
+        cho tới khi thoát khối with.
+        """
+        if isinstance(image, Image.Image):
+            if image.mode not in ('L', 'RGB'):
+                image = image.convert('RGB')
+            image = np.asarray(image)
+
+        array = np.ascontiguousarray(image, dtype=np.uint8)
+        height, width = array.shape[:2]
+        bytes_per_pixel = 1 if array.ndim == 2 else array.shape[2]
+
+        self._lib.TessBaseAPISetPageSegMode(api, self.DEFAULT_PSM if psm is None else psm)
+        self._lib.TessBaseAPISetImage(api, array.ctypes.data, width, height,
+                                      bytes_per_pixel, array.strides[0])
+        if dpi:
+            self._lib.TessBaseAPISetSourceResolution(api, dpi)
+
+        yield array
+
+    def _take_text(self, pointer) -> str:
+        """Đọc chuỗi UTF-8 do Tesseract cấp phát rồi giải phóng"""
+        if not pointer:
+            return ''
+        try:
+            return ctypes.string_at(pointer).decode('utf-8', errors='replace')
+        finally:
+            self._lib.TessDeleteText(pointer)
+
+    def image_to_data(self, image, psm: int = None, dpi: int = None, variables: dict = None) -> dict:
+        """
+        Nhận dạng và trả về dữ liệu từng từ
+
+        Args:
+            image: PIL Image hoặc numpy array (RGB hoặc xám)
+            psm: Page Segmentation Mode (mặc định PSM_AUTO)
+            dpi: Độ phân giải nguồn (tùy chọn)
+            variables: Biến PER_CALL_VARIABLES cho riêng lần nhận dạng này (VD: whitelist ký tự)
+
+        Returns:
+            dict: Cùng định dạng với pytesseract.image_to_data(output_type=DICT)
+        """
+        with self.worker(variables) as api, self._image(api, image, psm, dpi):
+            if self._lib.TessBaseAPIRecognize(api, None) != 0:
+                raise RuntimeError("Tesseract Recognize thất bại")
+            tsv = self._take_text(self._lib.TessBaseAPIGetTsvText(api, 0))
+
+        return tsv_to_dict(tsv)
+
+    def image_to_string(self, image, psm: int = None, dpi: int = None, variables: dict = None) -> str:
+        """
+        Nhận dạng và trả về text
+
+        Args:
+            image: PIL Image hoặc numpy array (RGB hoặc xám)
+            psm: Page Segmentation Mode (mặc định PSM_AUTO)
+            dpi: Độ phân giải nguồn (tùy chọn)
+            variables: Biến PER_CALL_VARIABLES cho riêng lần nhận dạng này (VD: whitelist ký tự)
+
+        Returns:
+            str: Text được nhận dạng
+        """
+        with self.worker(variables) as api, self._image(api, image, psm, dpi):
+            return self._take_text(self._lib.TessBaseAPIGetUTF8Text(api))
+
+    def close(self) -> None:
+        """
+        Đóng pool: giải phóng các worker đang rảnh; worker đang được mượn được giải phóng
+        khi trả về (_release). Các luồng đang chờ worker nhận RuntimeError.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            while True:
+                try:
+                    api = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                self._free(api)
+            self._idle.put(_CLOSED)
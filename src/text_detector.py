@@ -0,0 +1,287 @@
+"""
+Module định vị vùng chữ trên ảnh (OpenCV cổ điển, không cần GPU hay model DL)
+
+Ảnh chụp thùng hàng thường chỉ có một phần nhỏ là nhãn. Bộ định vị tìm các dòng chữ
+bằng gradient hình thái học, gom thành khối chữ và khung nhãn để OCREngine chỉ chạy
+Tesseract trên các vùng cắt thay vì toàn bộ ảnh.
+
+Các bước (trên bản thu nhỏ của ảnh):
+    1. Gradient hình thái học (MORPH_GRADIENT) → nét chữ nổi bật, nền phẳng bị loại
+    2. Otsu threshold, bỏ các thành phần liên thông quá dài (viền nhãn, đường kẻ)
+    3. Đóng (MORPH_CLOSE) theo chiều ngang → các ký tự trong một dòng nối liền nhau
+    4. Contour → hộp dòng, lọc theo kích thước và mật độ nét
+    5. Giãn các hộp dòng → khối chữ; hợp các khối → khung nhãn
+
+ocr_regions() chia khối dài thành các dải dòng liên tiếp (tại khe trống giữa hai dòng)
+kèm PSM phù hợp (--psm 7 cho một dòng, --psm 6 cho khối nhiều dòng) để OCR song song.
+"""
+import cv2
+import numpy as np
+import logging
+import sys
+from pathlib import Path
+
+# Thêm thư mục config vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import TEXT_DETECTION_WORK_SIZE, OCR_BLOCK_MAX_LINES
+from src.metrics import timed
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def reading_order(boxes: list) -> list:
+    """
+    Sắp xếp các hộp (x, y, w, h, ...) theo thứ tự đọc
+
+    Các hộp chồng nhau quá nửa chiều cao theo phương dọc được coi là cùng một hàng
+    (VD: khối người gửi bên trái, người nhận bên phải) và đọc từ trái sang phải.
+    """
+    rows = []
+    for box in sorted(boxes, key=lambda b: b[1]):
+        row = rows[-1] if rows else None
+        if row is not None:
+            anchor = row[0]
+            overlap = min(anchor[1] + anchor[3], box[1] + box[3]) - max(anchor[1], box[1])
+            if overlap > 0.5 * min(anchor[3], box[3]):
+                row.append(box)
+                continue
+        rows.append([box])
+    return [box for row in rows for box in sorted(row, key=lambda b: b[0])]
+
+
+class TextRegionDetector:
+    """Tìm khung nhãn và các khối chữ trên ảnh"""
+
+    def __init__(self, work_size: int = TEXT_DETECTION_WORK_SIZE, min_fill: float = 0.2,
+                 padding: float = 0.4):
+        """
+        Args:
+            work_size: Cạnh dài của ảnh thu nhỏ dùng để định vị (px)
+            min_fill: Tỉ lệ điểm nét tối thiểu trong một hộp dòng (loại vân nền, nhiễu)
+            padding: Lề thêm quanh mỗi khối, tính theo chiều cao dòng trung bình
+        """
+        self.work_size = work_size
+        self.min_fill = min_fill
+        self.padding = padding
+        self.logger = logger
+
+    @staticmethod
+    def _to_gray(image: np.ndarray) -> np.ndarray:
+        if len(image.shape) == 3:
+            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image
+
+    def _text_mask(self, gray: np.ndarray) -> np.ndarray:
+        """Ảnh nhị phân các nét chữ (đã bỏ đường kẻ dài, viền nhãn)"""
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, kernel)
+        _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+        # Ký tự là thành phần liên thông nhỏ; viền/đường kẻ (kể cả khi ảnh nghiêng) trải dài
+        # hơn nhiều so với một dòng chữ → bỏ đi để không dính vào các dòng
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        limit = max(gray.shape) // 8
+        too_long = (stats[:, cv2.CC_STAT_WIDTH] > 2 * limit) | (stats[:, cv2.CC_STAT_HEIGHT] > limit)
+        too_long[0] = False
+        if too_long.any():
+            binary[too_long[labels]] = 0
+        return binary
+
+    def _find_lines(self, mask: np.ndarray) -> list:
+        """Hộp (x, y, w, h) của các dòng chữ trên ảnh nhị phân"""
+        size = max(mask.shape)
+        # Khoảng cách giữa các ký tự/từ trong một dòng ~1% cạnh ảnh
+        gap = max(3, size // 80)
+        closed = cv2.morphologyEx(mask, cv2.MORPH_CLOSE,
+                                  cv2.getStructuringElement(cv2.MORPH_RECT, (gap, 1)))
+        contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        min_height = max(5, size // 200)
+        max_height = size // 8
+        lines = []
+        for contour in contours:
+            # Độ dày/độ dài theo hộp xoay để dòng chữ nghiêng vẫn được giữ
+            (_, _), (rect_w, rect_h), _ = cv2.minAreaRect(contour)
+            thickness, length = min(rect_w, rect_h), max(rect_w, rect_h)
+            if thickness < min_height or thickness > max_height or length < 2 * min_height:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            area = cv2.contourArea(contour)
+            if area <= 0:
+                continue
+            fill = cv2.countNonZero(mask[y:y + h, x:x + w]) / area
+            if fill < self.min_fill:
+                continue
+            lines.append((x, y, w, h))
+        return lines
+
+    @staticmethod
+    def _group_lines(lines: list, shape: tuple) -> list:
+        """Gom các dòng gần nhau thành khối chữ, trả về list (hộp khối, các dòng của khối)"""
+        heights = sorted(h for _, _, _, h in lines)
+        line_height = heights[len(heights) // 2]
+
+        canvas = np.zeros(shape[:2], dtype=np.uint8)
+        for x, y, w, h in lines:
+            cv2.rectangle(canvas, (x, y), (x + w - 1, y + h - 1), 255, -1)
+        # Dòng cách nhau < 1 chiều cao dòng, cột cách nhau < 2 chiều cao dòng → cùng khối
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * line_height + 1, line_height + 1))
+        contours, _ = cv2.findContours(cv2.dilate(canvas, kernel), cv2.RETR_EXTERNAL,
+                                       cv2.CHAIN_APPROX_SIMPLE)
+
+        blocks = []
+        for contour in contours:
+            bx, by, bw, bh = cv2.boundingRect(contour)
+            members = [line for line in lines
+                       if bx <= line[0] + line[2] / 2 <= bx + bw and by <= line[1] + line[3] / 2 <= by + bh]
+            if not members:
+                continue
+            x0 = min(line[0] for line in members)
+            y0 = min(line[1] for line in members)
+            x1 = max(line[0] + line[2] for line in members)
+            y1 = max(line[1] + line[3] for line in members)
+            blocks.append((x0, y0, x1 - x0, y1 - y0, TextRegionDetector._merge_rows(members)))
+
+        return reading_order(blocks)
+
+    @staticmethod
+    def _merge_rows(lines: list) -> list:
+        """Ghép các đoạn (từng cụm từ) nằm trên cùng một hàng thành một dòng, trên xuống dưới"""
+        rows = []
+        for x, y, w, h in sorted(lines, key=lambda line: line[1]):
+            if rows:
+                rx, ry, rw, rh = rows[-1]
+                # Tâm đoạn nằm trong hàng hiện tại → cùng dòng
+                if ry <= y + h / 2 <= ry + rh:
+                    x0, y0 = min(rx, x), min(ry, y)
+                    rows[-1] = (x0, y0, max(rx + rw, x + w) - x0, max(ry + rh, y + h) - y0)
+                    continue
+            rows.append((x, y, w, h))
+        return rows
+
+    @staticmethod
+    def _scale_box(box: tuple, scale: float, pad: int, shape: tuple) -> tuple:
+        """Đổi hộp về tọa độ ảnh gốc, thêm lề và cắt theo biên ảnh"""
+        height, width = shape[:2]
+        x0 = max(0, int(box[0] / scale) - pad)
+        y0 = max(0, int(box[1] / scale) - pad)
+        x1 = min(width, int(np.ceil((box[0] + box[2]) / scale)) + pad)
+        y1 = min(height, int(np.ceil((box[1] + box[3]) / scale)) + pad)
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    @timed('detect_text')
+    def detect(self, image: np.ndarray) -> dict:
+        """
+        Định vị nhãn và các khối chữ
+
+        Args:
+            image: Ảnh BGR hoặc grayscale
+
+        Returns:
+            dict: {
+                'label': (x, y, w, h) khung chứa mọi khối chữ, None nếu không thấy chữ,
+                'blocks': list (x, y, w, h) các khối chữ theo thứ tự đọc,
+                'block_lines': list các dòng (x, y, w, h) của từng khối, trên xuống dưới,
+                'lines': số dòng chữ tìm được,
+                'coverage': tỉ lệ diện tích các khối so với cả ảnh (0-1)
+            }
+        """
+        result = {'label': None, 'blocks': [], 'block_lines': [], 'lines': 0, 'coverage': 1.0}
+        try:
+            gray = self._to_gray(image)
+            height, width = gray.shape[:2]
+            scale = min(1.0, self.work_size / float(max(height, width)))
+            if scale < 1.0:
+                gray = cv2.resize(gray, (max(1, int(width * scale)), max(1, int(height * scale))),
+                                  interpolation=cv2.INTER_AREA)
+
+            lines = self._find_lines(self._text_mask(gray))
+            if not lines:
+                return result
+
+            grouped = self._group_lines(lines, gray.shape)
+            line_height = sorted(h for _, _, _, h in lines)[len(lines) // 2]
+            pad = int(round(self.padding * line_height / scale))
+            blocks = [self._scale_box(block[:4], scale, pad, image.shape) for block in grouped]
+            block_lines = [[self._scale_box(line, scale, 0, image.shape) for line in block[4]]
+                           for block in grouped]
+
+            x0 = min(b[0] for b in blocks)
+            y0 = min(b[1] for b in blocks)
+            x1 = max(b[0] + b[2] for b in blocks)
+            y1 = max(b[1] + b[3] for b in blocks)
+
+            result.update({
+                'label': (x0, y0, x1 - x0, y1 - y0),
+                'blocks': blocks,
+                'block_lines': block_lines,
+                'lines': len(lines),
+                'coverage': round(sum(b[2] * b[3] for b in blocks) / float(width * height), 4),
+            })
+            self.logger.debug(f"Tìm thấy {len(lines)} dòng, {len(blocks)} khối chữ "
+                              f"({result['coverage']:.0%} diện tích ảnh)")
+            return result
+
+        except Exception as e:
+            self.logger.warning(f"Không thể định vị vùng chữ: {e}")
+            return result
+
+    @staticmethod
+    def ocr_regions(detection: dict, max_lines: int = OCR_BLOCK_MAX_LINES) -> list:
+        """
+        Chia các khối chữ thành vùng OCR độc lập kèm PSM
+
+        Khối nhiều hơn `max_lines` dòng được cắt thành các dải tại khe trống giữa hai dòng
+        liền kề (dòng nghiêng chồng lên nhau thì không cắt, tránh cắt ngang chữ).
+
+        Args:
+            detection: Kết quả detect()
+            max_lines: Số dòng tối đa của một vùng
+
+        Returns:
+            list: (x, y, w, h, psm) theo thứ tự đọc - psm 7 cho vùng một dòng, 6 cho nhiều dòng
+        """
+        regions = []
+        block_lines = detection.get('block_lines') or [[] for _ in detection['blocks']]
+        for block, lines in zip(detection['blocks'], block_lines):
+            x, y, w, h = block
+            bottom = y + h
+            if not lines:
+                regions.append((x, y, w, h, 6))
+                continue
+
+            # Các điểm cắt: giữa hai dòng không chồng nhau
+            chunks, current = [], []
+            for index, line in enumerate(lines):
+                current.append(line)
+                following = lines[index + 1] if index + 1 < len(lines) else None
+                if following is not None and len(current) >= max_lines \
+                        and line[1] + line[3] <= following[1]:
+                    chunks.append(current)
+                    current = []
+            if current:
+                chunks.append(current)
+
+            top = y
+            for index, chunk in enumerate(chunks):
+                if index + 1 < len(chunks):
+                    cut = (chunk[-1][1] + chunk[-1][3] + chunks[index + 1][0][1]) // 2
+                else:
+                    cut = bottom
+                psm = 7 if len(chunk) == 1 else 6
+                regions.append((x, top, w, cut - top, psm))
+                top = cut
+        return regions
+
+    @staticmethod
+    def crop(image: np.ndarray, box: tuple) -> np.ndarray:
+        """Cắt vùng (x, y, w, h) khỏi ảnh"""
+        x, y, w, h = box
+        return image[y:y + h, x:x + w]
+
+
+if __name__ == "__main__":
+    # Test
+    detector = TextRegionDetector()
+    print("TextRegionDetector module loaded successfully!")
@@ -0,0 +1,105 @@
+"""
+Module so khớp nhiều từ khóa cùng lúc bằng thuật toán Aho–Corasick
+"""
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    Automaton tìm tất cả các pattern trong text chỉ với một lần duyệt
+
+    Mỗi pattern được gắn một payload bất kỳ; cùng một chuỗi có thể mang nhiều
+    payload (VD: "hà nội" vừa là tỉnh vừa là từ khóa miền Bắc).
+    """
+
+    def __init__(self, patterns=None):
+        """
+        Khởi tạo automaton
+
+        Args:
+            patterns: Iterable các cặp (pattern, payload) (tùy chọn)
+        """
+        # Mỗi node: dict ký tự → node con
+        self._goto = [{}]
+        self._fail = [0]
+        # Pattern kết thúc tại node: list (độ dài pattern, payload)
+        self._terminal = [[]]
+        # Output của node = terminal của node + output của fail link (tính trong build)
+        self._output = [[]]
+        self._built = False
+
+        if patterns:
+            for pattern, payload in patterns:
+                self.add(pattern, payload)
+            self.build()
+
+    def add(self, pattern: str, payload) -> None:
+        """Thêm một pattern (phải gọi build() trước khi tìm kiếm)"""
+        if not pattern:
+            return
+
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminal.append([])
+                self._output.append([])
+            node = next_node
+
+        self._terminal[node].append((len(pattern), payload))
+        self._built = False
+
+    def build(self) -> None:
+        """Tính fail link bằng BFS và gộp output theo fail link"""
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            self._output[child] = list(self._terminal[child])
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = self._terminal[child] + self._output[self._fail[child]]
+
+        self._built = True
+
+    def find_all(self, text: str) -> list:
+        """
+        Tìm tất cả vị trí xuất hiện (kể cả chồng lấn) của các pattern
+
+        Args:
+            text: Text cần tìm (đã chuẩn hóa giống pattern)
+
+        Returns:
+            list: Các tuple (start, end, payload), sắp xếp theo vị trí kết thúc
+        """
+        if not self._built:
+            self.build()
+
+        matches = []
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        node = 0
+
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+
+            for length, payload in output[node]:
+                matches.append((index + 1 - length, index + 1, payload))
+
+        return matches
+
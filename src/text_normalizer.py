@@ -0,0 +1,223 @@
+"""
+Module chuẩn hóa text tiếng Việt cho tra cứu địa danh
+
+- Bỏ dấu tiếng Việt (Hồ Chí Minh → ho chi minh), giữ ánh xạ vị trí về text gốc
+- Sửa các lỗi nhầm ký tự thường gặp của Tesseract (0/o, 1/i, rn/m, ...)
+- Tra cứu gần đúng với khoảng cách chỉnh sửa bị chặn (SymSpell: chỉ mục deletes)
+"""
+import unicodedata
+
+# Chữ số bị Tesseract đọc nhầm từ chữ cái (chỉ áp dụng trong từ có chữ cái)
+OCR_DIGIT_CONFUSIONS = {'0': 'o', '1': 'i', '5': 's', '8': 'b', '6': 'g'}
+
+# Cụm ký tự bị đọc nhầm; tiếng Việt không có "rn" nên thay an toàn
+OCR_SEQUENCE_CONFUSIONS = [('rn', 'm')]
+
+
+def fold_char(char: str) -> str:
+    """Bỏ dấu và chuyển thường một ký tự (đ → d, ồ → o)"""
+    char = char.lower()
+    if char == 'đ':
+        return 'd'
+    decomposed = unicodedata.normalize('NFD', char)
+    return decomposed[0] if decomposed else char
+
+
+def fold_with_offsets(text: str) -> tuple:
+    """
+    Bỏ dấu, chuyển thường, thay ký tự không phải chữ/số bằng khoảng trắng
+    và gộp khoảng trắng liên tiếp
+
+    Args:
+        text: Text gốc
+
+    Returns:
+        tuple: (text đã chuẩn hóa, list vị trí trong text gốc của từng ký tự)
+    """
+    text = unicodedata.normalize('NFC', text)
+    chars = []
+    offsets = []
+
+    for index, char in enumerate(text):
+        folded = fold_char(char)
+        if not folded.isalnum():
+            # Gộp dấu câu/khoảng trắng thành một khoảng trắng
+            if not chars or chars[-1] == ' ':
+                continue
+            folded = ' '
+        chars.append(folded)
+        offsets.append(index)
+
+    if chars and chars[-1] == ' ':
+        chars.pop()
+        offsets.pop()
+
+    return ''.join(chars), offsets
+
+
+def fold_text(text: str) -> str:
+    """Chuẩn hóa text để so khớp không phân biệt dấu (xem fold_with_offsets)"""
+    return fold_with_offsets(text)[0]
+
+
+def normalize_ocr_token(token: str) -> str:
+    """
+    Sửa lỗi nhầm ký tự của OCR trong một từ đã bỏ dấu
+
+    Chữ số chỉ được thay khi từ có chứa chữ cái ("b1nh" → "binh"),
+    từ toàn số ("10", "700000") giữ nguyên.
+    """
+    if any(char.isalpha() for char in token) and any(char.isdigit() for char in token):
+        token = ''.join(OCR_DIGIT_CONFUSIONS.get(char, char) for char in token)
+    for wrong, right in OCR_SEQUENCE_CONFUSIONS:
+        token = token.replace(wrong, right)
+    return token
+
+
+def normalize_ocr_text(folded: str) -> str:
+    """Áp dụng normalize_ocr_token cho từng từ của text đã bỏ dấu"""
+    return ' '.join(normalize_ocr_token(token) for token in folded.split())
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Khoảng cách Damerau-Levenshtein (optimal string alignment) bị chặn
+
+    Returns:
+        int: Khoảng cách, hoặc max_distance + 1 nếu vượt ngưỡng
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if a == b:
+        return 0
+
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+
+    distance = previous[len(b)]
+    return distance if distance <= max_distance else max_distance + 1
+
+
+def _deletes(term: str, distance: int) -> set:
+    """Tất cả biến thể của term khi xóa tối đa `distance` ký tự"""
+    variants = {term}
+    frontier = {term}
+    for _ in range(distance):
+        frontier = {
+            variant[:i] + variant[i + 1:]
+            for variant in frontier if len(variant) > 1
+            for i in range(len(variant))
+        }
+        variants |= frontier
+    return variants
+
+
+class DeleteIndex:
+    """
+    Chỉ mục tra cứu gần đúng kiểu SymSpell
+
+    Mỗi term được đánh chỉ mục bằng tất cả biến thể xóa ký tự; khi tra cứu chỉ cần
+    sinh biến thể xóa của query và tra dict, sau đó xác nhận bằng edit_distance.
+    """
+
+    def __init__(self, max_distance: int = 2):
+        """
+        Args:
+            max_distance: Khoảng cách chỉnh sửa tối đa được hỗ trợ
+        """
+        self.max_distance = max_distance
+        self._deletes = {}
+        self._terms = {}
+        self.token_counts = set()
+        self.min_length = None
+        self.max_length = 0
+
+    def allowed_distance(self, term: str) -> int:
+        """Ngưỡng sai khác theo độ dài: tên ngắn hoặc có số ("quan 1") phải khớp chính xác"""
+        length = len(term.replace(' ', ''))
+        if length <= 5 or any(char.isdigit() for char in term):
+            return 0
+        if length <= 9:
+            return min(1, self.max_distance)
+        return self.max_distance
+
+    def add(self, term: str, payload) -> None:
+        """Thêm term (đã bỏ dấu và sửa lỗi OCR) kèm payload"""
+        if not term:
+            return
+
+        self._terms.setdefault(term, []).append(payload)
+        for variant in _deletes(term, self.allowed_distance(term)):
+            self._deletes.setdefault(variant, set()).add(term)
+
+        self.token_counts.add(len(term.split()))
+        self.min_length = len(term) if self.min_length is None else min(self.min_length, len(term))
+        self.max_length = max(self.max_length, len(term))
+
+    def lookup(self, query: str) -> list:
+        """
+        Tìm các term gần với query
+
+        Returns:
+            list: Các tuple (khoảng cách, term, payload), khoảng cách tăng dần
+        """
+        if self.min_length is None:
+            return []
+        if not (self.min_length - self.max_distance <= len(query) <= self.max_length + self.max_distance):
+            return []
+
+        # Term cho phép sai 1 ký tự dài ≥ 6, sai 2 ký tự dài ≥ 10 (không tính khoảng trắng):
+        # query ngắn hơn không cần sinh nhiều biến thể xóa
+        length = len(query.replace(' ', ''))
+        if length < 5:
+            query_distance = 0
+        elif length < 8:
+            query_distance = min(1, self.max_distance)
+        else:
+            query_distance = self.max_distance
+
+        candidates = set()
+        for variant in _deletes(query, query_distance):
+            candidates.update(self._deletes.get(variant, ()))
+
+        results = []
+        for term in candidates:
+            limit = self.allowed_distance(term)
+            distance = edit_distance(query, term, limit)
+            if distance <= limit:
+                for payload in self._terms[term]:
+                    results.append((distance, term, payload))
+
+        results.sort(key=lambda item: item[0])
+        return results
+
+    def search_tokens(self, tokens: list) -> list:
+        """
+        Quét chuỗi từ theo các cửa sổ có cùng số từ với các term trong chỉ mục
+
+        Args:
+            tokens: Các từ đã bỏ dấu và sửa lỗi OCR (normalize_ocr_token)
+
+        Returns:
+            list: Các tuple (khoảng cách, chỉ số từ bắt đầu, chỉ số từ kết thúc, term, payload)
+        """
+        results = []
+        for size in sorted(self.token_counts):
+            for start in range(len(tokens) - size + 1):
+                window = ' '.join(tokens[start:start + size])
+                for distance, term, payload in self.lookup(window):
+                    results.append((distance, start, start + size, term, payload))
+        return results
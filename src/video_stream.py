@@ -0,0 +1,229 @@
+"""
+Module nhận dạng nhãn từ video / camera cố định trên băng chuyền
+
+Mỗi kiện hàng đi qua camera sinh ra hàng chục khung hình gần như giống nhau. Thay vì OCR
+từng khung, FrameSelector:
+    1. So sánh bản thu nhỏ với khung đã xét gần nhất (trung bình |hiệu|) → bỏ khung gần trùng
+    2. Băm cảm nhận (dHash 64 bit) → khoảng cách Hamming lớn = cảnh mới (kiện khác)
+    3. Trong mỗi cảnh giữ khung nét nhất theo phương sai Laplacian
+Khi cảnh kết thúc, khung nét nhất (nếu đủ nét, đủ dài và khác khung đã nhận dạng trước đó)
+được đưa vào LabelPipeline, nên Tesseract chỉ chạy một lần cho mỗi kiện.
+"""
+import logging
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Thêm thư mục gốc vào path
+sys.path.append(str(Path(__file__).parent.parent))
+from config.config import (VIDEO_THUMB_WIDTH, VIDEO_DIFF_THRESHOLD, VIDEO_HASH_DISTANCE,
+                           VIDEO_MIN_SHARPNESS, VIDEO_MIN_FRAMES)
+from src import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bộ đếm khung hình: outcome = duplicate (bỏ qua nhờ so sánh hiệu) / evaluated
+FRAMES_METRIC = 'video_frames_total'
+# Bộ đếm cảnh: outcome = recognized / rejected (quá mờ hoặc quá ngắn) / duplicate (cùng kiện vừa nhận dạng)
+SCENES_METRIC = 'video_scenes_total'
+
+
+def dhash(thumb: np.ndarray) -> int:
+    """
+    Băm cảm nhận (difference hash) 64 bit: so sánh độ sáng các điểm kề nhau trên lưới 9×8
+
+    Args:
+        thumb: Ảnh grayscale (thường là bản thu nhỏ)
+
+    Returns:
+        int: Mã băm 64 bit
+    """
+    small = cv2.resize(thumb, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def sharpness(gray: np.ndarray) -> float:
+    """Độ nét: phương sai của Laplacian (ảnh mờ do chuyển động → giá trị nhỏ)"""
+    _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+    return float(std[0, 0] ** 2)
+
+
+def open_source(source) -> cv2.VideoCapture:
+    """
+    Mở nguồn video
+
+    Args:
+        source: Đường dẫn file video, URL stream, hoặc số thiết bị camera (VD: 0, '0' = /dev/video0)
+
+    Returns:
+        cv2.VideoCapture đã mở
+
+    Raises:
+        ValueError: Không mở được nguồn
+    """
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    capture = cv2.VideoCapture(source if isinstance(source, int) else str(source))
+    if not capture.isOpened():
+        capture.release()
+        raise ValueError(f"Không mở được nguồn video: {source}")
+    return capture
+
+
+class FrameSelector:
+    """Chia luồng khung hình thành các cảnh (mỗi cảnh một kiện) và chọn khung nét nhất mỗi cảnh"""
+
+    def __init__(self, thumb_width: int = VIDEO_THUMB_WIDTH, diff_threshold: float = VIDEO_DIFF_THRESHOLD,
+                 hash_distance: int = VIDEO_HASH_DISTANCE, min_sharpness: float = VIDEO_MIN_SHARPNESS,
+                 min_frames: int = VIDEO_MIN_FRAMES):
+        """
+        Args:
+            thumb_width: Chiều rộng bản thu nhỏ dùng để so sánh khung (px)
+            diff_threshold: Trung bình |hiệu| mức xám dưới ngưỡng này → khung gần trùng, bỏ qua
+            hash_distance: Khoảng cách Hamming dHash lớn hơn ngưỡng này → cảnh mới
+            min_sharpness: Phương sai Laplacian tối thiểu của khung được chọn (loại băng chuyền trống, ảnh nhòe)
+            min_frames: Số khung tối thiểu của một cảnh (loại cảnh chuyển tiếp thoáng qua)
+        """
+        self.logger = logger
+        self.thumb_width = thumb_width
+        self.diff_threshold = diff_threshold
+        self.hash_distance = hash_distance
+        self.min_sharpness = min_sharpness
+        self.min_frames = min_frames
+        self._reference = None
+        self._scene = None
+        self._last_hash = None
+
+    def _thumbnail(self, gray: np.ndarray) -> np.ndarray:
+        height, width = gray.shape[:2]
+        size = (self.thumb_width, max(1, round(height * self.thumb_width / width)))
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+    def _close_scene(self) -> list:
+        """Kết thúc cảnh hiện tại; trả về [khung được chọn] hoặc []"""
+        scene, self._scene = self._scene, None
+        if scene is None:
+            return []
+        if scene['frames'] < self.min_frames or scene['sharpness'] < self.min_sharpness:
+            metrics.increment(SCENES_METRIC, outcome='rejected')
+            return []
+        # Kiện dừng lại sau khi bị rung/che khuất thoáng qua → cảnh mới nhưng vẫn là nhãn cũ
+        if (self._last_hash is not None
+                and bin(scene['best_hash'] ^ self._last_hash).count('1') <= self.hash_distance):
+            metrics.increment(SCENES_METRIC, outcome='duplicate')
+            return []
+        self._last_hash = scene['best_hash']
+        metrics.increment(SCENES_METRIC, outcome='recognized')
+        return [scene]
+
+    def feed(self, frame: np.ndarray, index: int) -> list:
+        """
+        Xét một khung hình
+
+        Args:
+            frame: Khung hình BGR hoặc grayscale
+            index: Số thứ tự khung trong nguồn
+
+        Returns:
+            list: Các cảnh vừa kết thúc và được chọn (0 hoặc 1 phần tử), mỗi cảnh là dict
+                  {'frame', 'index', 'sharpness', 'first_index', 'frames'}
+        """
+        with metrics.timer('frame_select'):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+            thumb = self._thumbnail(gray)
+
+            # So với khung đã xét gần nhất (không phải khung liền trước) để chuyển động chậm vẫn được phát hiện
+            if (self._reference is not None and self._reference.shape == thumb.shape
+                    and cv2.norm(thumb, self._reference, cv2.NORM_L1) / thumb.size < self.diff_threshold):
+                metrics.increment(FRAMES_METRIC, outcome='duplicate')
+                if self._scene is not None:
+                    self._scene['frames'] += 1
+                return []
+
+            metrics.increment(FRAMES_METRIC, outcome='evaluated')
+            self._reference = thumb
+            code = dhash(thumb)
+            selected = []
+            if self._scene is None or bin(code ^ self._scene['hash']).count('1') > self.hash_distance:
+                selected = self._close_scene()
+                self._scene = {'hash': code, 'frame': None, 'index': index, 'sharpness': -1.0,
+                               'best_hash': code, 'first_index': index, 'frames': 0}
+
+            scene = self._scene
+            scene['frames'] += 1
+            score = sharpness(gray)
+            if score > scene['sharpness']:
+                scene.update({'frame': frame, 'index': index, 'sharpness': score, 'best_hash': code})
+        return selected
+
+    def flush(self) -> list:
+        """Kết thúc luồng: trả về cảnh cuối cùng nếu được chọn"""
+        self._reference = None
+        return self._close_scene()
+
+
+class VideoLabelStream:
+    """Đọc khung hình từ video/camera và nhận dạng mỗi kiện một lần"""
+
+    def __init__(self, pipeline, selector: FrameSelector = None, frame_step: int = 1):
+        """
+        Args:
+            pipeline: LabelPipeline dùng cho khung được chọn (nên tắt cache - khung video hiếm khi trùng byte)
+            selector: FrameSelector (mặc định tạo mới theo config)
+            frame_step: Chỉ xét 1 trong mỗi frame_step khung (giảm tải khi camera có FPS cao)
+        """
+        self.logger = logger
+        self.pipeline = pipeline
+        self.selector = selector or FrameSelector()
+        self.frame_step = max(1, int(frame_step))
+        self.stats = {'frames': 0, 'labels': 0}
+
+    def frames(self, source):
+        """Sinh (số thứ tự, khung hình) từ nguồn; nguồn có thể là VideoCapture đã mở"""
+        capture = source if isinstance(source, cv2.VideoCapture) else open_source(source)
+        try:
+            index = 0
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                if index % self.frame_step == 0:
+                    yield index, frame
+                index += 1
+        finally:
+            capture.release()
+
+    def run(self, source):
+        """
+        Nhận dạng các kiện trong nguồn video
+
+        Args:
+            source: Đường dẫn file video, URL, số thiết bị camera hoặc cv2.VideoCapture
+
+        Yields:
+            dict: Kết quả LabelPipeline.run() của khung được chọn, thêm
+                  'frame_index', 'first_frame', 'scene_frames', 'sharpness'
+        """
+        for index, frame in self.frames(source):
+            self.stats['frames'] += 1
+            for scene in self.selector.feed(frame, index):
+                yield self._recognize(scene)
+        for scene in self.selector.flush():
+            yield self._recognize(scene)
+
+    def _recognize(self, scene: dict) -> dict:
+        result = self.pipeline.run(scene['frame'])
+        result.update({
+            'frame_index': scene['index'],
+            'first_frame': scene['first_index'],
+            'scene_frames': scene['frames'],
+            'sharpness': round(scene['sharpness'], 1),
+        })
+        self.stats['labels'] += 1
+        self.logger.info(f"Kiện #{self.stats['labels']}: khung {scene['index']} "
+                         f"(cảnh {scene['first_index']}-, {scene['frames']} khung, độ nét {scene['sharpness']:.0f})")
+        return result
@@ -0,0 +1,98 @@
+"""
+Test cases cho module xử lý hàng loạt
+"""
+import unittest
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+# Thêm thư mục src vào path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.batch_processor import (BatchProcessor, ResultWriter, RESULT_FIELDS,
+                                 collect_images, load_completed)
+
+
+class TestBatchProcessor(unittest.TestCase):
+    """Test cases cho BatchProcessor"""
+    
+    def setUp(self):
+        """Setup trước mỗi test"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def _record(self, path):
+        record = {field: '' for field in RESULT_FIELDS}
+        record.update({'path': path, 'status': 'ok', 'region': 'mien_nam'})
+        return record
+    
+    def test_collect_images_filters_extensions(self):
+        """Test chỉ lấy file có đuôi trong IMAGE_EXTENSIONS, duyệt cả thư mục con"""
+        (self.root / 'sub').mkdir()
+        for name in ['a.jpg', 'b.PNG', 'notes.txt', 'sub/c.jpeg']:
+            (self.root / name).write_bytes(b'')
+        
+        images = collect_images(self.root)
+        names = [Path(p).name for p in images]
+        
+        self.assertEqual(names, ['a.jpg', 'b.PNG', 'c.jpeg'])
+    
+    def test_collect_images_from_file_list(self):
+        """Test đọc danh sách ảnh từ file text"""
+        file_list = self.root / 'list.txt'
+        file_list.write_text("# danh sách\n/data/a.jpg\n\n/data/b.png\n", encoding='utf-8')
+        
+        self.assertEqual(collect_images(file_list), ['/data/a.jpg', '/data/b.png'])
+    
+    def test_resume_ignores_truncated_jsonl_line(self):
+        """Test dòng ghi dở do crash không được tính là đã xử lý"""
+        output = self.root / 'results.jsonl'
+        with ResultWriter(output) as writer:
+            writer.write(self._record('/data/a.jpg'))
+        with open(output, 'a', encoding='utf-8') as f:
+            f.write('{"path": "/data/b.jpg", "sta')
+        
+        self.assertEqual(load_completed(output), {'/data/a.jpg'})
+        
+        # Lần ghi tiếp theo bắt đầu trên dòng mới
+        with ResultWriter(output) as writer:
+            writer.write(self._record('/data/b.jpg'))
+        self.assertEqual(load_completed(output), {'/data/a.jpg', '/data/b.jpg'})
+    
+    def test_resume_csv(self):
+        """Test tiếp tục với output CSV"""
+        output = self.root / 'results.csv'
+        with ResultWriter(output) as writer:
+            writer.write(self._record('/data/a.jpg'))
+            writer.write(self._record('/data/b.jpg'))
+        
+        self.assertEqual(load_completed(output), {'/data/a.jpg', '/data/b.jpg'})
+    
+    def test_resume_retries_errors(self):
+        """Test ảnh bị lỗi được xử lý lại ở lần chạy sau"""
+        output = self.root / 'results.jsonl'
+        failed = self._record('/data/b.jpg')
+        failed['status'] = 'error'
+        with ResultWriter(output) as writer:
+            writer.write(self._record('/data/a.jpg'))
+            writer.write(failed)
+        
+        self.assertEqual(load_completed(output), {'/data/a.jpg'})
+    
+    def test_run_skips_completed(self):
+        """Test chạy lại bỏ qua toàn bộ ảnh đã có kết quả"""
+        output = self.root / 'results.jsonl'
+        output.write_text(json.dumps(self._record('/data/a.jpg')) + '\n', encoding='utf-8')
+        
+        stats = BatchProcessor(output_path=output, workers=1).run(['/data/a.jpg'])
+        
+        self.assertEqual(stats['skipped'], 1)
+        self.assertEqual(stats['processed'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
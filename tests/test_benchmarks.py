@@ -0,0 +1,55 @@
+"""
+Test cases cho bộ benchmark
+"""
+import unittest
+import sys
+from pathlib import Path
+
+# Thêm thư mục src vào path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.run_benchmark import compare_reports, run_benchmark, summarize
+from benchmarks.synthetic_labels import SyntheticLabelGenerator
+
+
+class TestSyntheticLabels(unittest.TestCase):
+    """Test cases cho SyntheticLabelGenerator"""
+    
+    def test_same_seed_same_labels(self):
+        """Test cùng seed sinh cùng bộ nhãn để so sánh được giữa các lần chạy"""
+        first = SyntheticLabelGenerator(seed=7).generate(2, widths=(400,), skews=(2.0,), noises=(10.0,))
+        second = SyntheticLabelGenerator(seed=7).generate(2, widths=(400,), skews=(2.0,), noises=(10.0,))
+        
+        self.assertEqual(first[0]['text'], second[0]['text'])
+        self.assertTrue((first[1]['image'] == second[1]['image']).all())
+        self.assertEqual(first[0]['image'].shape[1], 400)
+        self.assertIn('Người nhận', first[0]['text'])
+
+
+class TestRunBenchmark(unittest.TestCase):
+    """Test cases cho run_benchmark"""
+    
+    def test_report_structure(self):
+        """Test báo cáo có p50/p95 từng bước và so sánh được với báo cáo trước"""
+        report = run_benchmark(labels=2, methods=['minimal'], widths=[400], skews=[0.0],
+                               noises=[0.0], ocr=False, warmup=0)
+        
+        self.assertEqual(report['stages']['parse']['count'], 2)
+        for stage in ('preprocess.minimal', 'parse', 'classify', 'pipeline'):
+            self.assertIn('p95_ms', report['stages'][stage])
+        self.assertIn('ocr', report['skipped'])
+        self.assertLessEqual(report['ocr_pixel_ratio'], 1.0)
+        
+        rows = compare_reports(report, report)
+        self.assertTrue(all(row['change_pct'] == 0 for row in rows))
+    
+    def test_summarize(self):
+        """Test thống kê phân vị"""
+        stats = summarize([0.001, 0.002, 0.003, 0.004])
+        self.assertEqual(stats['count'], 4)
+        self.assertAlmostEqual(stats['p50_ms'], 2.5)
+        self.assertAlmostEqual(stats['max_ms'], 4.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
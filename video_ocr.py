@@ -0,0 +1,88 @@
+"""
+Script nhận dạng nhãn bưu kiện từ video hoặc camera cố định trên băng chuyền
+
+Ví dụ:
+    python video_ocr.py data/sample/bang_chuyen.mp4
+    python video_ocr.py 0 --output data/output/camera.jsonl     # camera /dev/video0
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Thêm thư mục gốc vào path
+sys.path.append(str(Path(__file__).parent))
+
+from src.video_stream import VideoLabelStream, FrameSelector
+from config.config import OUTPUT_DIR, PREPROCESS_METHOD, VIDEO_MIN_SHARPNESS, VIDEO_HASH_DISTANCE
+
+
+def parse_args(argv=None):
+    """Đọc tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(description="Nhận dạng nhãn bưu kiện từ video/camera")
+    parser.add_argument('source', help="File video, URL stream hoặc số thiết bị camera (VD: 0)")
+    parser.add_argument('--output', '-o', default=str(OUTPUT_DIR / 'video_results.jsonl'),
+                        help="File kết quả .jsonl (mặc định: %(default)s)")
+    parser.add_argument('--method', '-m', default=PREPROCESS_METHOD,
+                        help="Phương pháp tiền xử lý ảnh (mặc định: %(default)s)")
+    parser.add_argument('--frame-step', type=int, default=1,
+                        help="Chỉ xét 1 trong mỗi N khung hình (mặc định: %(default)s)")
+    parser.add_argument('--min-sharpness', type=float, default=VIDEO_MIN_SHARPNESS,
+                        help="Độ nét tối thiểu của khung được OCR (mặc định: %(default)s)")
+    parser.add_argument('--hash-distance', type=int, default=VIDEO_HASH_DISTANCE,
+                        help="Số bit dHash khác nhau để coi là kiện mới (mặc định: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def build_pipeline(method: str):
+    """Tạo LabelPipeline cho khung video (không dùng cache kết quả)"""
+    from src.ocr_engine import OCREngine
+    from src.region_classifier import RegionClassifier
+    from src.image_processor import ImageProcessor
+    from src.pipeline import LabelPipeline
+
+    ocr = OCREngine()
+    return LabelPipeline(ocr, RegionClassifier(), ImageProcessor(osd=ocr.detect_orientation), method=method)
+
+
+def main(argv=None):
+    """Đọc nguồn video và ghi kết quả từng kiện (một dòng JSON mỗi kiện)"""
+    args = parse_args(argv)
+
+    selector = FrameSelector(min_sharpness=args.min_sharpness, hash_distance=args.hash_distance)
+    stream = VideoLabelStream(build_pipeline(args.method), selector=selector, frame_step=args.frame_step)
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for result in stream.run(args.source):
+            record = {
+                'frame_index': result['frame_index'],
+                'first_frame': result['first_frame'],
+                'scene_frames': result['scene_frames'],
+                'sharpness': result['sharpness'],
+                'text': result['ocr']['text'],
+                'confidence': result['ocr']['confidence'],
+                'structured': result['structured'],
+                'classification': result['classification'],
+                'timings': result['timings'],
+            }
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            f.flush()
+            print(f"📦 Khung {result['frame_index']}: {result['classification'].get('region_name', '')} - "
+                  f"{result['structured'].get('recipient_name', '')}")
+
+    stats = stream.stats
+    print("\n" + "=" * 60)
+    print(f"  Số khung hình:    {stats['frames']}")
+    print(f"  Số kiện:          {stats['labels']}")
+    print(f"  File kết quả:     {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n⚠️ Đã dừng.")
+        sys.exit(130)